@@ -0,0 +1,63 @@
+import json
+import os
+
+from build_manifest import hash_file
+
+# Assets that pages load and browsers may cache for good once their name
+# carries their content hash. Files requested by fixed names (favicon.ico,
+# robots.txt, ...) keep them.
+FINGERPRINT_EXTENSIONS = {
+    ".css", ".js", ".mjs",
+    ".png", ".jpg", ".jpeg", ".gif", ".webp", ".avif", ".svg",
+    ".woff", ".woff2", ".ttf", ".otf",
+}
+
+# Hex digits of the content hash put into a name
+HASH_LENGTH = 8
+
+# Maps every fingerprinted asset's path to its fingerprinted path, both
+# relative to the public directory with "/" separators
+ASSET_MANIFEST_FILENAME = ".asset-manifest.json"
+
+
+def fingerprinted_path(rel_path, content_hash):
+    # "images/tom.png" becomes "images/tom.<hash>.png"
+    base, extension = os.path.splitext(rel_path)
+    return f"{base}.{content_hash[:HASH_LENGTH]}{extension}"
+
+
+def fingerprint_files(files, dest_dir_path, manifest=None, index=None):
+    # Renames the destinations of the (from_path, dest_path) pairs of assets
+    # to fingerprinted ones. Returns the new pairs and the asset names, the
+    # mapping saved by save_asset_names. The hashes are the manifest's (see
+    # BuildManifest.source_hash) when one is given, so unchanged assets aren't
+    # read again.
+    fingerprinted = []
+    asset_names = {}
+    for from_path, dest_path in files:
+        rel_path = os.path.relpath(dest_path, dest_dir_path).replace(os.sep, "/")
+        if os.path.splitext(rel_path)[1].lower() not in FINGERPRINT_EXTENSIONS:
+            fingerprinted.append((from_path, dest_path))
+            continue
+        entry = index.lookup(from_path) if index is not None else None
+        if manifest is not None:
+            content_hash = manifest.source_hash("static", from_path, entry)
+        else:
+            content_hash = hash_file(from_path)
+        asset_names[rel_path] = fingerprinted_path(rel_path, content_hash)
+        fingerprinted.append((from_path, os.path.join(dest_dir_path, asset_names[rel_path])))
+    return fingerprinted, asset_names
+
+
+def save_asset_names(asset_names, dest_dir_path):
+    # Without asset names (fingerprinting is off) an old file is removed
+    path = os.path.join(dest_dir_path, ASSET_MANIFEST_FILENAME)
+    if asset_names is None:
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as manifest_file:
+        json.dump(asset_names, manifest_file, separators=(",", ":"), sort_keys=True)
+    os.replace(tmp_path, path)
+
@@ -0,0 +1,72 @@
+# Micro-benchmark for the node classes: memory per node and construction time,
+# compared with the __dict__ based layout the classes used before __slots__.
+#
+# Run with: python3 src/bench_nodes.py [count]
+import sys
+import timeit
+import tracemalloc
+
+from htmlnode import LeafNode, ParentNode
+from textnode import TextNode, TextType
+
+
+class DictTextNode:
+    def __init__(self, text, text_type, url=None):
+        self.text = text
+        self.text_type = text_type
+        self.url = url
+
+
+class DictHTMLNode:
+    def __init__(self, tag=None, value=None, children=None, props=None):
+        self.tag = tag
+        self.value = value
+        self.children = children
+        self.props = props
+
+
+class DictLeafNode(DictHTMLNode):
+    def __init__(self, tag, value, props=None):
+        super().__init__(tag, value, None, props)
+
+
+class DictParentNode(DictHTMLNode):
+    def __init__(self, tag, children, props=None):
+        super().__init__(tag, None, children, props)
+
+
+def bytes_per_node(factory, count):
+    # The arguments are shared between nodes, so only the nodes themselves are measured
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    nodes = [factory() for _ in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    # The list holding the nodes costs one pointer per node
+    return (after - before) / len(nodes) - 8
+
+
+def ns_per_node(factory, count):
+    return min(timeit.repeat(factory, number=count, repeat=5)) / count * 1e9
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    children = []
+    cases = [
+        ("TextNode", lambda: DictTextNode("text", TextType.BOLD), lambda: TextNode("text", TextType.BOLD)),
+        ("LeafNode", lambda: DictLeafNode("b", "text"), lambda: LeafNode("b", "text")),
+        ("ParentNode", lambda: DictParentNode("p", children), lambda: ParentNode("p", children)),
+    ]
+
+    print(f"{'node':<12}{'bytes before':>14}{'bytes after':>13}{'ns before':>11}{'ns after':>10}")
+    for name, before, after in cases:
+        print(
+            f"{name:<12}"
+            f"{bytes_per_node(before, count):>14.0f}{bytes_per_node(after, count):>13.0f}"
+            f"{ns_per_node(before, count):>11.0f}{ns_per_node(after, count):>10.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+# Benchmarks the generator on a synthetic content tree (see corpus.py).
+#
+# Run with: python3 src/benchmark.py [--pages N] [--shape SHAPE] [--baseline FILE]
+#
+# Each stage runs over every page of the corpus and reports pages/s and MB/s
+# of markdown input. The full build and the search index writes run once, the
+# other stages report the fastest of --repeat runs. Peak RSS covers the whole
+# benchmark process.
+#
+# With --baseline the results are compared to an earlier run saved with
+# --save-baseline, and the exit status is 1 when a stage got slower by more
+# than --tolerance.
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+
+from block_markdown import BlockType, block_lines_to_html_node, blocks_to_html_node, parse_blocks
+from corpus import SHAPES, generate_corpus
+from generate_content import generate_pages_recursive
+from inline_markdown import inline_to_html
+from page_index import PageIndex, page_metadata, set_collect_terms
+from search_index import SearchIndex
+
+# Pages changed before timing an incremental search index update
+SEARCH_CHANGED_PAGES = 10
+
+BENCHMARK_TEMPLATE = '<!doctype html><html><head><title>{{ Title }}</title><link href="/index.css" rel="stylesheet" /></head><body><article>{{ Content }}</article></body></html>'
+
+
+def load_corpus(content_dir_path):
+    sources = []
+    for dir_path, dir_names, file_names in os.walk(content_dir_path):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            if file_name.endswith(".md"):
+                with open(os.path.join(dir_path, file_name)) as markdown_file:
+                    sources.append(markdown_file.read())
+    return sources
+
+
+def timed(function, repeat=1):
+    # Best of `repeat` runs, which is the least noisy figure on a busy machine
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        seconds = time.perf_counter() - started
+        best = seconds if best is None else min(best, seconds)
+    return best
+
+
+def run_stages(content_dir_path, jobs, repeat=3):
+    sources = load_corpus(content_dir_path)
+    pages = len(sources)
+    megabytes = sum(len(source.encode()) for source in sources) / 1e6
+
+    # Inputs of the later stages are prepared outside of their timings. The
+    # stages are the steps generate_page runs on every page.
+    blocks = [block for source in sources for block in parse_blocks(source)]
+    inline_texts = [" ".join(block.lines) for block in blocks if block.block_type == BlockType.paragraph]
+
+    stages = {
+        "parse_blocks": lambda: [list(parse_blocks(source)) for source in sources],
+        "block_lines_to_html_node": lambda: [block_lines_to_html_node(block) for block in blocks],
+        "inline_to_html": lambda: [inline_to_html(text) for text in inline_texts],
+        "blocks_to_html_node.iter_html": lambda: ["".join(blocks_to_html_node(parse_blocks(source)).iter_html())
+                                                  for source in sources],
+    }
+
+    results = {}
+    for name, stage in stages.items():
+        seconds = timed(stage, repeat)
+        results[name] = {"seconds": seconds, "pages_per_second": pages / seconds, "mb_per_second": megabytes / seconds}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        template_path = os.path.join(tmp, "template.html")
+        with open(template_path, "w") as template_file:
+            template_file.write(BENCHMARK_TEMPLATE)
+        dest_dir_path = os.path.join(tmp, "public")
+
+        # Without setup_logging the build logs nothing, so only the build is measured
+        seconds = timed(lambda: generate_pages_recursive(content_dir_path, template_path, dest_dir_path, "/", jobs=jobs))
+        results["generate_pages_recursive"] = {
+            "seconds": seconds, "pages_per_second": pages / seconds, "mb_per_second": megabytes / seconds,
+        }
+        results.update(run_search_stages(sources, dest_dir_path, megabytes, repeat))
+
+    return pages, megabytes, results
+
+
+def run_search_stages(sources, dest_dir_path, megabytes, repeat):
+    # Collecting the pages' search terms, writing the index from scratch, and
+    # updating it after SEARCH_CHANGED_PAGES pages changed. Both writes count
+    # every page of the site, so their pages/s compare.
+    pages = len(sources)
+    set_collect_terms(True)
+    try:
+        seconds = timed(lambda: [page_metadata(source) for source in sources], repeat)
+        results = {"search terms": {"seconds": seconds}}
+        page_index = PageIndex(dest_dir_path)
+        for number, source in enumerate(sources):
+            page_index.record(os.path.join(dest_dir_path, f"page-{number}.html"), page_metadata(source))
+    finally:
+        set_collect_terms(False)
+
+    search = SearchIndex(dest_dir_path)
+    results["search index write"] = {"seconds": timed(lambda: search.write(page_index))}
+
+    # The pages of the next build: a few changed, the rest kept
+    changed = set(range(0, pages, max(1, pages // SEARCH_CHANGED_PAGES)))
+    for number, (rel_path, metadata) in enumerate(page_index.items()):
+        if number in changed:
+            metadata.terms["changed"] = 1
+        page_index.pages[rel_path] = metadata if number in changed else metadata._replace(terms=None)
+    search = SearchIndex(dest_dir_path)
+    results[f"search index update ({len(changed)} pages)"] = {"seconds": timed(lambda: search.write(page_index))}
+
+    for result in results.values():
+        result["pages_per_second"] = pages / result["seconds"]
+        result["mb_per_second"] = megabytes / result["seconds"]
+    return results
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1e6
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale / 1e6
+    return own, children
+
+
+def compare(results, baseline, tolerance):
+    # Prints the change against the baseline and returns the regressed stages
+    regressions = []
+    print()
+    print(f"{'stage':<36}{'baseline p/s':>14}{'now p/s':>12}{'change':>9}")
+    for name, result in results.items():
+        previous = baseline.get("stages", {}).get(name)
+        if previous is None:
+            continue
+        change = result["pages_per_second"] / previous["pages_per_second"] - 1
+        flag = ""
+        if change < -tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<36}{previous['pages_per_second']:>14.0f}{result['pages_per_second']:>12.0f}{change:>+9.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the generator on a synthetic site.")
+    parser.add_argument("--pages", type=int, default=10_000, help="number of pages (default: 10000)")
+    parser.add_argument("--shape", choices=SHAPES, default="mixed", help="kind of content (default: mixed)")
+    parser.add_argument("--seed", type=int, default=0, help="corpus random seed (default: 0)")
+    parser.add_argument("--corpus", help="benchmark an existing content tree instead of generating one")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="worker processes for the full build (default: 1)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="runs per stage, the fastest one counts (default: 3)")
+    parser.add_argument("--baseline", help="compare against results saved with --save-baseline")
+    parser.add_argument("--save-baseline", help="save the results to this file")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="slowdown against the baseline that counts as a regression (default: 0.10)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        content_dir_path = args.corpus
+        if content_dir_path is None:
+            content_dir_path = os.path.join(tmp, "content")
+            print(f"Generating {args.pages} {args.shape} pages...")
+            generate_corpus(content_dir_path, args.pages, args.shape, args.seed)
+        pages, megabytes, results = run_stages(content_dir_path, args.jobs, args.repeat)
+
+    own_rss, children_rss = peak_rss_mb()
+    print(f"{pages} pages, {megabytes:.1f} MB of markdown")
+    print(f"{'stage':<36}{'seconds':>10}{'pages/s':>12}{'MB/s':>9}")
+    for name, result in results.items():
+        print(f"{name:<36}{result['seconds']:>10.3f}{result['pages_per_second']:>12.0f}{result['mb_per_second']:>9.2f}")
+    print(f"peak RSS: {own_rss:.0f} MB (workers: {children_rss:.0f} MB)")
+
+    report = {
+        "corpus": {"pages": pages, "megabytes": megabytes, "shape": args.shape, "seed": args.seed},
+        "jobs": args.jobs,
+        "python": platform.python_version(),
+        "peak_rss_mb": own_rss,
+        "peak_worker_rss_mb": children_rss,
+        "stages": results,
+    }
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as baseline_file:
+            json.dump(report, baseline_file, indent=2)
+            baseline_file.write("\n")
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline.get("corpus", {}).get("pages") != pages or baseline.get("corpus", {}).get("shape") != args.shape:
+            print("Warning: the baseline was recorded on a different corpus")
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+from collections import OrderedDict
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Rough per-entry overhead of the key tuple, the dict slot and the string headers
+_ENTRY_OVERHEAD = 200
+
+
+class BlockCache:
+    # Bounded LRU cache of rendered HTML for markdown blocks.
+    #
+    # Pages often share whole blocks (footers, callouts, list items, headings),
+    # so rendering a block once per build instead of once per page saves the
+    # inline parsing. The size limit counts the characters of the keys and the
+    # cached HTML plus a fixed overhead per entry, and the least recently used
+    # entries are dropped once it is exceeded.
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        html = self.entries.get(key)
+        if html is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return html
+
+    def put(self, key, html):
+        entry_size = _entry_size(key, html)
+        if entry_size > self.max_bytes:
+            return
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.size -= _entry_size(key, old)
+        self.entries[key] = html
+        self.size += entry_size
+        while self.size > self.max_bytes:
+            old_key, old_html = self.entries.popitem(last=False)
+            self.size -= _entry_size(old_key, old_html)
+
+    def summary(self, hits=None, misses=None):
+        # One line for the build summary. Pages rendered in worker processes use
+        # the workers' caches, so the caller can pass the combined counters.
+        hits = self.hits if hits is None else hits
+        misses = self.misses if misses is None else misses
+        lookups = hits + misses
+        rate = hits / lookups if lookups else 0.0
+        return f"Block cache: {hits} hits, {misses} misses ({rate:.1%} hit rate)"
+
+
+def _entry_size(key, html):
+    _, _, lines = key
+    return sum(len(line) for line in lines) + len(html) + _ENTRY_OVERHEAD
@@ -1,8 +1,16 @@
+import time
 from enum import Enum
-from htmlnode import ParentNode
-from inline_markdown import text_to_textnodes
+from htmlnode import LeafNode, ParentNode
+from inline_markdown import inline_to_html, text_to_textnodes
 from textnode import text_node_to_html_node, TextNode, TextType
 
+# Bump when a change to the renderers alters the HTML they produce, so cached
+# blocks rendered by an older version are never reused
+RENDERER_VERSION = 3
+
+# Optional block_cache.BlockCache shared by every markdown_to_html_node call
+_block_cache = None
+
 class BlockType(Enum):
     paragraph = "paragraph"
     heading = "heading"
@@ -12,6 +20,146 @@ class BlockType(Enum):
     ordered_list = "ordered_list"
 
 
+class Block:
+    # A block found by parse_blocks: its type and its lines. Lines are stripped,
+    # except in code blocks, which hold the lines between the fences with only
+    # the fence's own indentation removed.
+    __slots__ = ("block_type", "lines")
+
+    def __init__(self, block_type, lines):
+        self.block_type = block_type
+        self.lines = lines
+
+    def __eq__(self, other):
+        return self.block_type == other.block_type and self.lines == other.lines
+
+    def __repr__(self):
+        return f"Block({self.block_type}, {self.lines})"
+
+def _iter_lines(markdown):
+    # Yields the lines of the document one at a time, without splitting it up front.
+    # The document may also be UTF-8 bytes or a read-only mmap of a file, in
+    # which case each line is decoded on its own and the whole text never
+    # exists as one str. (A newline byte never occurs inside a multi-byte
+    # UTF-8 character, so splitting before decoding is safe.)
+    if not isinstance(markdown, str):
+        yield from _iter_byte_lines(markdown)
+        return
+    position = 0
+    while True:
+        end = markdown.find("\n", position)
+        if end < 0:
+            yield markdown[position:]
+            return
+        yield markdown[position:end]
+        position = end + 1
+
+def _iter_byte_lines(markdown):
+    position = 0
+    size = len(markdown)
+    while True:
+        end = markdown.find(b"\n", position)
+        if end < 0:
+            yield markdown[position:size].decode()
+            return
+        yield markdown[position:end].decode()
+        position = end + 1
+
+def _heading_level(line):
+    # Number of leading #s of a heading line ("#" to "######" and a space), else 0
+    level = 0
+    while level < 7 and line[level:level + 1] == "#":
+        level += 1
+    if 1 <= level <= 6 and line[level:level + 1] == " ":
+        return level
+    return 0
+
+def _classify(lines, all_quote, all_unordered, all_ordered):
+    # Same order of precedence as block_to_block_type
+    if _heading_level(lines[0]):
+        return BlockType.heading
+    if all_quote:
+        return BlockType.quote
+    if all_unordered:
+        return BlockType.unordered_list
+    if all_ordered:
+        return BlockType.ordered_list
+    return BlockType.paragraph
+
+def parse_blocks(markdown):
+    # Splits a document into blocks and classifies them in a single pass over
+    # its lines, yielding Block objects. Each line is looked at once while the
+    # block it belongs to is being collected, so the renderers get the lines
+    # ready to use instead of splitting the block again.
+    #
+    # A block starting with ``` is a fenced code block that runs to the line
+    # starting or ending with the closing fence, blank lines included. A fence
+    # that is never closed only runs to its first blank line, and the lines
+    # after that are parsed as usual.
+    return _parse_lines(_iter_lines(markdown))
+
+def _parse_lines(line_iter):
+    lines = []
+    all_quote = all_unordered = all_ordered = True
+    fence_indent = None
+    # The unchanged lines of an open fence, in case it is never closed
+    fence_lines = None
+
+    for line in line_iter:
+        if fence_indent is not None:
+            stripped = line.strip()
+            if stripped.startswith("```") or stripped.endswith("```"):
+                # Code in front of the closing fence is the block's last line
+                if not stripped.startswith("```"):
+                    lines.append(_code_line(line.rstrip()[:-3], fence_indent))
+                yield Block(BlockType.code, lines)
+                lines = []
+                fence_indent = fence_lines = None
+                continue
+            fence_lines.append(line)
+            lines.append(_code_line(line, fence_indent))
+            continue
+
+        stripped = line.strip()
+        if not stripped:
+            if lines:
+                yield Block(_classify(lines, all_quote, all_unordered, all_ordered), lines)
+                lines = []
+                all_quote = all_unordered = all_ordered = True
+            continue
+
+        if not lines and stripped.startswith("```"):
+            if len(stripped) > 3 and stripped.endswith("```"):
+                # ```code``` on a single line
+                yield Block(BlockType.code, [])
+            else:
+                fence_indent = len(line) - len(line.lstrip())
+                fence_lines = []
+            continue
+
+        if all_quote and not stripped.startswith(">"):
+            all_quote = False
+        if all_unordered and not stripped.startswith("- "):
+            all_unordered = False
+        if all_ordered and not stripped.startswith(f"{len(lines) + 1}. "):
+            all_ordered = False
+        lines.append(stripped)
+
+    if fence_indent is not None:
+        blank = next((number for number, line in enumerate(fence_lines) if not line.strip()), None)
+        if blank is None:
+            yield Block(BlockType.code, lines)
+        else:
+            yield Block(BlockType.code, lines[:blank])
+            yield from _parse_lines(iter(fence_lines[blank:]))
+    elif lines:
+        yield Block(_classify(lines, all_quote, all_unordered, all_ordered), lines)
+
+def _code_line(line, fence_indent):
+    # Keep the code's own indentation, only drop the fence's
+    indent = len(line) - len(line.lstrip())
+    return line[min(indent, fence_indent):].rstrip()
+
 def markdown_to_blocks(markdown):
     # Split into lines
     lines = markdown.split('\n')
@@ -75,31 +223,101 @@ def block_to_block_type(block):
     # paragraph
     return BlockType.paragraph
 
-def markdown_to_html_node(markdown):
+def markdown_to_html_node(markdown, timings=None):
     # converts a full markdown document into a single parent HTMLNode. 
     # That one parent HTMLNode should (obviously) contain many child HTMLNode objects representing the nested elements.
-    blocks = markdown_to_blocks(markdown)
+    # When a timings dict is passed, the seconds spent per phase are added to it.
+    # The markdown may be a str, or UTF-8 bytes or an mmap (see _iter_lines).
+    return blocks_to_html_node(parse_blocks(markdown), timings)
+
+def blocks_to_html_node(blocks, timings=None):
+    # Same as markdown_to_html_node for an iterable of parsed Blocks, so the
+    # caller can look at the blocks on their way through
+    if timings is not None:
+        return _timed_blocks_to_html_node(blocks, timings)
+
+    render_block = block_lines_to_html_node if _block_cache is None else _cached_block_to_html_node
+    child_nodes = [render_block(block) for block in blocks]
+    return ParentNode(tag="div", children=child_nodes)
+
+def set_block_cache(cache):
+    # Makes markdown_to_html_node reuse rendered blocks from the given
+    # BlockCache, or stops caching when cache is None
+    global _block_cache
+    _block_cache = cache
+
+def get_block_cache():
+    return _block_cache
+
+def _cached_block_to_html_node(block):
+    # Cached blocks come back as a single untagged leaf holding their HTML
+    key = (RENDERER_VERSION, block.block_type, tuple(block.lines))
+    html = _block_cache.get(key)
+    if html is None:
+        html = block_lines_to_html_node(block).to_html()
+        _block_cache.put(key, html)
+    return LeafNode(None, html)
+
+def _timed_blocks_to_html_node(blocks, timings):
+    # Blocks are classified while they are parsed, so "block parsing"
+    # covers both splitting and classification. "block render" is the rest of
+    # the work on each block: its inline markdown and its HTML nodes, or with
+    # the block cache, the lookup and the HTML of missed blocks.
+    parsing = 0.0
+    rendering = 0.0
     child_nodes = []
+    render_block = block_lines_to_html_node if _block_cache is None else _cached_block_to_html_node
 
-    for block in blocks:
-        block_type = block_to_block_type(block)
-        
-        match block_type:
-            case BlockType.heading:
-                child_nodes.append(header_to_html(block))
-            case BlockType.code:
-                child_nodes.append(code_to_html(block))
-            case BlockType.quote:
-                child_nodes.append(quote_to_html(block))
-            case BlockType.unordered_list:
-                child_nodes.append(unordered_list_to_html(block))
-            case BlockType.ordered_list:
-                child_nodes.append(ordered_list_to_html(block))
-            case BlockType.paragraph:
-                child_nodes.append(paragraph_to_html(block))
-            case _:
-                raise ValueError("Invalid block type")
+    blocks = iter(blocks)
+    while True:
+        started = time.perf_counter()
+        block = next(blocks, None)
+        parsed = time.perf_counter()
+        parsing += parsed - started
+        if block is None:
+            break
+        child_nodes.append(render_block(block))
+        rendering += time.perf_counter() - parsed
+
+    for phase, seconds in (("block parsing", parsing), ("block render", rendering)):
+        timings[phase] = timings.get(phase, 0.0) + seconds
     return ParentNode(tag="div", children=child_nodes)
+
+def block_lines_to_html_node(block):
+    # Renders a Block from parse_blocks
+    lines = block.lines
+    match block.block_type:
+        case BlockType.heading:
+            return heading_lines_to_html(lines)
+        case BlockType.code:
+            return code_lines_to_html(lines)
+        case BlockType.quote:
+            return quote_lines_to_html(lines)
+        case BlockType.unordered_list:
+            return unordered_list_lines_to_html(lines)
+        case BlockType.ordered_list:
+            return ordered_list_lines_to_html(lines)
+        case BlockType.paragraph:
+            return paragraph_lines_to_html(lines)
+        case _:
+            raise ValueError("Invalid block type")
+
+def block_to_html_node(block, block_type):
+    match block_type:
+        case BlockType.heading:
+            return header_to_html(block)
+        case BlockType.code:
+            return code_to_html(block)
+        case BlockType.quote:
+            return quote_to_html(block)
+        case BlockType.unordered_list:
+            return unordered_list_to_html(block)
+        case BlockType.ordered_list:
+            return ordered_list_to_html(block)
+        case BlockType.paragraph:
+            return paragraph_to_html(block)
+        case _:
+            raise ValueError("Invalid block type")
         
 def get_header_tag(block):
     if block.startswith("######"):
@@ -118,6 +336,7 @@ def get_header_tag(block):
         raise ValueError("Too many # for a heading section / heading section doesn't exist")
 
 def text_to_children(text):
+    # Builds one node per inline span, for callers that want to work with the tree
     text_nodes = text_to_textnodes(text)
     child_nodes = []
     for text_node in text_nodes:
@@ -125,15 +344,29 @@ def text_to_children(text):
         child_nodes.append(html_node)
     return child_nodes
 
+def text_to_html_children(text):
+    # Fast path used by the block renderers: the inline markdown is rendered
+    # straight to HTML and kept in a single untagged leaf
+    return [LeafNode(None, inline_to_html(text))]
+
+# The *_to_html functions take a block string as returned by markdown_to_blocks,
+# the *_lines_to_html ones take the lines of a Block from parse_blocks
+
 def paragraph_to_html(block):
-    child_nodes = text_to_children(" ".join(block.split("\n")))
+    return paragraph_lines_to_html(block.split("\n"))
+
+def paragraph_lines_to_html(lines):
+    child_nodes = text_to_html_children(" ".join(lines))
     return ParentNode(tag="p", children=child_nodes)
 
 def code_to_html(block):
     if not block.startswith("```") or not block.endswith("```"):
         raise ValueError("Invalid code block")
     lines = block.split("\n")
-    code_text = "\n".join(lines[1:-1]) + "\n"
+    return code_lines_to_html(lines[1:-1])
+
+def code_lines_to_html(lines):
+    code_text = "\n".join(lines) + "\n"
    
     text_node = TextNode(code_text, TextType.NORMAL)
     code_node = text_node_to_html_node(text_node)
@@ -141,34 +374,48 @@ def code_to_html(block):
 
 def quote_to_html(block):
     lines = block.split("\n")
-    stripped_lines = []
     for line in lines:
         if not line.startswith(">"):
             raise ValueError("Invalid quote block")
-        stripped_lines.append(line.lstrip(">").strip())
-    text = " ".join(line.strip() for line in stripped_lines).replace("  ", " ")
-    child_nodes = text_to_children(text)
+    return quote_lines_to_html(lines)
+
+def quote_lines_to_html(lines):
+    text = " ".join(line.lstrip(">").strip() for line in lines).replace("  ", " ")
+    child_nodes = text_to_html_children(text)
     return ParentNode(tag="blockquote", children=child_nodes)
 
 def header_to_html(block):
     header_level, tag = get_header_tag(block)
-    child_nodes = text_to_children(block[header_level+1:])
+    child_nodes = text_to_html_children(block[header_level+1:])
     return ParentNode(tag=tag, children=child_nodes)
 
+def heading_lines_to_html(lines):
+    header_level = _heading_level(lines[0])
+    text = lines[0][header_level+1:]
+    if len(lines) > 1:
+        text = "\n".join([text] + lines[1:])
+    child_nodes = text_to_html_children(text)
+    return ParentNode(tag=f"h{header_level}", children=child_nodes)
+
 def ordered_list_to_html(block):
-    olist_items = block.split("\n")
+    return ordered_list_lines_to_html(block.split("\n"))
+
+def ordered_list_lines_to_html(lines):
     html_items = []
-    for item in olist_items:
-        text = item[3:]
-        child_nodes = text_to_children(text)
+    for i, item in enumerate(lines, 1):
+        # Skip the "1. " marker, whatever the number of digits
+        text = item[len(str(i)) + 2:]
+        child_nodes = text_to_html_children(text)
         html_items.append(ParentNode(tag="li", children=child_nodes))
     return ParentNode(tag="ol", children=html_items)
 
 def unordered_list_to_html(block):
-    ulist_items = block.split("\n")
+    return unordered_list_lines_to_html(block.split("\n"))
+
+def unordered_list_lines_to_html(lines):
     html_items = []
-    for item in ulist_items:
+    for item in lines:
         text = item[2:]
-        child_nodes = text_to_children(text)
+        child_nodes = text_to_html_children(text)
         html_items.append(ParentNode(tag="li", children=child_nodes))
     return ParentNode(tag="ul", children=html_items)
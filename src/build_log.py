@@ -0,0 +1,145 @@
+import json
+import logging
+import logging.handlers
+import sys
+import time
+
+# Every module logs through this logger (or a child of it). Nothing is shown
+# until setup_logging installs a handler, so the generator stays quiet when it
+# is used as a library, e.g. by the benchmark.
+logger = logging.getLogger("ssg")
+
+LOG_FORMATS = ("text", "json")
+
+# Records held back before they are written, unless a warning arrives or the
+# oldest one has waited FLUSH_INTERVAL seconds
+BUFFER_CAPACITY = 1000
+FLUSH_INTERVAL = 1.0
+
+# Seconds between two progress lines
+PROGRESS_INTERVAL = 2.0
+
+
+class BufferedHandler(logging.handlers.MemoryHandler):
+    # A MemoryHandler that also flushes when it has held records for a while,
+    # so a slow build still shows its progress
+
+    def __init__(self, target, capacity=BUFFER_CAPACITY, flush_interval=FLUSH_INTERVAL):
+        super().__init__(capacity, flushLevel=logging.WARNING, target=target, flushOnClose=True)
+        self.flush_interval = flush_interval
+        self.last_flush = time.monotonic()
+
+    def shouldFlush(self, record):
+        return super().shouldFlush(record) or time.monotonic() - self.last_flush >= self.flush_interval
+
+    def flush(self):
+        super().flush()
+        self.last_flush = time.monotonic()
+
+
+class JSONFormatter(logging.Formatter):
+    # One JSON object per line. Values passed as extra={"fields": {...}} are
+    # added to the object, so log processors don't have to parse the message.
+
+    def format(self, record):
+        entry = {
+            "time": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+def setup_logging(level=logging.INFO, log_format="text", stream=None, buffered=True):
+    # Routes the generator's log records to stream (stdout by default) and
+    # returns the installed handler. Writes go through a BufferedHandler unless
+    # buffered is False, which suits interactive use like the dev server.
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f"Unknown log format: {log_format}")
+    stream_handler = logging.StreamHandler(sys.stdout if stream is None else stream)
+    if log_format == "json":
+        stream_handler.setFormatter(JSONFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter("%(message)s"))
+    handler = BufferedHandler(stream_handler) if buffered else stream_handler
+
+    for old in list(logger.handlers):
+        logger.removeHandler(old)
+        old.close()
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+    return handler
+
+
+def flush_log():
+    for handler in logger.handlers:
+        handler.flush()
+
+
+def unbuffer_log():
+    # Called in worker processes, which end without flushing their handlers.
+    # Records the parent buffered before the fork are dropped so they aren't
+    # written twice, and the worker's own records are written right away.
+    for handler in logger.handlers:
+        if isinstance(handler, BufferedHandler):
+            handler.acquire()
+            try:
+                handler.buffer.clear()
+                handler.capacity = 1
+            finally:
+                handler.release()
+
+
+def _format_seconds(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+class Progress:
+    # Logs how far a stage is, instead of one line per file: a count with the
+    # rate and the estimated time left, at most every PROGRESS_INTERVAL seconds
+    # and once at the end (see finish).
+
+    def __init__(self, label, total, unit="files", interval=PROGRESS_INTERVAL):
+        self.label = label
+        self.total = total
+        self.unit = unit
+        self.interval = interval
+        self.done = 0
+        self.started = time.monotonic()
+        self.last_report = self.started
+
+    def advance(self, count=1):
+        self.done += count
+        now = time.monotonic()
+        if now - self.last_report >= self.interval and self.done < self.total:
+            self.last_report = now
+            self._report(now)
+
+    def finish(self):
+        if self.done:
+            self._report(time.monotonic())
+
+    def _report(self, now):
+        elapsed = now - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        fields = {"stage": self.label, "done": self.done, "total": self.total,
+                  "rate": round(rate, 1), "elapsed": round(elapsed, 3)}
+        if self.done < self.total:
+            eta = (self.total - self.done) / rate if rate > 0 else None
+            fields["eta"] = round(eta, 1) if eta is not None else None
+            eta_text = _format_seconds(eta) if eta is not None else "?"
+            message = (f"{self.label}: {self.done}/{self.total} ({self.done / self.total:.0%}), "
+                       f"{rate:.0f} {self.unit}/s, ETA {eta_text}")
+        else:
+            message = f"{self.label}: {self.done} {self.unit} in {elapsed:.2f}s ({rate:.0f} {self.unit}/s)"
+        logger.info(message, extra={"fields": fields})
@@ -0,0 +1,179 @@
+import hashlib
+import json
+import os
+
+# Bump this whenever a change to the generator alters the HTML it produces,
+# so that incremental builds don't keep serving stale pages.
+GENERATOR_VERSION = "3"
+
+MANIFEST_FILENAME = ".build-manifest.json"
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BuildManifest:
+    # Records what every output in the public directory was built from, so the
+    # next build can skip outputs whose inputs are unchanged.
+    #
+    # Each entry is keyed by source path and stores the source's size, mtime and
+    # content hash together with the output it produced. Size and mtime are only
+    # a shortcut: when they differ we fall back to comparing the hash, so a
+    # `touch` or a fresh checkout doesn't force a rebuild.
+    #
+    # Pages also depend on the template and the basepath. If either of them (or
+    # the generator version) changed since the last build, the recorded page
+    # entries are dropped and every page is rebuilt.
+
+    def __init__(self, dest_dir_path, template_hash, basepath):
+        self.path = os.path.join(dest_dir_path, MANIFEST_FILENAME)
+        self.template_hash = template_hash
+        self.basepath = basepath
+        self.previous = {"pages": {}, "static": {}}
+        self.current = {"pages": {}, "static": {}}
+        self.rebuilt = 0
+        self.skipped = 0
+
+        old = self._load()
+        if old is None or old.get("generator_version") != GENERATOR_VERSION:
+            return
+        self.previous["static"] = old.get("static", {})
+        if old.get("template_hash") == template_hash and old.get("basepath") == basepath:
+            self.previous["pages"] = old.get("pages", {})
+        else:
+            # Keep the old outputs around only so stale ones can be cleaned up
+            self.previous["pages"] = {
+                source: {"dest": entry["dest"]} for source, entry in old.get("pages", {}).items()
+            }
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as manifest_file:
+                return json.load(manifest_file)
+        except (OSError, ValueError):
+            return None
+
+    def is_up_to_date(self, section, from_path, dest_path, index_entry=None):
+        # Checks whether dest_path still matches from_path and records the
+        # source for this build either way. The caller rebuilds on False.
+        # index_entry is the source's file_index.IndexEntry, if it is known.
+        if index_entry is not None:
+            size, mtime = index_entry.size, index_entry.mtime
+        else:
+            stat = os.stat(from_path)
+            size, mtime = stat.st_size, stat.st_mtime_ns
+        old = self.previous[section].get(from_path)
+        entry = {"dest": dest_path, "size": size, "mtime": mtime}
+
+        fresh = False
+        if old is not None and old.get("dest") == dest_path and os.path.exists(dest_path):
+            if old.get("size") == size and old.get("mtime") == mtime:
+                entry["hash"] = old["hash"]
+                fresh = True
+            elif old.get("size") == size and "hash" in old:
+                entry["hash"] = hash_file(from_path)
+                fresh = entry["hash"] == old["hash"]
+        if "hash" not in entry:
+            entry["hash"] = hash_file(from_path)
+
+        self.current[section][from_path] = entry
+        if fresh:
+            self.skipped += 1
+        else:
+            self.rebuilt += 1
+        return fresh
+
+    def source_hash(self, section, from_path, index_entry=None):
+        # The content hash of a source, taken from the last build while its
+        # size and mtime are unchanged
+        if index_entry is not None:
+            size, mtime = index_entry.size, index_entry.mtime
+        else:
+            stat = os.stat(from_path)
+            size, mtime = stat.st_size, stat.st_mtime_ns
+        old = self.previous[section].get(from_path)
+        if old is not None and "hash" in old and old.get("size") == size and old.get("mtime") == mtime:
+            return old["hash"]
+        return hash_file(from_path)
+
+    def add_dependents(self, count):
+        # Counts pages that were up to date themselves but are rebuilt because
+        # something they depend on changed (see dependency_graph.py)
+        self.skipped -= count
+        self.rebuilt += count
+
+    def output_hashes(self, section):
+        # Maps the outputs recorded in this build to the hashes of their sources
+        return {os.path.normpath(entry["dest"]): entry["hash"] for entry in self.current[section].values()}
+
+    def remove_stale_outputs(self):
+        # Deletes outputs whose sources no longer exist, or that were replaced
+        # by an output of another name (e.g. a new fingerprint of an asset)
+        removed = []
+        for section in ("pages", "static"):
+            for source, entry in self.previous[section].items():
+                current = self.current[section].get(source)
+                if current is not None and current["dest"] == entry["dest"]:
+                    continue
+                dest_path = entry["dest"]
+                if os.path.isfile(dest_path):
+                    os.remove(dest_path)
+                    removed.append(dest_path)
+                    remove_empty_dirs(os.path.dirname(dest_path), os.path.dirname(self.path))
+        return removed
+
+    def save(self):
+        data = {
+            "generator_version": GENERATOR_VERSION,
+            "template_hash": self.template_hash,
+            "basepath": self.basepath,
+            "pages": self.current["pages"],
+            "static": self.current["static"],
+        }
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as manifest_file:
+            json.dump(data, manifest_file, separators=(",", ":"), sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def forget_sources(dest_dir_path, from_paths, all_pages=False):
+    # Drops the entries of sources whose outputs were written outside of a
+    # build (by the dev server), so the next incremental build rebuilds them
+    # instead of taking a source edited back to its recorded content for up to
+    # date. With all_pages, every page's entry is dropped. The dependency graph
+    # and page index are left as they are: the rebuilt pages are compared
+    # against them as usual, which rebuilds their dependents where needed.
+    path = os.path.join(dest_dir_path, MANIFEST_FILENAME)
+    try:
+        with open(path, "r") as manifest_file:
+            old = json.load(manifest_file)
+    except (OSError, ValueError):
+        return
+    from_paths = {os.path.normpath(from_path) for from_path in from_paths}
+    for section in ("pages", "static"):
+        entries = old.get(section, {})
+        for source in list(entries):
+            if (all_pages and section == "pages") or os.path.normpath(source) in from_paths:
+                del entries[source]
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as manifest_file:
+        json.dump(old, manifest_file, separators=(",", ":"), sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def remove_empty_dirs(dir_path, stop_dir_path):
+    # Walks up from dir_path removing empty directories, never touching stop_dir_path
+    stop_dir_path = os.path.abspath(stop_dir_path)
+    dir_path = os.path.abspath(dir_path)
+    while dir_path != stop_dir_path and dir_path.startswith(stop_dir_path + os.sep):
+        try:
+            os.rmdir(dir_path)
+        except OSError:
+            return
+        dir_path = os.path.dirname(dir_path)
@@ -1,18 +1,157 @@
+import errno
 import os
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 
+from asset_fingerprints import fingerprint_files
+from build_log import Progress, logger
+from file_index import FileIndex
 
-def copy_static_files_recursively(source_dir_path, dest_dir_path):
-    if not os.path.exists(dest_dir_path):
-        os.mkdir(dest_dir_path)
+# How assets get into the public directory:
+#   copy     - a regular copy (the kernel's sendfile fast path on Linux)
+#   hardlink - os.link to the source, falling back to a copy across filesystems
+#   reflink  - a copy-on-write clone where the filesystem supports it (btrfs,
+#              xfs), then copy_file_range, then a regular copy
+ASSET_MODES = ("copy", "hardlink", "reflink")
 
-    source_dir_content = os.listdir(source_dir_path)    
+# Copying is I/O bound, so more threads than cores pays off
+DEFAULT_COPY_THREADS = min(32, (os.cpu_count() or 1) * 4)
 
-    for item in source_dir_content:
-        from_path = os.path.join(source_dir_path, item)
-        dest_path = os.path.join(dest_dir_path, item)
-        print(f" * {from_path} -> {dest_path}")
-        if os.path.isfile(from_path):
-            shutil.copy(from_path, dest_path)
-        else:
-            copy_static_files_recursively(from_path, dest_path)
+# ioctl request number of FICLONE from linux/fs.h
+_FICLONE = 0x40049409
+
+
+def collect_static_files(source_dir_path, dest_dir_path, index=None):
+    # Returns (from_path, dest_path) pairs for every file under source_dir_path,
+    # creating the destination directories on the way. index is the tree's
+    # file_index.FileIndex, scanned here when not given.
+    if index is None:
+        index = FileIndex(source_dir_path)
+
+    os.makedirs(dest_dir_path, exist_ok=True)
+    for entry in index.dirs():
+        os.makedirs(os.path.join(dest_dir_path, entry.rel_path), exist_ok=True)
+    return [(index.path(entry), os.path.join(dest_dir_path, entry.rel_path)) for entry in index.files()]
+
+
+def dest_matches_source(from_path, dest_path, entry=None):
+    # Copies keep the source's mtime, so an equal size and mtime (or the very
+    # same inode, for hardlinks) means the destination is already up to date.
+    # entry is the source's file_index.IndexEntry, if it is known.
+    try:
+        dest_stat = os.stat(dest_path)
+    except FileNotFoundError:
+        return False
+    if entry is not None:
+        # A hardlink shares the source's size and mtime as well
+        return dest_stat.st_size == entry.size and dest_stat.st_mtime_ns == entry.mtime
+    source_stat = os.stat(from_path)
+    if (dest_stat.st_dev, dest_stat.st_ino) == (source_stat.st_dev, source_stat.st_ino):
+        return True
+    return dest_stat.st_size == source_stat.st_size and dest_stat.st_mtime_ns == source_stat.st_mtime_ns
+
+
+def _reflink_or_copy_range(from_path, tmp_path):
+    with open(from_path, "rb") as source_file, open(tmp_path, "wb") as dest_file:
+        try:
+            import fcntl
+            fcntl.ioctl(dest_file.fileno(), _FICLONE, source_file.fileno())
+            return
+        except (ImportError, OSError):
+            pass
+
+        if hasattr(os, "copy_file_range"):
+            try:
+                remaining = os.fstat(source_file.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(source_file.fileno(), dest_file.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+                if remaining == 0:
+                    return
+            except OSError:
+                pass
+
+        source_file.seek(0)
+        dest_file.seek(0)
+        dest_file.truncate()
+        shutil.copyfileobj(source_file, dest_file)
+
+
+def sync_file(from_path, dest_path, mode="copy"):
+    # Puts from_path at dest_path. The file is first written next to the
+    # destination and then renamed over it, so readers never see half a file.
+    tmp_path = dest_path + ".tmp"
+    if mode == "hardlink":
+        try:
+            if os.path.lexists(tmp_path):
+                os.remove(tmp_path)
+            os.link(from_path, tmp_path)
+            os.replace(tmp_path, dest_path)
+            return
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                raise
+
+    if mode == "reflink":
+        _reflink_or_copy_range(from_path, tmp_path)
+    else:
+        shutil.copyfile(from_path, tmp_path)
+    shutil.copymode(from_path, tmp_path)
+    # Keep the source's timestamps, dest_matches_source relies on them
+    stat = os.stat(from_path)
+    os.utime(tmp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    os.replace(tmp_path, dest_path)
+
+
+def sync_files(files, manifest=None, mode="copy", threads=DEFAULT_COPY_THREADS, index=None):
+    # Copies the (from_path, dest_path) pairs that are out of date and returns
+    # the ones it copied. Files are up to date when the manifest of an
+    # incremental build says so, or when the destination's size and mtime match.
+    # The sources' sizes and mtimes are taken from the index when given.
+    if mode not in ASSET_MODES:
+        raise ValueError(f"Unknown asset mode: {mode}")
+
+    pending = []
+    for from_path, dest_path in files:
+        entry = index.lookup(from_path) if index is not None else None
+        if manifest is not None and manifest.is_up_to_date("static", from_path, dest_path, entry):
+            continue
+        if dest_matches_source(from_path, dest_path, entry):
+            continue
+        pending.append((from_path, dest_path))
+
+    progress = Progress("Files copied", len(pending))
+    if threads <= 1 or len(pending) <= 1:
+        for from_path, dest_path in pending:
+            sync_file(from_path, dest_path, mode)
+            logger.debug(f" * {from_path} -> {dest_path}")
+            progress.advance()
+        progress.finish()
+        return pending
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        copies = [executor.submit(sync_file, from_path, dest_path, mode) for from_path, dest_path in pending]
+        for (from_path, dest_path), copy in zip(pending, copies):
+            copy.result()
+            logger.debug(f" * {from_path} -> {dest_path}")
+            progress.advance()
+    progress.finish()
+    return pending
+
+
+def copy_static_files_recursively(source_dir_path, dest_dir_path, manifest=None, mode="copy", threads=DEFAULT_COPY_THREADS,
+                                  shard=None, asset_names=None):
+    # With a shard.Shard, only the files of that shard are copied. When an
+    # asset_names dict is given, assets get fingerprinted names (see
+    # asset_fingerprints.py), which are added to it. Every shard fingerprints
+    # all assets, since its pages may link to any of them.
+    index = FileIndex(source_dir_path)
+    files = collect_static_files(source_dir_path, dest_dir_path, index)
+    if asset_names is not None:
+        files, names = fingerprint_files(files, dest_dir_path, manifest, index)
+        asset_names.update(names)
+    if shard is not None:
+        files = shard.select(files, dest_dir_path)
+    return sync_files(files, manifest, mode, threads, index)
@@ -0,0 +1,145 @@
+# Generates synthetic content trees for benchmarking the generator.
+#
+# Run with: python3 src/corpus.py DEST_DIR [--pages N] [--shape SHAPE] [--seed N]
+import argparse
+import os
+import random
+
+SHAPES = ("mixed", "link-heavy", "list-heavy", "code-heavy", "deep")
+
+# Pages per directory, and directory nesting for the "deep" shape
+PAGES_PER_DIR = 100
+DEEP_NESTING = 8
+
+_WORDS = (
+    "hobbit shire ring wizard elf dwarf mountain river forest road journey "
+    "council tower king steward ranger horse sword shadow light star song "
+    "valley bridge gate hall fire water stone tree leaf wind north south"
+).split()
+
+
+class _PageWriter:
+    def __init__(self, rng, page_count):
+        self.rng = rng
+        self.page_count = page_count
+
+    def words(self, count):
+        return " ".join(self.rng.choice(_WORDS) for _ in range(count))
+
+    def sentence(self):
+        return self.words(self.rng.randint(6, 14)).capitalize() + "."
+
+    def inline(self, link_ratio=0.1):
+        # A line of text with the occasional bold, italic, code span and link
+        parts = []
+        for _ in range(self.rng.randint(2, 5)):
+            roll = self.rng.random()
+            if roll < link_ratio:
+                parts.append(f"[{self.words(2)}](/page-{self.rng.randrange(self.page_count)})")
+            elif roll < link_ratio + 0.1:
+                parts.append(f"**{self.words(2)}**")
+            elif roll < link_ratio + 0.2:
+                parts.append(f"*{self.words(2)}*")
+            elif roll < link_ratio + 0.25:
+                parts.append(f"`{self.rng.choice(_WORDS)}()`")
+            else:
+                parts.append(self.sentence())
+        return " ".join(parts)
+
+    def paragraph(self, link_ratio=0.1):
+        return "\n".join(self.inline(link_ratio) for _ in range(self.rng.randint(1, 4)))
+
+    def unordered_list(self, items):
+        return "\n".join(f"- {self.inline()}" for _ in range(items))
+
+    def ordered_list(self, items):
+        return "\n".join(f"{i}. {self.inline()}" for i in range(1, items + 1))
+
+    def code(self, lines):
+        body = "\n".join(
+            f"{'    ' * self.rng.randint(0, 2)}{self.rng.choice(_WORDS)} = {self.rng.choice(_WORDS)}({self.rng.randint(0, 99)})"
+            for _ in range(lines)
+        )
+        return f"```\n{body}\n```"
+
+    def quote(self):
+        return "\n".join(f"> {self.sentence()}" for _ in range(self.rng.randint(1, 3)))
+
+    def image(self):
+        return f"![{self.words(3)}](/images/{self.rng.choice(_WORDS)}.png)"
+
+    def page(self, index, shape):
+        blocks = [f"# Page {index}: {self.words(4)}"]
+        if self.rng.random() < 0.3:
+            blocks.append(self.image())
+        for _ in range(self.rng.randint(6, 14)):
+            if shape == "link-heavy":
+                blocks.append(self.rng.choice([
+                    lambda: self.paragraph(link_ratio=0.7),
+                    lambda: "\n".join(f"- [{self.words(3)}](/page-{self.rng.randrange(self.page_count)})"
+                                      for _ in range(self.rng.randint(10, 30))),
+                ])())
+            elif shape == "list-heavy":
+                blocks.append(self.rng.choice([
+                    lambda: self.unordered_list(self.rng.randint(5, 20)),
+                    lambda: self.ordered_list(self.rng.randint(5, 20)),
+                    self.paragraph,
+                ])())
+            elif shape == "code-heavy":
+                blocks.append(self.rng.choice([
+                    lambda: self.code(self.rng.randint(5, 40)),
+                    lambda: self.code(self.rng.randint(5, 40)),
+                    self.paragraph,
+                ])())
+            else:
+                blocks.append(self.rng.choice([
+                    self.paragraph,
+                    self.paragraph,
+                    lambda: f"## {self.words(3)}",
+                    lambda: self.unordered_list(self.rng.randint(2, 8)),
+                    lambda: self.ordered_list(self.rng.randint(2, 8)),
+                    lambda: self.code(self.rng.randint(2, 10)),
+                    self.quote,
+                ])())
+        return "\n\n".join(blocks) + "\n"
+
+
+def page_rel_path(index, shape):
+    if shape == "deep":
+        # Spread pages over a tree DEEP_NESTING directories deep
+        parts = [f"level-{(index // PAGES_PER_DIR + depth) % 10}" for depth in range(DEEP_NESTING)]
+        return os.path.join(*parts, f"page-{index}", "index.md")
+    return os.path.join(f"section-{index // PAGES_PER_DIR}", f"page-{index}", "index.md")
+
+
+def generate_corpus(dest_dir_path, pages, shape="mixed", seed=0):
+    # Writes `pages` markdown pages of the given shape under dest_dir_path and
+    # returns the total number of markdown bytes written. The same arguments
+    # always produce the same tree.
+    if shape not in SHAPES:
+        raise ValueError(f"Unknown corpus shape: {shape}")
+    writer = _PageWriter(random.Random(seed), pages)
+    total_bytes = 0
+    for index in range(pages):
+        path = os.path.join(dest_dir_path, page_rel_path(index, shape))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        markdown = writer.page(index, shape)
+        with open(path, "w") as page_file:
+            page_file.write(markdown)
+        total_bytes += len(markdown.encode())
+    return total_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic content tree.")
+    parser.add_argument("dest", help="directory to write the content tree to")
+    parser.add_argument("--pages", type=int, default=10_000, help="number of pages (default: 10000)")
+    parser.add_argument("--shape", choices=SHAPES, default="mixed", help="kind of content (default: mixed)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed (default: 0)")
+    args = parser.parse_args()
+    total_bytes = generate_corpus(args.dest, args.pages, args.shape, args.seed)
+    print(f"Wrote {args.pages} pages ({total_bytes / 1e6:.1f} MB) to {args.dest}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import json
+import os
+
+from build_manifest import GENERATOR_VERSION
+
+GRAPH_FILENAME = ".dependency-graph.json"
+
+
+def link_targets(url, page_dest_path, dest_dir_path):
+    # Returns the output paths a link or image URL on a page can point at, or
+    # an empty list for URLs outside the site. A URL without an extension can
+    # be served by either "<path>.html" or "<path>/index.html", so both count.
+    url = url.split("#", 1)[0].split("?", 1)[0]
+    if not url or "://" in url or url.startswith(("//", "mailto:", "tel:")):
+        return []
+    if url.startswith("/"):
+        path = os.path.join(dest_dir_path, url.lstrip("/"))
+    else:
+        path = os.path.join(os.path.dirname(page_dest_path), url)
+    path = os.path.normpath(path)
+    if url.endswith("/"):
+        return [os.path.join(path, "index.html")]
+    if os.path.splitext(path)[1]:
+        return [path]
+    return [path + ".html", os.path.join(path, "index.html")]
+
+
+class DependencyGraph:
+    # Records what every page's output depends on besides its own markdown, so
+    # an incremental build can rebuild the dependents of a change and nothing
+    # else.
+    #
+    # Pages are keyed by their output path and depend on nodes of three kinds:
+    #   ("template", path)  the template the page was rendered with
+    #   ("title", output)   the title of a page it links to
+    #   ("image", output)   an image it references
+    # A template or image changed when its hash differs from the last build, and
+    # a title changed when the linked page was added, removed or retitled. Since
+    # rebuilding a page can change its title, dependents are followed until no
+    # more titles change (see generate_pages_recursive).
+
+    def __init__(self, dest_dir_path):
+        self.dest_dir_path = os.path.normpath(dest_dir_path)
+        self.path = os.path.join(dest_dir_path, GRAPH_FILENAME)
+        self.previous = {"pages": {}, "templates": {}, "images": {}}
+        self.current = {"pages": {}, "templates": {}}
+        self.image_hashes = {}
+
+        old = self._load()
+        if old is not None and old.get("generator_version") == GENERATOR_VERSION:
+            for section in self.previous:
+                self.previous[section] = old.get(section, {})
+
+        # Reverse edges of the previous build: node -> pages depending on it
+        self.dependents = {}
+        for page, entry in self.previous["pages"].items():
+            nodes = [("template", entry["template"])]
+            nodes += [("title", target) for target in entry["links"]]
+            nodes += [("image", target) for target in entry["images"]]
+            for node in nodes:
+                self.dependents.setdefault(node, set()).add(page)
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as graph_file:
+                return json.load(graph_file)
+        except (OSError, ValueError):
+            return None
+
+    def record_template(self, template_path, template_hash):
+        # Returns the changed node, or None when the template is unchanged
+        self.current["templates"][template_path] = template_hash
+        if self.previous["templates"].get(template_path) != template_hash:
+            return ("template", template_path)
+        return None
+
+    def record_images(self, image_hashes):
+        # image_hashes maps the output path of every static file to its content
+        # hash. Returns the changed image nodes.
+        self.image_hashes = image_hashes
+        changed = set()
+        for node in self.dependents:
+            kind, target = node
+            if kind == "image" and image_hashes.get(target) != self.previous["images"].get(target):
+                changed.add(node)
+        return changed
+
+    def record_page(self, dest_path, template_path, title, link_urls, image_urls):
+        # Records the dependencies of a page that was just rendered. Returns the
+        # changed title node, or None when the title is unchanged.
+        dest_path = os.path.normpath(dest_path)
+        links = sorted({target for url in link_urls for target in link_targets(url, dest_path, self.dest_dir_path)})
+        images = sorted({target for url in image_urls for target in link_targets(url, dest_path, self.dest_dir_path)})
+        self.current["pages"][dest_path] = {
+            "template": template_path, "title": title, "links": links, "images": images,
+        }
+        old = self.previous["pages"].get(dest_path)
+        if old is None or old["title"] != title:
+            return ("title", dest_path)
+        return None
+
+    def keep_page(self, dest_path):
+        # Carries over the dependencies of a page that didn't need rebuilding
+        dest_path = os.path.normpath(dest_path)
+        old = self.previous["pages"].get(dest_path)
+        if old is not None:
+            self.current["pages"][dest_path] = old
+
+    def removed_pages(self, dest_paths):
+        # Returns the title nodes of pages of the last build missing from dest_paths
+        dest_paths = {os.path.normpath(dest_path) for dest_path in dest_paths}
+        return {("title", page) for page in self.previous["pages"] if page not in dest_paths}
+
+    def dependents_of(self, changed):
+        # Returns the output paths of the pages that depend on the changed nodes
+        pages = set()
+        for node in changed:
+            pages.update(self.dependents.get(node, ()))
+        return pages
+
+    def save(self):
+        # Only the hashes of images some page references are kept
+        referenced = {target for entry in self.current["pages"].values() for target in entry["images"]}
+        data = {
+            "generator_version": GENERATOR_VERSION,
+            "pages": self.current["pages"],
+            "templates": self.current["templates"],
+            "images": {target: self.image_hashes.get(target) for target in sorted(referenced)},
+        }
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as graph_file:
+            json.dump(data, graph_file, separators=(",", ":"), sort_keys=True)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,337 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from build_log import logger
+from build_manifest import forget_sources
+from copy_static_content import sync_file
+from file_index import scan_tree
+from generate_content import generate_page, generate_pages_recursive
+
+LIVE_RELOAD_PATH = "/__livereload"
+
+# Injected before </body> of every HTML page served. It long-polls the server,
+# which answers as soon as a rebuild finished, and reloads the page.
+LIVE_RELOAD_SCRIPT = """<script>
+(function () {
+  var version = "%s";
+  function poll() {
+    fetch("%s?v=" + version).then(function (response) { return response.text(); }).then(function (latest) {
+      if (latest !== version) { location.reload(); } else { poll(); }
+    }).catch(function () { setTimeout(poll, 1000); });
+  }
+  poll();
+})();
+</script>"""
+
+# How long a live reload request is held open before answering "no change"
+LIVE_RELOAD_TIMEOUT = 25
+
+# Events arriving this close together are handled as one rebuild
+DEBOUNCE_SECONDS = 0.02
+
+POLL_INTERVAL_SECONDS = 0.25
+
+# Flags from sys/inotify.h
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_ISDIR = 0x40000000
+_INOTIFY_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+_INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    # Watches directory trees with Linux inotify through libc, no extra packages
+    # needed. Raises OSError where inotify isn't available.
+
+    def __init__(self, dir_paths, file_paths):
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is None:
+            raise OSError("libc not found")
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self.libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self.fd = self.libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        # Watch descriptors of the source trees, and of the directories that
+        # only hold single watched files (where other names are ignored)
+        self.tree_watches = {}
+        self.file_watches = {}
+        for dir_path in dir_paths:
+            self._watch_tree(dir_path)
+        # Single files are watched through their directory, since editors
+        # often replace a file by renaming a new one over it
+        self.file_paths = {os.path.normpath(path) for path in file_paths}
+        for path in self.file_paths:
+            dir_path = os.path.dirname(path) or "."
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(dir_path), _INOTIFY_MASK)
+            if wd >= 0 and wd not in self.tree_watches:
+                self.file_watches[wd] = dir_path
+
+    def _watch_tree(self, dir_path):
+        for entry_dir, _, _ in os.walk(dir_path):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(entry_dir), _INOTIFY_MASK)
+            if wd >= 0:
+                self.tree_watches[wd] = entry_dir
+
+    def wait(self, timeout=None):
+        # Blocks until something changed and returns the changed paths
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        changed = set()
+        while ready:
+            changed |= self._read_events()
+            ready, _, _ = select.select([self.fd], [], [], DEBOUNCE_SECONDS)
+        return changed
+
+    def _read_events(self):
+        changed = set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_length = _INOTIFY_EVENT.unpack_from(data, offset)
+            offset += _INOTIFY_EVENT.size
+            name = os.fsdecode(data[offset:offset + name_length].rstrip(b"\0"))
+            offset += name_length
+
+            if wd in self.tree_watches:
+                path = os.path.normpath(os.path.join(self.tree_watches[wd], name))
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO):
+                        # A new directory: watch it and report what's already in it
+                        self._watch_tree(path)
+                        changed |= set(_snapshot(path))
+                    continue
+                changed.add(path)
+            elif wd in self.file_watches:
+                path = os.path.normpath(os.path.join(self.file_watches[wd], name))
+                if path in self.file_paths:
+                    changed.add(path)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    # Fallback for platforms without inotify: compares mtimes and sizes
+
+    def __init__(self, dir_paths, file_paths):
+        self.dir_paths = dir_paths
+        self.file_paths = file_paths
+        self.state = self._scan()
+
+    def _scan(self):
+        state = {}
+        for dir_path in self.dir_paths:
+            state.update(_snapshot(dir_path))
+        for path in self.file_paths:
+            try:
+                stat = os.stat(path)
+                state[os.path.normpath(path)] = (stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                pass
+        return state
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while deadline is None or time.monotonic() < deadline:
+            time.sleep(POLL_INTERVAL_SECONDS)
+            state = self._scan()
+            changed = {path for path in state.keys() | self.state.keys()
+                       if state.get(path) != self.state.get(path)}
+            self.state = state
+            if changed:
+                return changed
+        return set()
+
+    def close(self):
+        pass
+
+
+def _snapshot(dir_path):
+    try:
+        entries = scan_tree(dir_path)
+    except (FileNotFoundError, NotADirectoryError):
+        return {}
+    return {os.path.normpath(os.path.join(dir_path, entry.rel_path)): (entry.mtime, entry.size)
+            for entry in entries if entry.kind == "file"}
+
+
+class DevServer:
+    # Serves the public directory, watches the sources and rebuilds only what a
+    # change affects: the edited page, the edited asset, or every page when the
+    # template changes. Open pages reload themselves once the rebuild is done.
+
+    def __init__(self, content_dir_path, static_dir_path, template_path, public_dir_path, basepath="/"):
+        self.content_dir_path = os.path.normpath(content_dir_path)
+        self.static_dir_path = os.path.normpath(static_dir_path)
+        self.template_path = os.path.normpath(template_path)
+        self.public_dir_path = public_dir_path
+        self.basepath = basepath
+        self.version = 0
+        self.version_changed = threading.Condition()
+
+    def rebuild(self, changed_paths):
+        # Brings the public directory up to date with the changed source paths
+        # and returns how many outputs were rebuilt or removed
+        rebuilt = 0
+        template_changed = self.template_path in changed_paths
+        for path in sorted(changed_paths):
+            dest_path = self.dest_path(path)
+            if dest_path is None:
+                continue
+            if not os.path.exists(path):
+                if os.path.isfile(dest_path):
+                    os.remove(dest_path)
+                    logger.info(f" * removed {dest_path}")
+                    rebuilt += 1
+            elif path.endswith(".md") and path.startswith(self.content_dir_path + os.sep):
+                if template_changed:
+                    # Rendered with every other page below
+                    continue
+                generate_page(path, self.template_path, dest_path, self.basepath)
+                logger.info(f" * {path} -> {dest_path}")
+                rebuilt += 1
+            else:
+                os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+                sync_file(path, dest_path)
+                logger.info(f" * {path} -> {dest_path}")
+                rebuilt += 1
+
+        if template_changed:
+            generate_pages_recursive(self.content_dir_path, self.template_path, self.public_dir_path,
+                                     self.basepath, jobs=os.cpu_count() or 1)
+            rebuilt += 1
+
+        if rebuilt:
+            # These outputs weren't recorded in the build manifest, so the next
+            # incremental build mustn't trust its entries for them
+            forget_sources(self.public_dir_path, changed_paths, all_pages=template_changed)
+            with self.version_changed:
+                self.version += 1
+                self.version_changed.notify_all()
+        return rebuilt
+
+    def dest_path(self, path):
+        # Maps a source path to its output, or None when it isn't a source.
+        # Hidden files and editor backups are never sources.
+        name = os.path.basename(path)
+        if name.startswith(".") or name.endswith("~"):
+            return None
+        for source_dir_path in (self.content_dir_path, self.static_dir_path):
+            if path.startswith(source_dir_path + os.sep):
+                dest_path = os.path.join(self.public_dir_path, os.path.relpath(path, source_dir_path))
+                if source_dir_path == self.content_dir_path and path.endswith(".md"):
+                    dest_path = dest_path[:-len(".md")] + ".html"
+                return dest_path
+        return None
+
+    def watch(self, poll=False):
+        dir_paths = [self.content_dir_path, self.static_dir_path]
+        watcher = None
+        if not poll:
+            try:
+                watcher = InotifyWatcher(dir_paths, [self.template_path])
+            except (OSError, AttributeError):
+                logger.warning("inotify is not available, polling for changes instead")
+        if watcher is None:
+            watcher = PollingWatcher(dir_paths, [self.template_path])
+
+        try:
+            while True:
+                changed_paths = watcher.wait()
+                if not changed_paths:
+                    continue
+                started = time.perf_counter()
+                try:
+                    rebuilt = self.rebuild(changed_paths)
+                except Exception as e:
+                    # Keep serving: a broken page shouldn't take the server down
+                    logger.error(f"Rebuild failed: {e}")
+                    continue
+                if rebuilt:
+                    logger.info(f"Rebuilt {rebuilt} output(s) in {(time.perf_counter() - started) * 1000:.0f}ms")
+        finally:
+            watcher.close()
+
+    def wait_for_change(self, version, timeout=LIVE_RELOAD_TIMEOUT):
+        with self.version_changed:
+            self.version_changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    def make_handler(self):
+        dev_server = self
+
+        class Handler(SimpleHTTPRequestHandler):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, directory=dev_server.public_dir_path, **kwargs)
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if url.path.endswith(LIVE_RELOAD_PATH):
+                    since = parse_qs(url.query).get("v", [""])[0]
+                    version = dev_server.wait_for_change(int(since) if since.isdigit() else -1)
+                    self.send_text(str(version).encode(), "text/plain")
+                    return
+
+                path = self.translate_path(self.path)
+                if os.path.isdir(path):
+                    path = os.path.join(path, "index.html")
+                if not path.endswith(".html") or not os.path.isfile(path):
+                    super().do_GET()
+                    return
+
+                with open(path, "rb") as file:
+                    html = file.read().decode()
+                script = LIVE_RELOAD_SCRIPT % (dev_server.version, dev_server.basepath.rstrip("/") + LIVE_RELOAD_PATH)
+                index = html.rfind("</body>")
+                html = html + script if index < 0 else html[:index] + script + html[index:]
+                self.send_text(html.encode(), "text/html; charset=utf-8")
+
+            def translate_path(self, path):
+                # Pages link to the basepath, strip it so they resolve in the public directory
+                basepath = dev_server.basepath.rstrip("/")
+                if basepath and (path == basepath or path.startswith(basepath + "/")):
+                    path = path[len(basepath):] or "/"
+                return super().translate_path(path)
+
+            def send_text(self, body, content_type):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Cache-Control", "no-store")
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+    def serve(self, host, port, poll=False):
+        watch_thread = threading.Thread(target=self.watch, args=(poll,), daemon=True)
+        watch_thread.start()
+
+        httpd = ThreadingHTTPServer((host, port), self.make_handler())
+        httpd.daemon_threads = True
+        logger.info(f"Serving {self.public_dir_path} at http://{host}:{port}{self.basepath}")
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            httpd.server_close()
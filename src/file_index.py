@@ -0,0 +1,65 @@
+import os
+from collections import namedtuple
+
+# A file or directory of a scanned tree. rel_path is relative to the tree's
+# root, kind is "file" or "dir", and size and mtime (in nanoseconds) are 0 for
+# directories.
+IndexEntry = namedtuple("IndexEntry", ["rel_path", "kind", "size", "mtime"])
+
+
+def scan_tree(root_dir_path):
+    # Lists the whole tree under root_dir_path with os.scandir, which gets the
+    # kind of an entry from the directory listing itself, so the only stat per
+    # file is the one for its size and mtime. Entries are sorted by path
+    # components, giving the same depth first order on every filesystem.
+    # Entries removed while the tree is scanned are left out.
+    entries = []
+    pending = [""]
+    while pending:
+        rel_dir_path = pending.pop()
+        try:
+            scanner = os.scandir(os.path.join(root_dir_path, rel_dir_path))
+        except FileNotFoundError:
+            if not rel_dir_path:
+                raise
+            continue
+        with scanner:
+            for entry in scanner:
+                rel_path = os.path.join(rel_dir_path, entry.name)
+                try:
+                    if entry.is_dir():
+                        entries.append(IndexEntry(rel_path, "dir", 0, 0))
+                        pending.append(rel_path)
+                    else:
+                        stat = entry.stat()
+                        entries.append(IndexEntry(rel_path, "file", stat.st_size, stat.st_mtime_ns))
+                except FileNotFoundError:
+                    continue
+    entries.sort(key=lambda entry: entry.rel_path.split(os.sep))
+    return entries
+
+
+class FileIndex:
+    # The flat index of a source tree, scanned once per build and shared by
+    # whatever needs to know the tree's files: the page generator, the static
+    # copier and the build manifest look up sizes and mtimes here instead of
+    # calling os.stat again.
+
+    def __init__(self, root_dir_path, entries=None):
+        self.root_dir_path = root_dir_path
+        self.entries = scan_tree(root_dir_path) if entries is None else entries
+        self.by_path = {self.path(entry): entry for entry in self.entries}
+
+    def path(self, entry):
+        return os.path.join(self.root_dir_path, entry.rel_path)
+
+    def files(self):
+        return [entry for entry in self.entries if entry.kind == "file"]
+
+    def dirs(self):
+        return [entry for entry in self.entries if entry.kind == "dir"]
+
+    def lookup(self, path):
+        # Returns the entry of a path under the root (joined the way path()
+        # joins it), or None
+        return self.by_path.get(path)
@@ -0,0 +1,79 @@
+import multiprocessing
+import os
+import tempfile
+import unittest
+from contextlib import contextmanager
+
+from build_manifest import BuildManifest, hash_file
+from copy_static_content import copy_static_files_recursively
+from generate_content import generate_pages_recursive
+from template import set_asset_names
+
+# Helpers shared by the tests that build sites in a temporary directory
+
+DEFAULT_TEMPLATE = "<title>{{ Title }}</title>{{ Content }}"
+
+
+def write_file(path, text):
+    # Writes text to path, creating its directories, and returns the path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as file:
+        file.write(text)
+    return path
+
+
+def read_file(path):
+    with open(path) as file:
+        return file.read()
+
+
+class SiteTestCase(unittest.TestCase):
+    # A site in a temporary directory: content/, static/ and template.html as
+    # sources and public/ for the output, which isn't created up front
+    template_text = DEFAULT_TEMPLATE
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.content = os.path.join(self.tmp.name, "content")
+        self.static = os.path.join(self.tmp.name, "static")
+        self.public = os.path.join(self.tmp.name, "public")
+        self.template = write_file(os.path.join(self.tmp.name, "template.html"), self.template_text)
+
+    def write(self, path, text):
+        return write_file(path, text)
+
+    def build_site(self, public=None, basepath="/", jobs=1, static=False, graph=None, page_index=None,
+                   shard=None, asset_names=None):
+        # Runs the steps of an incremental main.build: copies static/ when
+        # static is set, fingerprinting the assets into asset_names when it's
+        # a dict, renders the pages and saves the manifest and the graph and
+        # page index given. Returns the stats of generate_pages_recursive.
+        public = self.public if public is None else public
+        manifest = BuildManifest(public, hash_file(self.template), basepath)
+        if static:
+            copy_static_files_recursively(self.static, public, manifest, shard=shard, asset_names=asset_names)
+        if asset_names is not None:
+            set_asset_names(asset_names)
+            self.addCleanup(set_asset_names, None)
+        stats = generate_pages_recursive(self.content, self.template, public, basepath, manifest, jobs=jobs,
+                                         graph=graph, shard=shard, page_index=page_index)
+        manifest.remove_stale_outputs()
+        manifest.save()
+        if graph is not None:
+            graph.save()
+        if page_index is not None:
+            page_index.save()
+        return stats
+
+
+@contextmanager
+def start_method(method):
+    # Worker processes are started with method, e.g. "spawn", which unlike
+    # fork doesn't let them inherit the parent's module globals
+    previous = multiprocessing.get_start_method()
+    multiprocessing.set_start_method(method, force=True)
+    try:
+        yield
+    finally:
+        multiprocessing.set_start_method(previous, force=True)
@@ -1,71 +1,491 @@
-import os, shutil
-from block_markdown import markdown_to_html_node, markdown_to_blocks, get_header_tag
+import mmap, os, queue, threading, time
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from block_markdown import blocks_to_html_node, get_block_cache, parse_blocks, set_block_cache
+from build_log import Progress, logger, unbuffer_log
+from copy_static_content import sync_files
+from file_index import FileIndex
+from page_index import MetadataScanner, get_collect_terms, page_metadata, set_collect_terms
+from template import get_asset_names, load_template, set_asset_names
+
+# Optional page_cache.PageCache consulted before rendering a page
+_page_cache = None
+
+# Output directories known to exist while generate_pages_recursive runs, so
+# writing a page doesn't call os.makedirs for each one. None outside of it.
+_made_dirs = None
+
+# Pages each stage of a pipelined build may run ahead of the next one
+PIPELINE_QUEUE_SIZE = 64
+
+# Sources of at least this many bytes are memory-mapped instead of being read
+# into a str (see read_source). 0 turns mapping off.
+MMAP_THRESHOLD = 1024 * 1024
+_mmap_threshold = MMAP_THRESHOLD
 
 def extract_title(markdown):
-    blocks = markdown_to_blocks(markdown)
-    for block in blocks:
-        if get_header_tag(block) == (1, "h1"):
-            header = block.lstrip("#").strip()
-            return header
-        else:
-            raise Exception("h1 level header is not found")
+    # The text of the first h1 of the document. Raises ValueError without one.
+    return page_metadata(markdown).title
+
+def set_mmap_threshold(size):
+    global _mmap_threshold
+    _mmap_threshold = size
 
-def generate_page(from_path, template_path, dest_path, basepath):
+def read_source(from_path):
+    # Returns the markdown of a page: the file's text, or for a file of at
+    # least the mmap threshold a read-only memory map of it, which the parser
+    # and the page cache read without copying the file into a str first. A map
+    # must be given back with release_source.
+    if _mmap_threshold and os.path.getsize(from_path) >= _mmap_threshold:
+        with open(from_path, "rb") as markdown_file:
+            return mmap.mmap(markdown_file.fileno(), 0, access=mmap.ACCESS_READ)
+    with open(from_path, "r") as markdown_file:
+        return markdown_file.read()
+
+def release_source(source):
+    if isinstance(source, mmap.mmap):
+        source.close()
+
+def _render_source(source, timings=None):
+    # Converts a page's markdown to HTML, collecting its metadata in the same
+    # parse. Returns the content node and the page_index.PageMetadata.
+    scanner = MetadataScanner()
+    content_node = blocks_to_html_node(scanner.scan(parse_blocks(source)), timings)
+    return content_node, scanner.metadata()
+
+def generate_page(from_path, template_path, dest_path, basepath, timings=None):
     # Don't modify the input parameters or iterate through directories
     # This function should handle a single file
-    print(f"Generating page from {from_path} to {dest_path} using {template_path}")
-    
-    # Read the markdown content
-    with open(from_path, "r") as markdown_file:
-        markdown_content = markdown_file.read()
-    
-    # Read the template
-    with open(template_path, "r") as template_file:
-        template_html = template_file.read()
-    
-    # Convert markdown to HTML
-    content_node = markdown_to_html_node(markdown_content)
-    content_html = content_node.to_html()
-    
-    # Get the title
-    title = extract_title(markdown_content)
-
-    # Replace placeholders in template
-    new_template_html = template_html.replace("{{ Title }}", title)
-    new_template_html = new_template_html.replace("{{ Content }}", content_html)
-    new_template_html = new_template_html.replace('href="/', 'href="' + basepath)
-    new_template_html = new_template_html.replace('src="/', f'src="' + basepath)
-
-    # Ensure the directory exists before writing the file
-    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-    
-    # Write the generated HTML
-    with open(dest_path, "w") as dest_file:
-        dest_file.write(new_template_html)
-
-def generate_pages_recursive(dir_path_content, template_path, dest_dir_path, basepath):
-    # Create destination directory if it doesn't exist
+    # When a timings dict is passed, the seconds spent per phase are added to it.
+    # Returns the page's page_index.PageMetadata, without its mtime.
+    #
+    # The page goes through three steps, which a pipelined build runs in
+    # separate threads (see _generate_pages_pipelined):
+    #   _read_page    reads the markdown, or restores the page from the cache
+    #   _render_page  converts the markdown to HTML nodes and collects metadata
+    #   _write_page   streams the filled template into the file
+    source, template, cache_key = _read_page(from_path, template_path, dest_path, basepath, timings)
+    content_node, metadata = _render_page(source, cache_key, timings)
+    if content_node is not None:
+        _write_page(template, dest_path, metadata.title, content_node, cache_key, timings)
+    return metadata
+
+def _add_time(timings, phase, started):
+    # Adds the time since started to the phase and returns the current time
+    now = time.perf_counter()
+    if timings is not None:
+        timings[phase] = timings.get(phase, 0.0) + now - started
+    return now
+
+def _read_page(from_path, template_path, dest_path, basepath, timings=None):
+    # Returns the page's source, its compiled template, and its cache key, which
+    # is None when the page was restored from the cache (see
+    # _restore_cached_page). The source must be given to _render_page.
+    started = time.perf_counter()
+    source = read_source(from_path)
+    started = _add_time(timings, "source read", started)
+    try:
+        # The template is compiled on first use and reused for the rest of the build
+        template = load_template(template_path, basepath)
+
+        # A page rendered by an earlier build from the same inputs is copied as is
+        cache_key = _restore_cached_page(source, template, basepath, dest_path)
+        if _page_cache is not None:
+            _add_time(timings, "page cache", started)
+    except BaseException:
+        release_source(source)
+        raise
+    return source, template, cache_key
+
+def _render_page(source, cache_key, timings=None):
+    # Converts the markdown to HTML and collects the title and other metadata,
+    # then releases the source. Returns the content node, or None for a page
+    # restored from the cache, and the page_index.PageMetadata.
+    try:
+        if cache_key is None:
+            return None, page_metadata(source)
+        return _render_source(source, timings)
+    finally:
+        release_source(source)
+
+def _timed_fragments(fragments, timings):
+    # Adds the time spent producing the fragments to "html serialization"
+    serializing = 0.0
+    fragments = iter(fragments)
+    while True:
+        started = time.perf_counter()
+        fragment = next(fragments, None)
+        serializing += time.perf_counter() - started
+        if fragment is None:
+            break
+        yield fragment
+    timings["html serialization"] = timings.get("html serialization", 0.0) + serializing
+
+def _make_dirs(dest_path):
+    # Ensures the directory of dest_path exists, once per directory in a build
+    dir_path = os.path.dirname(dest_path)
+    if _made_dirs is None or dir_path not in _made_dirs:
+        os.makedirs(dir_path, exist_ok=True)
+        if _made_dirs is not None:
+            _made_dirs.add(dir_path)
+
+def _write_page(template, dest_path, title, content_node, cache_key, timings=None):
+    _make_dirs(dest_path)
+
+    # Stream the filled template into the file, so the page never has to exist
+    # as one string. It goes to a temporary file first so a failure half way
+    # doesn't leave a truncated page behind. While timing, the HTML is
+    # serialized as it is written, so "file write" is what's left of the
+    # streaming: filling in the template and writing.
+    started = time.perf_counter()
+    fragments = content_node.iter_html()
+    serializing = {}
+    if timings is not None:
+        fragments = _timed_fragments(fragments, serializing)
+    tmp_path = dest_path + ".tmp"
+    with open(tmp_path, "w") as dest_file:
+        template.write(dest_file, title, fragments)
+    os.replace(tmp_path, dest_path)
+    if timings is not None:
+        serialization = serializing.get("html serialization", 0.0)
+        timings["html serialization"] = timings.get("html serialization", 0.0) + serialization
+        started = _add_time(timings, "file write", started + serialization)
+
+    if _page_cache is not None:
+        _page_cache.store(cache_key, dest_path)
+        _add_time(timings, "page cache", started)
+
+def set_page_cache(cache):
+    global _page_cache
+    _page_cache = cache
+
+def get_page_cache():
+    return _page_cache
+
+def _restore_cached_page(source, template, basepath, dest_path):
+    # Returns the page's cache key, or None when it was restored from the cache.
+    # Without a cache the key is "" so the page is always rendered.
+    if _page_cache is None:
+        return ""
+    cache_key = _page_cache.key(source, template.hash, basepath)
+    _make_dirs(dest_path)
+    if _page_cache.restore(cache_key, dest_path):
+        return None
+    return cache_key
+
+class _PipelineStopped(Exception):
+    pass
+
+def _put(stage_queue, item, stop):
+    # Blocks until there is room in the queue, unless the pipeline is stopped
+    while not stop.is_set():
+        try:
+            stage_queue.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            pass
+    raise _PipelineStopped()
+
+def _get(stage_queue, stop):
+    while not stop.is_set():
+        try:
+            return stage_queue.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    raise _PipelineStopped()
+
+def _generate_pages_pipelined(tasks):
+    # Renders the pages of a list of _generate_page_task tasks in three stages
+    # connected by bounded queues, so reading the next sources and writing the
+    # finished pages overlap with rendering:
+    #   reader thread  reads the markdown and restores pages from the page cache
+    #   this thread    renders the pages
+    #   writer thread  writes the pages and adds them to the page cache
+    # The threads mostly wait on file I/O, which releases the GIL. Returns the
+    # results _generate_page_task would have returned, in task order.
+    read_queue = queue.Queue(PIPELINE_QUEUE_SIZE)
+    write_queue = queue.Queue(PIPELINE_QUEUE_SIZE)
+    stop = threading.Event()
+    errors = []
+    results = [None] * len(tasks)
+
+    def read():
+        try:
+            for index, (from_path, template_path, dest_path, basepath, profiling) in enumerate(tasks):
+                timings = {} if profiling else None
+                source, template, cache_key = _read_page(from_path, template_path, dest_path, basepath, timings)
+                try:
+                    # The renderer releases the source
+                    _put(read_queue, (index, source, template, cache_key, timings), stop)
+                except BaseException:
+                    release_source(source)
+                    raise
+            _put(read_queue, None, stop)
+        except _PipelineStopped:
+            pass
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+
+    def write():
+        try:
+            while True:
+                item = _get(write_queue, stop)
+                if item is None:
+                    return
+                _write_page(*item)
+        except _PipelineStopped:
+            pass
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+
+    threads = [threading.Thread(target=read, daemon=True), threading.Thread(target=write, daemon=True)]
+    for thread in threads:
+        thread.start()
+    block_cache = get_block_cache()
+    try:
+        while True:
+            item = _get(read_queue, stop)
+            if item is None:
+                break
+            index, source, template, cache_key, timings = item
+            from_path, template_path, dest_path, basepath, profiling = tasks[index]
+            block_before = (block_cache.hits, block_cache.misses) if block_cache is not None else (0, 0)
+
+            content_node, metadata = _render_page(source, cache_key, timings)
+            hit = content_node is None
+            if not hit:
+                _put(write_queue, (template, dest_path, metadata.title, content_node, cache_key, timings), stop)
+
+            block_after = (block_cache.hits, block_cache.misses) if block_cache is not None else (0, 0)
+            counters = {
+                "block_cache_hits": block_after[0] - block_before[0],
+                "block_cache_misses": block_after[1] - block_before[1],
+                "page_cache_hits": int(hit),
+                "page_cache_misses": int(_page_cache is not None and not hit),
+            }
+            results[index] = [from_path, dest_path, None, timings, counters, metadata]
+        _put(write_queue, None, stop)
+    except _PipelineStopped:
+        pass
+    except BaseException:
+        stop.set()
+        raise
+    finally:
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+
+    # The writer has finished with the timings, so the page totals can be added up
+    for result in results:
+        if result[3] is not None:
+            result[2] = sum(result[3].values())
+    return [tuple(result) for result in results]
+
+def collect_pages(dir_path_content, dest_dir_path, index=None):
+    # Returns the (from_path, dest_path) pairs of the markdown pages to render
+    # and of the other files to copy as they are, in the sorted order of the
+    # content tree's file_index.FileIndex (scanned here when not given).
+    # Destination directories are created along the way.
+    if index is None:
+        index = FileIndex(dir_path_content)
+
     os.makedirs(dest_dir_path, exist_ok=True)
+    for entry in index.dirs():
+        os.makedirs(os.path.join(dest_dir_path, entry.rel_path), exist_ok=True)
 
-    # List all content
-    source_dir_content = os.listdir(dir_path_content) 
-     
-    for content in source_dir_content:
-        from_path = os.path.join(dir_path_content, content)
-        dest_path = os.path.join(dest_dir_path, content)
-
-        if os.path.isdir(from_path):
-            # Recursively process subdirectories
-            generate_pages_recursive(from_path, template_path, dest_path, basepath)
-            
-        elif content.endswith(".md"):  
-            # Convert .md files to .html using the template
-            html_dest_path = dest_path.replace(".md", ".html")
-            
-            # Use generate_page function to handle the conversion
-            generate_page(from_path, template_path, html_dest_path, basepath)
-            print(f" * {from_path} -> {html_dest_path}")       
+    pages, files = [], []
+    for entry in index.files():
+        from_path = index.path(entry)
+        dest_path = os.path.join(dest_dir_path, entry.rel_path)
+        if entry.rel_path.endswith(".md"):
+            # .md files are converted to .html using the template
+            pages.append((from_path, dest_path[:-len(".md")] + ".html"))
         else:
-            # Copy other files directly
-            shutil.copy(from_path, dest_path)
-            print(f" * {from_path} -> {dest_path}")     
+            files.append((from_path, dest_path))
+    return pages, files
+
+def _worker_config():
+    # The build's run-wide settings, which are module globals set before the
+    # pages are rendered. Forked workers would inherit them, but spawned and
+    # forkserver ones start from the module defaults, so they are handed to
+    # every worker for _init_worker to set.
+    return {
+        "block_cache": get_block_cache(),
+        "mmap_threshold": _mmap_threshold,
+        "asset_names": get_asset_names(),
+        "collect_terms": get_collect_terms(),
+        "page_cache": _page_cache,
+        "made_dirs": _made_dirs,
+    }
+
+def _init_worker(config):
+    global _made_dirs
+    unbuffer_log()
+    set_block_cache(config["block_cache"])
+    set_mmap_threshold(config["mmap_threshold"])
+    set_asset_names(config["asset_names"])
+    set_collect_terms(config["collect_terms"])
+    set_page_cache(config["page_cache"])
+    _made_dirs = config["made_dirs"]
+
+def _generate_page_task(task):
+    # Runs in a worker process, so it has to be a module level function.
+    # Returns the page's total time and phase timings when profiling, and the
+    # cache hits and misses of this page (each worker has its own counters).
+    from_path, template_path, dest_path, basepath, profiling = task
+    caches = {"block_cache": get_block_cache(), "page_cache": _page_cache}
+    before = _cache_counters(caches)
+
+    seconds = timings = None
+    if profiling:
+        timings = {}
+        started = time.perf_counter()
+        metadata = generate_page(from_path, template_path, dest_path, basepath, timings)
+        seconds = time.perf_counter() - started
+    else:
+        metadata = generate_page(from_path, template_path, dest_path, basepath)
+
+    counters = {name: count - before[name] for name, count in _cache_counters(caches).items()}
+    return from_path, dest_path, seconds, timings, counters, metadata
+
+def _cache_counters(caches):
+    counters = {}
+    for name, cache in caches.items():
+        counters[name + "_hits"] = cache.hits if cache is not None else 0
+        counters[name + "_misses"] = cache.misses if cache is not None else 0
+    return counters
+
+def generate_pages_recursive(dir_path_content, template_path, dest_dir_path, basepath, manifest=None, jobs=1, profile=None,
+                             graph=None, pipeline=False, shard=None, page_index=None, asset_mode="copy"):
+    # profile is an optional profiler.BuildProfile that collects the timings,
+    # and graph an optional dependency_graph.DependencyGraph and page_index an
+    # optional page_index.PageIndex that are brought up to date with the
+    # pages. With pipeline, every process overlaps its reads,
+    # renders and writes (see _generate_pages_pipelined). With a shard.Shard,
+    # only the pages and files of that shard are built. The files that aren't
+    # pages are put in place with asset_mode (see copy_static_content). Returns
+    # a dict of counters for the build summary.
+    global _made_dirs
+    with profile.phase("content walk") if profile is not None else nullcontext():
+        index = FileIndex(dir_path_content)
+        pages, files = collect_pages(dir_path_content, dest_dir_path, index)
+        made_dirs = {os.path.dirname(dest_path) for _, dest_path in pages}
+        if shard is not None:
+            pages = shard.select(pages, dest_dir_path)
+            files = shard.select(files, dest_dir_path)
+
+    # Copy other files directly
+    sync_files(files, manifest, asset_mode, index=index)
+
+    # Compile the template before the pool is started so the workers inherit it
+    template = load_template(template_path, basepath)
+
+    # In incremental builds, skip pages whose markdown hasn't changed, unless
+    # the graph knows of something else they depend on that did
+    all_pages = pages
+    if manifest is not None:
+        pages = [(from_path, dest_path) for from_path, dest_path in pages
+                 if not manifest.is_up_to_date("pages", from_path, dest_path, index.lookup(from_path))]
+    if manifest is not None and graph is not None:
+        changed = graph.record_images(manifest.output_hashes("static"))
+        changed |= graph.removed_pages(dest_path for _, dest_path in all_pages)
+        template_node = graph.record_template(template_path, template.hash)
+        if template_node is not None:
+            changed.add(template_node)
+        dependents = _dependent_pages(graph, changed, all_pages, pages)
+        manifest.add_dependents(len(dependents))
+        pages += dependents
+    if manifest is not None and page_index is not None:
+        # Pages the last build's index doesn't know (e.g. it was deleted) are
+        # rendered again to get their metadata
+        rebuilding = {dest_path for _, dest_path in pages}
+        unindexed = [(from_path, dest_path) for from_path, dest_path in all_pages
+                     if dest_path not in rebuilding and not page_index.has_previous(dest_path)]
+        manifest.add_dependents(len(unindexed))
+        pages += unindexed
+
+    stats = {"pages": 0, "block_cache_hits": 0, "block_cache_misses": 0,
+             "page_cache_hits": 0, "page_cache_misses": 0}
+    profiling = profile is not None
+    progress = Progress("Pages rendered", len(pages), unit="pages")
+    # collect_pages created the directories of every page
+    _made_dirs = made_dirs
+    executor = None
+    rendered = []
+    try:
+        if jobs > 1 and len(pages) > 1:
+            executor = ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(_worker_config(),))
+        # Rebuilding a page may change its title, which the pages linking to it
+        # depend on, so their rebuilds follow in further rounds
+        while pages:
+            tasks = [(from_path, template_path, dest_path, basepath, profiling) for from_path, dest_path in pages]
+            if pipeline and (executor is None or len(tasks) <= 1):
+                results = _generate_pages_pipelined(tasks)
+            elif pipeline:
+                # Each worker runs its own pipeline over a chunk of the pages
+                size = max(1, len(tasks) // (jobs * 4))
+                chunks = [tasks[i:i + size] for i in range(0, len(tasks), size)]
+                results = chain.from_iterable(executor.map(_generate_pages_pipelined, chunks))
+            elif executor is None or len(tasks) <= 1:
+                results = map(_generate_page_task, tasks)
+            else:
+                # Every page is independent, so they are rendered in a process pool.
+                # Tasks are handed out in chunks to keep the inter-process overhead
+                # per page low.
+                chunksize = max(1, len(tasks) // (jobs * 4))
+                results = executor.map(_generate_page_task, tasks, chunksize=chunksize)
+
+            changed = set()
+            for from_path, dest_path, metadata in _report_pages(results, profile, stats, progress):
+                if page_index is not None:
+                    page_index.record(dest_path, metadata._replace(mtime=index.lookup(from_path).mtime))
+                if graph is not None:
+                    title_node = graph.record_page(dest_path, template_path, metadata.title, metadata.links,
+                                                   metadata.images)
+                    if title_node is not None:
+                        changed.add(title_node)
+            rendered += pages
+            pages = []
+            if graph is not None and changed:
+                pages = _dependent_pages(graph, changed, all_pages, rendered)
+                progress.total += len(pages)
+                if manifest is not None:
+                    manifest.add_dependents(len(pages))
+    finally:
+        _made_dirs = None
+        if executor is not None:
+            executor.shutdown()
+    progress.finish()
+
+    rendered_dests = {dest_path for _, dest_path in rendered}
+    for from_path, dest_path in all_pages:
+        if dest_path not in rendered_dests:
+            if graph is not None:
+                graph.keep_page(dest_path)
+            if page_index is not None:
+                page_index.keep(dest_path, index.lookup(from_path).mtime)
+    return stats
+
+def _dependent_pages(graph, changed, all_pages, excluded):
+    # The pages depending on the changed graph nodes, leaving out the excluded ones
+    dependents = graph.dependents_of(changed)
+    excluded = {os.path.normpath(dest_path) for _, dest_path in excluded}
+    return [(from_path, dest_path) for from_path, dest_path in all_pages
+            if os.path.normpath(dest_path) in dependents and os.path.normpath(dest_path) not in excluded]
+
+def _report_pages(results, profile, stats, progress):
+    # Adds the results of rendered pages to the stats and yields the pages'
+    # source and output paths and metadata
+    for from_path, dest_path, seconds, timings, counters, metadata in results:
+        if profile is not None:
+            profile.add_page(from_path, seconds, timings)
+        stats["pages"] += 1
+        for name, count in counters.items():
+            stats[name] += count
+        logger.debug(f" * {from_path} -> {dest_path}")
+        progress.advance()
+        yield from_path, dest_path, metadata
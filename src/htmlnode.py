@@ -1,4 +1,8 @@
 class HTMLNode:
+    # Pages create a node per inline span, so nodes use __slots__ instead of a
+    # per-instance __dict__. Subclasses add no attributes of their own.
+    __slots__ = ("tag", "value", "children", "props")
+
     def __init__(self, tag=None, value=None, children=None, props=None):
         self.tag = tag
         self.value = value
@@ -7,22 +11,51 @@ class HTMLNode:
     
     def to_html(self):
         raise NotImplementedError("to_html method is not implemented")
+
+    def html_fragments(self):
+        # Returns (opening, children, closing) for the serializer. A node without
+        # children returns its whole HTML as the opening and None for the rest.
+        raise NotImplementedError("html_fragments method is not implemented")
+
+    def iter_html(self):
+        # Yields the HTML of the tree in fragments, in document order. The tree is
+        # walked with an explicit stack, so nesting depth isn't limited by the
+        # recursion limit, and nothing is concatenated along the way.
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if type(node) is str:
+                yield node
+                continue
+            opening, children, closing = node.html_fragments()
+            yield opening
+            if children is not None:
+                stack.append(closing)
+                stack.extend(reversed(children))
+
+    def write_html(self, file):
+        # Streams the HTML straight into a file object
+        file.writelines(self.iter_html())
     
     def props_to_html(self):
         if self.props is None:
             return ""
         
-        result = ""
-        for key, val in self.props.items():
-            result += f' {key}="{val}"'
-        return result
+        return "".join(f' {key}="{val}"' for key, val in self.props.items())
     
     def __repr__(self):
         return f"HTMLNode({self.tag}, {self.value}, children: {self.children}, {self.props})"
 
 class LeafNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag, value, props=None):
-        super().__init__(tag, value, None, props)
+        # Assigned directly rather than through super().__init__, which is
+        # measurably slower for the number of leaves a page creates
+        self.tag = tag
+        self.value = value
+        self.children = None
+        self.props = props
 
     def to_html(self):
         if self.value is None:
@@ -30,13 +63,21 @@ class LeafNode(HTMLNode):
         if self.tag is None:
             return self.value
         return f'<{self.tag}{self.props_to_html()}>{self.value}</{self.tag}>'
+
+    def html_fragments(self):
+        return self.to_html(), None, None
     
     def __repr__(self):
         return f"LeafNode({self.tag}, {self.value}, {self.props})"
 
 class ParentNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag, children, props=None):
-        super().__init__(tag, None, children, props)
+        self.tag = tag
+        self.value = None
+        self.children = children
+        self.props = props
 
     def to_html(self):
         if self.tag is None:
@@ -44,10 +85,14 @@ class ParentNode(HTMLNode):
         if self.children is None:
             raise ValueError("children value is required")
         
-        result = ""
-        for child in self.children:
-            result += child.to_html()
-        return f'<{self.tag}{self.props_to_html()}>{result}</{self.tag}>'
+        return "".join(self.iter_html())
+
+    def html_fragments(self):
+        if self.tag is None:
+            raise ValueError("tag is required")
+        if self.children is None:
+            raise ValueError("children value is required")
+        return f'<{self.tag}{self.props_to_html()}>', self.children, f'</{self.tag}>'
     
     def __repr__(self):
         return f"ParentNode({self.tag}, children: {self.children}, {self.props})"
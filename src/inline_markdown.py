@@ -34,46 +34,49 @@ def split_nodes_delimiter(old_nodes, delimiter, text_type):
     return new_nodes
 
 
+_IMAGE_PATTERN = r"!\[(.*?)\]\((.*?)\)"
+_LINK_PATTERN = r"(?<!!)\[([^\[\]]*)\]\(([^\(\)]*)\)"
+_IMAGE_RE = re.compile(_IMAGE_PATTERN)
+_LINK_RE = re.compile(_LINK_PATTERN)
+
+# All inline constructs in one alternation. The group that matched is the last
+# one closed, so images and links end with their url group.
+_INLINE_RE = re.compile(
+    r"\*\*(?P<bold>(?s:.*?))\*\*"
+    r"|\*(?P<italic>[^*]+)\*"
+    r"|`(?P<code>[^`]*)`"
+    r"|!\[(?P<image_alt>.*?)\]\((?P<image_url>.*?)\)"
+    r"|(?<!!)\[(?P<link_text>[^\[\]]*)\]\((?P<link_url>[^\(\)]*)\)"
+)
+
 def extract_markdown_images(text):
-    matches = re.findall(r"!\[(.*?)\]\((.*?)\)", text)
+    matches = _IMAGE_RE.findall(text)
     return matches
 
 def extract_markdown_links(text):
-    matches = re.findall(r"(?<!!)\[([^\[\]]*)\]\(([^\(\)]*)\)", text)
+    matches = _LINK_RE.findall(text)
     return matches
 
 def split_nodes_image(old_nodes):
     new_nodes = []
        
     for node in old_nodes:
+        # Cut the text at the offsets of each match instead of searching
+        # for the rebuilt ![alt](url) string again. Like every node, the text
+        # of bold, italic and code nodes is split too, and its pieces
+        # become normal text.
         node_text = node.text
-        parts_nodes = []
+        position = 0
+        for match in _IMAGE_RE.finditer(node_text):
+            if match.start() > position:
+                new_nodes.append(TextNode(node_text[position:match.start()], TextType.NORMAL))
+            new_nodes.append(TextNode(match.group(1), TextType.IMAGE, match.group(2)))
+            position = match.end()
 
-        matches = extract_markdown_images(node_text)
-        if not matches:
+        if position == 0:
             new_nodes.append(node)
-            continue
-        for i in range(len(matches)):
-            if matches[i] == "":
-                continue
-            image_alt = matches[i][0]
-            image_url = matches[i][1]
-           
-            sections = node_text.split(f"![{image_alt}]({image_url})", 1)
-            
-            if len(sections) != 2:
-                raise ValueError("Invalid markdown, image not closed properly")
-            if sections[0] != "":
-                parts_nodes.append(TextNode(sections[0], TextType.NORMAL))
-            
-            parts_nodes.append(TextNode(image_alt, TextType.IMAGE, image_url))
-           
-            node_text = sections[1]
-        
-        if node_text != "":
-            parts_nodes.append(TextNode(node_text, TextType.NORMAL))
-        
-        new_nodes.extend(parts_nodes)
+        elif position < len(node_text):
+            new_nodes.append(TextNode(node_text[position:], TextType.NORMAL))
     return new_nodes     
         
 def split_nodes_link(old_nodes):
@@ -81,42 +84,105 @@ def split_nodes_link(old_nodes):
        
     for node in old_nodes:
         node_text = node.text
-        parts_nodes = []
+        position = 0
+        for match in _LINK_RE.finditer(node_text):
+            if match.start() > position:
+                new_nodes.append(TextNode(node_text[position:match.start()], TextType.NORMAL))
+            new_nodes.append(TextNode(match.group(1), TextType.LINK, match.group(2)))
+            position = match.end()
 
-        matches = extract_markdown_links(node_text)
-        if not matches:
+        if position == 0:
             new_nodes.append(node)
-            continue
-        for i in range(len(matches)):
-            if matches[i] == "":
-                continue
-            anchor = matches[i][0]
-            link_url = matches[i][1]
-           
-            sections = node_text.split(f"[{anchor}]({link_url})", 1)
-            
-            if len(sections) != 2:
-                raise ValueError("Invalid markdown, link not closed properly")
-            if sections[0] != "":
-                parts_nodes.append(TextNode(sections[0], TextType.NORMAL))
-            
-            parts_nodes.append(TextNode(anchor, TextType.LINK, link_url))
-           
-            node_text = sections[1]
-        
-        if node_text != "":
-            parts_nodes.append(TextNode(node_text, TextType.NORMAL))
-       
-        new_nodes.extend(parts_nodes)
+        elif position < len(node_text):
+            new_nodes.append(TextNode(node_text[position:], TextType.NORMAL))
     return new_nodes
 
-def text_to_textnodes(text):    
-    nodes = [TextNode(text, TextType.NORMAL, None)]
+def iter_inline_tokens(text):
+    # Returns (text_type, text, url) for every span of inline markdown, in
+    # document order.
+    #
+    # _scan_inline_tokens reads the text once with a master regex. Where that
+    # leaves a delimiter unpaired, the text goes through the single-purpose
+    # splitters one after another instead, as it did before the scanner. This
+    # happens when a link's text holds a delimiter that pairs with one after
+    # the link, as in "[*x](u)*". The splitters pair the delimiters first and
+    # keep the text, and they still raise ValueError for delimiters nothing
+    # pairs with.
+    try:
+        return list(_scan_inline_tokens(text))
+    except ValueError:
+        return [(node.text_type, node.text, node.url) for node in _split_text_to_textnodes(text)]
 
+def _split_text_to_textnodes(text):
+    nodes = [TextNode(text, TextType.NORMAL, None)]
     nodes = split_nodes_delimiter(nodes, "**", TextType.BOLD)
     nodes = split_nodes_delimiter(nodes, "*", TextType.ITALIC)
     nodes = split_nodes_delimiter(nodes, "`", TextType.CODE)
     nodes = split_nodes_image(nodes)
-    nodes = split_nodes_link(nodes) 
-   
-    return nodes
+    return split_nodes_link(nodes)
+
+def _scan_inline_tokens(text):
+    # The master regex tries bold, italic, code, image and link at each
+    # position, which gives the same nodes as applying the single-purpose
+    # splitters one after another, without building a node list per pass.
+    # Differences from the splitters, where they failed or mangled the text:
+    # text inside code spans is no longer split on "*", and a link whose text
+    # contains "*" or "`" stays a link.
+    position = 0
+    for match in _INLINE_RE.finditer(text):
+        if match.start() > position:
+            yield _check_normal_text(text[position:match.start()])
+        position = match.end()
+
+        kind = match.lastgroup
+        if kind == "image_url":
+            yield TextType.IMAGE, match.group("image_alt"), match.group("image_url")
+        elif kind == "link_url":
+            yield TextType.LINK, match.group("link_text"), match.group("link_url")
+        elif match.group(kind):
+            span = match.group(kind)
+            if "](" in span:
+                # Images and links inside a span are split out of it, leaving
+                # normal text around them, as the image and link splitters do
+                yield from _split_images_and_links(span, _SPAN_TYPES[kind])
+            else:
+                yield _SPAN_TYPES[kind], span, None
+
+    if position < len(text):
+        yield _check_normal_text(text[position:])
+
+_SPAN_TYPES = {"bold": TextType.BOLD, "italic": TextType.ITALIC, "code": TextType.CODE}
+
+def _split_images_and_links(span, text_type):
+    for node in split_nodes_link(split_nodes_image([TextNode(span, text_type)])):
+        yield node.text_type, node.text, node.url
+
+def _check_normal_text(text):
+    # Any delimiter left in plain text was never closed
+    for delimiter in ("**", "*", "`"):
+        if delimiter in text:
+            raise ValueError(f"Matching delimiter pair not found for {delimiter}")
+    return TextType.NORMAL, text, None
+
+def text_to_textnodes(text):    
+    return [TextNode(token_text, text_type, url) for text_type, token_text, url in iter_inline_tokens(text)]
+
+# Same markup as text_node_to_html_node(...).to_html() for each text type
+_INLINE_HTML_FORMATS = {
+    TextType.BOLD: "<b>{0}</b>",
+    TextType.ITALIC: "<i>{0}</i>",
+    TextType.CODE: "<code>{0}</code>",
+    TextType.LINK: '<a href="{1}">{0}</a>',
+    TextType.IMAGE: '<img src="{1}" alt="{0}"></img>',
+}
+
+def inline_to_html(text):
+    # Renders inline markdown straight to an HTML string, for callers that
+    # don't need the TextNode/LeafNode objects in between
+    parts = []
+    for text_type, token_text, url in iter_inline_tokens(text):
+        if text_type == TextType.NORMAL:
+            parts.append(token_text)
+        else:
+            parts.append(_INLINE_HTML_FORMATS[text_type].format(token_text, url))
+    return "".join(parts)
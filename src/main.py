@@ -1,6 +1,21 @@
-import os, shutil, sys
-from copy_static_content import copy_static_files_recursively
-from generate_content import generate_pages_recursive
+import argparse, json, logging, os, shutil, sys, time
+from contextlib import nullcontext
+from asset_fingerprints import save_asset_names
+from block_cache import DEFAULT_MAX_BYTES, BlockCache
+from block_markdown import set_block_cache
+from build_log import LOG_FORMATS, flush_log, logger, setup_logging
+from build_manifest import MANIFEST_FILENAME, BuildManifest, hash_file
+from copy_static_content import ASSET_MODES, copy_static_files_recursively
+from dependency_graph import DependencyGraph
+from generate_content import MMAP_THRESHOLD, generate_pages_recursive, set_mmap_threshold, set_page_cache
+from page_cache import DEFAULT_CACHE_DIR, PageCache
+from page_index import PageIndex, set_collect_terms
+from precompress import DEFAULT_MIN_SIZE, precompress_outputs
+from profiler import BuildProfile
+from search_index import SearchIndex, remove_search_index
+from shard import MergeError, merge_shards, parse_shard
+from sitemap import FEED_FILENAME, remove_site_files, write_feed, write_sitemaps
+from template import set_asset_names
 
 
 dir_path_static = "./static"
@@ -8,22 +23,315 @@ dir_path_public = "./docs"
 dir_path_content = "./content"
 template_path = "./template.html"
 default_basepath = "/"
+default_port = 8888
+default_profile_path = "./build-profile.json"
+default_page_cache_size = 1024 ** 3
+default_shard_dir = "./shards"
 
-def main():
-    basepath = default_basepath
-    if len(sys.argv) > 1:
-        basepath = sys.argv[1]
+def parse_size(text):
+    # Parses a byte count like "512", "64K", "64M" or "2G"
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    text = text.strip().upper().removesuffix("B")
+    try:
+        if text and text[-1] in units:
+            return int(float(text[:-1]) * units[text[-1]])
+        return int(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size: {text}")
+
+def parse_shard_arg(text):
+    try:
+        return parse_shard(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def add_precompress_args(parser):
+    parser.add_argument("--precompress", action="store_true",
+                        help="write .gz (and .br, with the brotli module) files next to text outputs")
+    parser.add_argument("--precompress-min-size", type=parse_size, default=DEFAULT_MIN_SIZE,
+                        help="smallest output that is precompressed (default: 1K)")
+
+def add_site_args(parser):
+    parser.add_argument("--site-url",
+                        help="URL the site is published at, e.g. https://example.com; writes sitemap.xml and feed.xml")
+    parser.add_argument("--site-author",
+                        help="author named in feed.xml (default: the title of the home page)")
+
+def add_search_index_args(parser):
+    parser.add_argument("--search-index", action="store_true",
+                        help="write a search index of the pages' text to search-index/ for searching in the browser")
+
+def add_logging_args(parser):
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument("-q", "--quiet", action="store_true", help="only log warnings and errors")
+    verbosity.add_argument("-v", "--verbose", action="store_true", help="also log every file written")
+    parser.add_argument("--log-format", choices=LOG_FORMATS, default="text",
+                        help="text, or one JSON object per line (default: text)")
+
+def setup_logging_from_args(args, buffered=True):
+    level = logging.WARNING if args.quiet else logging.DEBUG if args.verbose else logging.INFO
+    setup_logging(level, args.log_format, buffered=buffered)
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Build the static site into the public directory.")
+    parser.add_argument("basepath", nargs="?", default=default_basepath,
+                        help="path prefix the site is served under (default: /)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only rebuild outputs whose sources changed since the last build")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes used to render pages (default: CPU count)")
+    parser.add_argument("--shard", type=parse_shard_arg,
+                        help="build only shard K of N (e.g. 2/4) into its own directory under --shard-dir")
+    parser.add_argument("--shard-dir", default=default_shard_dir,
+                        help=f"where --shard puts its output (default: {default_shard_dir})")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="overlap reading sources and writing pages with rendering, for slow build volumes")
+    parser.add_argument("--asset-mode", choices=ASSET_MODES, default="copy",
+                        help="how static files are put into the public directory (default: copy)")
+    parser.add_argument("--fingerprint-assets", action="store_true",
+                        help="name css, js, images and fonts after their content hash (name.<hash>.ext) and point "
+                             "pages at those names, so they can be cached for good")
+    add_site_args(parser)
+    add_search_index_args(parser)
+    add_precompress_args(parser)
+    parser.add_argument("--block-cache-size", type=parse_size, default=DEFAULT_MAX_BYTES,
+                        help="memory for reusing rendered markdown blocks across pages, e.g. 64M; 0 disables it (default: 64M)")
+    # The page cache is off unless one of its options is given
+    parser.add_argument("--page-cache-dir",
+                        help="keep an on-disk cache of rendered pages in this directory, shared between builds "
+                             f"(default with --page-cache-size: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--page-cache-size", type=parse_size,
+                        help="disk space of the page cache, e.g. 500M; 0 disables it "
+                             "(default with --page-cache-dir: 1G)")
+    parser.add_argument("--mmap-threshold", type=parse_size, default=MMAP_THRESHOLD,
+                        help="memory-map markdown sources of at least this size instead of reading them, e.g. 4M; "
+                             "0 never maps (default: 1M)")
+    add_logging_args(parser)
+    parser.add_argument("--profile", action="store_true",
+                        help="time each build phase and page, and print a report")
+    parser.add_argument("--profile-output", default=default_profile_path,
+                        help=f"where --profile writes its JSON report (default: {default_profile_path})")
+    parser.add_argument("--profile-top", type=int, default=10,
+                        help="number of slowest pages listed by --profile (default: 10)")
+    args = parser.parse_args(argv)
+    if args.page_cache_dir is None and args.page_cache_size is None:
+        args.page_cache_size = 0
+    if args.page_cache_dir is None:
+        args.page_cache_dir = DEFAULT_CACHE_DIR
+    if args.page_cache_size is None:
+        args.page_cache_size = default_page_cache_size
+    return args
+
+def parse_serve_args(argv):
+    parser = argparse.ArgumentParser(prog="main.py serve",
+                                     description="Serve the public directory and rebuild pages as sources change.")
+    parser.add_argument("basepath", nargs="?", default=default_basepath,
+                        help="path prefix the site is served under (default: /)")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=default_port, help=f"port to listen on (default: {default_port})")
+    parser.add_argument("--poll", action="store_true", help="poll for changes even where inotify is available")
+    # The initial build removes a sitemap, feed or search index it isn't asked
+    # to keep up to date
+    add_site_args(parser)
+    add_search_index_args(parser)
+    add_logging_args(parser)
+    return parser.parse_args(argv)
+
+def parse_cache_args(argv):
+    parser = argparse.ArgumentParser(prog="main.py cache", description="Inspect or shrink the on-disk page cache.")
+    parser.add_argument("command", choices=("stats", "prune"))
+    parser.add_argument("--page-cache-dir", default=DEFAULT_CACHE_DIR,
+                        help=f"directory of the page cache (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--max-size", type=parse_size, default=default_page_cache_size,
+                        help="size prune shrinks the cache to, e.g. 500M (default: 1G)")
+    return parser.parse_args(argv)
+
+def cache_command(args):
+    cache = PageCache(args.page_cache_dir, args.max_size)
+    if args.command == "prune":
+        removed, removed_bytes = cache.prune()
+        print(f"Removed {removed} entries ({removed_bytes / 1e6:.1f} MB)")
+    stats = cache.stats()
+    print(f"{stats['entries']} entries, {stats['bytes'] / 1e6:.1f} MB of {stats['max_bytes'] / 1e6:.1f} MB in {args.page_cache_dir}")
+    if stats["entries"]:
+        oldest = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(stats["oldest_access"]))
+        newest = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(stats["newest_access"]))
+        print(f"Least recently used: {oldest}, most recently used: {newest}")
 
-    print("Deleting public directory...")
-    if os.path.exists(dir_path_public):
-        shutil.rmtree(dir_path_public)
+def parse_merge_args(argv):
+    parser = argparse.ArgumentParser(prog="main.py merge",
+                                     description="Combine the outputs of a sharded build into the public directory.")
+    parser.add_argument("shard_dirs", nargs="*",
+                        help=f"shard output directories (default: every shard-*-of-* in {default_shard_dir})")
+    parser.add_argument("--output", default=dir_path_public, help=f"public directory to create (default: {dir_path_public})")
+    parser.add_argument("--asset-mode", choices=ASSET_MODES, default="copy",
+                        help="how outputs are put into the public directory (default: copy)")
+    add_site_args(parser)
+    add_precompress_args(parser)
+    add_logging_args(parser)
+    return parser.parse_args(argv)
+
+def merge_command(args):
+    shard_dir_paths = args.shard_dirs
+    if not shard_dir_paths and os.path.isdir(default_shard_dir):
+        shard_dir_paths = sorted(os.path.join(default_shard_dir, name) for name in os.listdir(default_shard_dir)
+                                 if name.startswith("shard-"))
+    if not shard_dir_paths:
+        logger.error("No shard directories to merge")
+        return False
+    try:
+        merged = merge_shards(shard_dir_paths, args.output, args.asset_mode)
+    except MergeError as e:
+        for problem in e.problems:
+            logger.error(problem)
+        logger.error(f"Merge failed, {args.output} was left untouched")
+        return False
+    logger.info(f"Merged {merged} outputs of {len(shard_dir_paths)} shards into {args.output}")
+    if args.site_url:
+        # The shards only list their own pages, so the site's are written here
+        with open(os.path.join(args.output, MANIFEST_FILENAME), "r") as manifest_file:
+            basepath = json.load(manifest_file)["basepath"]
+        write_site_files(args.output, args.site_url, basepath, author=args.site_author)
+    if args.precompress:
+        write_precompressed(args.output, args.precompress_min_size)
+    return True
+
+def write_precompressed(public_dir_path, min_size):
+    written, removed = precompress_outputs(public_dir_path, min_size)
+    if written or removed:
+        logger.info(f"Precompressed files: {written} written, {removed} removed",
+                    extra={"fields": {"written": written, "removed": removed}})
+
+def write_site_files(public_dir_path, site_url, basepath, page_index=None, author=None):
+    # Writes the sitemap and the feed of every page in the page index
+    if page_index is None:
+        page_index = PageIndex.load(public_dir_path)
+    changed = write_sitemaps(page_index, public_dir_path, site_url, basepath)
+    if write_feed(page_index, public_dir_path, site_url, basepath, author=author):
+        changed.append(os.path.join(public_dir_path, FEED_FILENAME))
+    logger.info(f"Sitemap and feed of {len(page_index)} pages: {len(changed)} file(s) updated",
+                extra={"fields": {"pages": len(page_index), "updated": len(changed)}})
+
+def build(basepath, *, incremental=False, jobs=1, asset_mode="copy", profile=None, block_cache_size=DEFAULT_MAX_BYTES,
+          page_cache_dir=DEFAULT_CACHE_DIR, page_cache_size=0, pipeline=False,
+          public_dir_path=dir_path_public, shard=None, mmap_threshold=MMAP_THRESHOLD, site_url=None,
+          precompress_min_size=None, fingerprint_assets=False, search_index=False, site_author=None):
+    if not incremental:
+        logger.info("Deleting public directory...")
+        if os.path.exists(public_dir_path):
+            shutil.rmtree(public_dir_path)
+
+    # A full build also records a manifest so the next incremental build starts warm
+    template_hash = hash_file(template_path)
+    manifest = BuildManifest(public_dir_path, template_hash, basepath)
+
+    logger.info("Copying static files to public directory...")
+    asset_names = {} if fingerprint_assets else None
+    with profile.phase("static copy") if profile is not None else nullcontext():
+        copy_static_files_recursively(dir_path_static, public_dir_path, manifest, asset_mode, shard=shard,
+                                      asset_names=asset_names)
+        # Pages are pointed at the fingerprinted names while their URLs are rewritten
+        set_asset_names(asset_names)
+
+    logger.info("Copying content files to public directory...")
+    cache = BlockCache(block_cache_size) if block_cache_size > 0 else None
+    set_block_cache(cache)
+    page_cache = PageCache(page_cache_dir, page_cache_size) if page_cache_size > 0 else None
+    set_page_cache(page_cache)
+    set_mmap_threshold(mmap_threshold)
+    graph = DependencyGraph(public_dir_path)
+    page_index = PageIndex(public_dir_path)
+    if search_index and shard is not None:
+        logger.warning("Sharded builds don't write a search index")
+        search_index = False
+    search = SearchIndex(public_dir_path) if search_index else None
+    # The pages' terms are collected while they are rendered. Without an index
+    # to update, every page is rendered for them.
+    set_collect_terms(search is not None)
+    if search is not None and not search.previous:
+        page_index.forget_previous()
+    stats = generate_pages_recursive(dir_path_content, template_path, public_dir_path, basepath, manifest, jobs=jobs,
+                                     profile=profile, graph=graph, pipeline=pipeline, shard=shard,
+                                     page_index=page_index, asset_mode=asset_mode)
+    if cache is not None and stats["block_cache_hits"] + stats["block_cache_misses"]:
+        logger.info(cache.summary(stats["block_cache_hits"], stats["block_cache_misses"]))
+    if page_cache is not None and stats["pages"]:
+        logger.info(page_cache.summary(stats["page_cache_hits"], stats["page_cache_misses"]))
+        page_cache.prune()
+
+    removed = manifest.remove_stale_outputs()
+    manifest.save()
+    graph.save()
+    page_index.save()
+    save_asset_names(asset_names, public_dir_path)
+    if site_url and shard is None:
+        write_site_files(public_dir_path, site_url, basepath, page_index, site_author)
+    elif remove_site_files(public_dir_path):
+        logger.info("Removed the sitemap and feed")
+    if search is not None:
+        changed = search.write(page_index)
+        logger.info(f"Search index of {len(page_index)} pages: {changed} file(s) updated",
+                    extra={"fields": {"pages": len(page_index), "updated": changed}})
+    elif remove_search_index(public_dir_path):
+        logger.info("Removed the search index")
+    if precompress_min_size is not None:
+        write_precompressed(public_dir_path, precompress_min_size)
+    if shard is not None:
+        shard.write_marker(public_dir_path, template_hash, basepath)
+        logger.info(f"Shard {shard}: built {len(shard.owned)} of {len(shard.outputs)} outputs into {public_dir_path}")
+    if incremental:
+        logger.info(f"Incremental build: {manifest.rebuilt} rebuilt, {manifest.skipped} unchanged, {len(removed)} removed",
+                    extra={"fields": {"rebuilt": manifest.rebuilt, "unchanged": manifest.skipped, "removed": len(removed)}})
+
+def main():
+    argv = sys.argv[1:]
+    if argv and argv[0] == "serve":
+        from dev_server import DevServer
+        args = parse_serve_args(argv[1:])
+        setup_logging_from_args(args, buffered=False)
+        build(args.basepath, incremental=True, jobs=os.cpu_count() or 1, site_url=args.site_url,
+              search_index=args.search_index, site_author=args.site_author)
+        server = DevServer(dir_path_content, dir_path_static, template_path, dir_path_public, args.basepath)
+        server.serve(args.host, args.port, poll=args.poll)
+        return
+    if argv and argv[0] == "merge":
+        args = parse_merge_args(argv[1:])
+        setup_logging_from_args(args)
+        try:
+            merged = merge_command(args)
+        finally:
+            flush_log()
+        if not merged:
+            sys.exit(1)
+        return
+    if argv and argv[0] == "cache":
+        cache_command(parse_cache_args(argv[1:]))
+        return
 
-    print("Copying static files to public directory...")
-    copy_static_files_recursively(dir_path_static, dir_path_public)
+    args = parse_args(argv)
+    setup_logging_from_args(args)
+    profile = BuildProfile() if args.profile else None
+    try:
+        public_dir_path = dir_path_public
+        if args.shard is not None:
+            public_dir_path = os.path.join(args.shard_dir, args.shard.dir_name())
+        build(args.basepath, incremental=args.incremental, jobs=args.jobs, asset_mode=args.asset_mode,
+              profile=profile, block_cache_size=args.block_cache_size, page_cache_dir=args.page_cache_dir,
+              page_cache_size=args.page_cache_size, pipeline=args.pipeline, public_dir_path=public_dir_path,
+              shard=args.shard, mmap_threshold=args.mmap_threshold, site_url=args.site_url,
+              precompress_min_size=args.precompress_min_size if args.precompress else None,
+              fingerprint_assets=args.fingerprint_assets, search_index=args.search_index,
+              site_author=args.site_author)
+    finally:
+        flush_log()
 
-    print("Copying content files to public directory...")
-    generate_pages_recursive(dir_path_content, template_path, dir_path_public, basepath)
+    if profile is not None:
+        profile.finish()
+        print()
+        print(profile.report(args.profile_top))
+        profile.write_json(args.profile_output, args.profile_top)
+        logger.info(f"Profile written to {args.profile_output}")
+        flush_log()
 
 if __name__ == "__main__":
     main()
-   
\ No newline at end of file
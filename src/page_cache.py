@@ -0,0 +1,120 @@
+import hashlib
+import os
+import shutil
+import time
+
+from block_markdown import RENDERER_VERSION
+from build_manifest import GENERATOR_VERSION
+
+DEFAULT_CACHE_DIR = "./.ssg-cache"
+DEFAULT_MAX_BYTES = 1024 ** 3
+
+_ENTRY_SUFFIX = ".html"
+
+
+class PageCache:
+    # Content-addressed cache of rendered pages that outlives the public directory.
+    #
+    # An entry is keyed by the hash of everything a page's HTML depends on: its
+    # markdown, the template, the basepath and the generator version. Since the
+    # key doesn't involve paths or mtimes, a CI job can restore the cache
+    # directory into a fresh checkout and still skip rendering unchanged pages.
+    #
+    # Entries are plain files under <cache_dir>/pages/<2 hex>/<hash>.html. Their
+    # atime is set explicitly on every hit (mounts often use relatime or
+    # noatime), and prune() removes the least recently used entries until the
+    # cache fits in max_bytes.
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.pages_dir = os.path.join(cache_dir, "pages")
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(markdown, template_hash, basepath):
+        digest = hashlib.sha256()
+        digest.update(f"{GENERATOR_VERSION}\0{RENDERER_VERSION}\0{template_hash}\0{basepath}\0".encode())
+        # The markdown may also be the bytes or mmap of a large source
+        digest.update(markdown.encode() if isinstance(markdown, str) else markdown)
+        return digest.hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.pages_dir, key[:2], key + _ENTRY_SUFFIX)
+
+    def restore(self, key, dest_path):
+        # Copies the cached page to dest_path. Returns False on a miss.
+        entry_path = self.entry_path(key)
+        tmp_path = dest_path + ".tmp"
+        try:
+            shutil.copyfile(entry_path, tmp_path)
+            os.utime(entry_path, ns=(time.time_ns(), os.stat(entry_path).st_mtime_ns))
+        except FileNotFoundError:
+            # Also covers an entry pruned by another build between the two calls
+            self.misses += 1
+            return False
+        os.replace(tmp_path, dest_path)
+        self.hits += 1
+        return True
+
+    def store(self, key, page_path):
+        # Adds the rendered page at page_path. Concurrent builds may store the
+        # same key, which is harmless as the replace is atomic and the contents
+        # are the same.
+        entry_path = self.entry_path(key)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+        tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+        shutil.copyfile(page_path, tmp_path)
+        os.replace(tmp_path, entry_path)
+
+    def entries(self):
+        # Returns (atime_ns, size, path) of every entry, least recently used first
+        entries = []
+        if not os.path.isdir(self.pages_dir):
+            return entries
+        for shard in os.scandir(self.pages_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(_ENTRY_SUFFIX):
+                    stat = entry.stat()
+                    entries.append((stat.st_atime_ns, stat.st_size, entry.path))
+        entries.sort()
+        return entries
+
+    def stats(self):
+        entries = self.entries()
+        return {
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            "oldest_access": entries[0][0] / 1e9 if entries else None,
+            "newest_access": entries[-1][0] / 1e9 if entries else None,
+        }
+
+    def prune(self, max_bytes=None):
+        # Removes the least recently used entries until the cache fits in
+        # max_bytes, and returns the number of entries and bytes removed
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed, removed_bytes = 0, 0
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+            removed_bytes += size
+        return removed, removed_bytes
+
+    def summary(self, hits=None, misses=None):
+        hits = self.hits if hits is None else hits
+        misses = self.misses if misses is None else misses
+        lookups = hits + misses
+        rate = hits / lookups if lookups else 0.0
+        return f"Page cache: {hits} hits, {misses} misses ({rate:.1%} hit rate)"
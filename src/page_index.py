@@ -0,0 +1,197 @@
+import json
+import os
+import re
+from collections import Counter, namedtuple
+
+from block_markdown import BlockType, parse_blocks
+from build_manifest import GENERATOR_VERSION
+from inline_markdown import extract_markdown_images, extract_markdown_links
+from search_index import count_terms, search_terms
+
+PAGE_INDEX_FILENAME = ".page-index.json"
+
+# What a build knows about a page after parsing it once:
+#   title     text of the first h1
+#   headings  (level, text) of every heading, in order
+#   links     URLs of its links, images  URLs of its images
+#   words     number of words outside code blocks
+#   mtime     modification time of its markdown source in nanoseconds (set by
+#             the build)
+#   terms     {term: count} of the search terms of its text, only collected
+#             while set_collect_terms is on and never saved (see search_index)
+PageMetadata = namedtuple("PageMetadata", ["title", "headings", "links", "images", "words", "mtime", "terms"],
+                          defaults=[None])
+
+# The fields stored in the index file
+_SAVED_FIELDS = list(PageMetadata._fields[:-1])
+
+# Whether MetadataScanner collects search terms. Set before the worker
+# processes are started so they inherit it.
+_collect_terms = False
+
+# The "(url)" part of links and images, which isn't text of the page
+_LINK_TARGET_RE = re.compile(r"\]\([^)]*\)")
+
+
+def _count_words(block, text):
+    # Whitespace separated words, leaving out link targets and the markers of
+    # list items and quotes. (Splitting on whitespace is several times faster
+    # than matching words with a regex, and close enough for a reading time.)
+    if "](" in text:
+        text = _LINK_TARGET_RE.sub("]", text)
+    words = len(text.split())
+    if block.block_type in (BlockType.unordered_list, BlockType.ordered_list):
+        words -= len(block.lines)
+    elif block.block_type == BlockType.quote:
+        words -= sum(1 for line in block.lines if line == ">" or line.startswith("> "))
+    return words
+
+
+def _plain_text(block, text):
+    # The text of a block without link targets and list item numbers, which
+    # aren't words of the page
+    if "](" in text:
+        text = _LINK_TARGET_RE.sub("]", text)
+    if block.block_type == BlockType.ordered_list:
+        text = "\n".join(line.partition(" ")[2] for line in text.split("\n"))
+    return text
+
+
+def set_collect_terms(enabled):
+    global _collect_terms
+    _collect_terms = enabled
+
+
+def get_collect_terms():
+    return _collect_terms
+
+
+class MetadataScanner:
+    # Collects a page's metadata from its blocks while they are on their way to
+    # the renderer (see scan), so the page is parsed once for both.
+
+    def __init__(self):
+        self.title = None
+        self.headings = []
+        self.links = []
+        self.images = []
+        self.words = 0
+        self.terms = Counter() if _collect_terms else None
+
+    def scan(self, blocks):
+        for block in blocks:
+            text = "\n".join(block.lines)
+            if block.block_type == BlockType.heading:
+                level = len(text) - len(text.lstrip("#"))
+                text = text.lstrip("#").strip()
+                if level == 1 and self.title is None:
+                    self.title = text
+                self.headings.append((level, text))
+            if "](" in text:
+                self.links += [url for _, url in extract_markdown_links(text)]
+                self.images += [url for _, url in extract_markdown_images(text)]
+            if block.block_type != BlockType.code:
+                self.words += _count_words(block, text)
+                if self.terms is not None:
+                    count_terms(_plain_text(block, text), self.terms)
+            yield block
+
+    def metadata(self):
+        # Every page needs a title, so a page without an h1 is an error
+        if self.title is None:
+            raise ValueError("h1 level header is not found")
+        terms = search_terms(self.terms) if self.terms is not None else None
+        return PageMetadata(self.title, self.headings, self.links, self.images, self.words, None, terms)
+
+
+def page_metadata(markdown):
+    # The metadata of a document that isn't rendered, e.g. one restored from the
+    # page cache. markdown may be anything parse_blocks takes.
+    scanner = MetadataScanner()
+    for _ in scanner.scan(parse_blocks(markdown)):
+        pass
+    return scanner.metadata()
+
+
+class PageIndex:
+    # The metadata of every page of the site, keyed by the page's output path
+    # relative to the public directory (with "/" separators). It is saved next
+    # to the outputs so the stages after rendering, and the next incremental
+    # build, get it without reading any markdown again. Pages that weren't
+    # rebuilt keep their previous entry (see keep).
+    #
+    # The file stores each entry as a list in the order of PageMetadata's
+    # fields instead of an object, which keeps it small for large sites.
+
+    def __init__(self, dest_dir_path):
+        self.dest_dir_path = dest_dir_path
+        self.path = os.path.join(dest_dir_path, PAGE_INDEX_FILENAME)
+        self.previous = self._load()
+        self.pages = {}
+
+    @classmethod
+    def load(cls, dest_dir_path):
+        # The index of the last build, to read from
+        index = cls(dest_dir_path)
+        index.pages = dict(index.previous)
+        return index
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as index_file:
+                data = json.load(index_file)
+        except (OSError, ValueError):
+            return {}
+        if data.get("generator_version") != GENERATOR_VERSION or data.get("fields") != _SAVED_FIELDS:
+            return {}
+        pages = {}
+        for rel_path, values in data["pages"].items():
+            metadata = PageMetadata(*values)
+            pages[rel_path] = metadata._replace(headings=[tuple(heading) for heading in metadata.headings])
+        return pages
+
+    def rel_path(self, dest_path):
+        return os.path.relpath(dest_path, self.dest_dir_path).replace(os.sep, "/")
+
+    def record(self, dest_path, metadata):
+        self.pages[self.rel_path(dest_path)] = metadata
+
+    def keep(self, dest_path, mtime):
+        # Carries over the entry of a page that didn't need rebuilding. Returns
+        # False when the last build has no entry for it.
+        rel_path = self.rel_path(dest_path)
+        old = self.previous.get(rel_path)
+        if old is None:
+            return False
+        self.pages[rel_path] = old._replace(mtime=mtime)
+        return True
+
+    def forget_previous(self):
+        # Makes the build render every page again, for a stage that needs more
+        # of each page than the index keeps (e.g. its search terms)
+        self.previous = {}
+
+    def has_previous(self, dest_path):
+        return self.rel_path(dest_path) in self.previous
+
+    def get(self, rel_path):
+        return self.pages.get(rel_path)
+
+    def items(self):
+        # (rel_path, PageMetadata) pairs, sorted by path
+        return sorted(self.pages.items())
+
+    def __len__(self):
+        return len(self.pages)
+
+    def save(self):
+        data = {
+            "generator_version": GENERATOR_VERSION,
+            "fields": _SAVED_FIELDS,
+            "pages": {rel_path: list(metadata[:-1]) for rel_path, metadata in self.items()},
+        }
+        os.makedirs(self.dest_dir_path, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as index_file:
+            json.dump(data, index_file, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,105 @@
+import gzip
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from build_log import Progress, logger
+from file_index import FileIndex
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Outputs worth compressing. Everything else (images, fonts, archives) is
+# either compressed already or too rare to matter.
+COMPRESSIBLE_EXTENSIONS = {".html", ".css", ".js", ".mjs", ".json", ".svg", ".xml", ".txt", ".md", ".map"}
+
+# Outputs smaller than this gain too little to be worth a second file
+DEFAULT_MIN_SIZE = 1024
+
+# zlib and brotli release the GIL while they compress a chunk
+DEFAULT_COMPRESS_THREADS = os.cpu_count() or 1
+
+_CHUNK_SIZE = 1 << 20
+
+
+def _gzip(from_path, tmp_path):
+    # mtime=0 and no file name in the header, so the output only depends on
+    # the content
+    with open(from_path, "rb") as source_file, open(tmp_path, "wb") as dest_file:
+        with gzip.GzipFile(filename="", mode="wb", compresslevel=9, fileobj=dest_file, mtime=0) as gzip_file:
+            shutil.copyfileobj(source_file, gzip_file, _CHUNK_SIZE)
+
+
+def _brotli(from_path, tmp_path):
+    compressor = brotli.Compressor(quality=11)
+    with open(from_path, "rb") as source_file, open(tmp_path, "wb") as dest_file:
+        for chunk in iter(lambda: source_file.read(_CHUNK_SIZE), b""):
+            dest_file.write(compressor.process(chunk))
+        dest_file.write(compressor.finish())
+
+
+# Suffix of every variant and the function writing it, or None when the
+# module it needs isn't installed
+VARIANTS = {".gz": _gzip, ".br": _brotli if brotli is not None else None}
+
+
+def is_compressible(rel_path):
+    return os.path.splitext(rel_path)[1].lower() in COMPRESSIBLE_EXTENSIONS
+
+
+def _write_variant(from_path, variant_path, compress, mtime_ns):
+    tmp_path = variant_path + ".tmp"
+    compress(from_path, tmp_path)
+    # The variant carries its source's mtime, which is how the next build
+    # tells that it is still up to date
+    os.utime(tmp_path, ns=(mtime_ns, mtime_ns))
+    os.replace(tmp_path, variant_path)
+
+
+def precompress_outputs(dest_dir_path, min_size=DEFAULT_MIN_SIZE, threads=DEFAULT_COMPRESS_THREADS, index=None):
+    # Writes a .gz (and, with the brotli module, a .br) variant next to every
+    # compressible output of at least min_size bytes, for servers that send
+    # precompressed files (nginx's gzip_static, most CDNs). Variants whose
+    # mtime matches their output's are up to date and skipped. Variants of
+    # outputs that are gone, shrank below min_size or whose encoder isn't
+    # available any more are removed. Returns (written, removed) counts.
+    if index is None:
+        index = FileIndex(dest_dir_path)
+
+    pending = []
+    stale = []
+    for entry in index.files():
+        name = os.path.basename(entry.rel_path)
+        if name.startswith("."):
+            continue
+        base, suffix = os.path.splitext(entry.rel_path)
+        if suffix in VARIANTS and is_compressible(base):
+            # A variant: only kept while its output still wants it
+            output = index.lookup(index.path(entry)[:-len(suffix)])
+            if output is None or output.size < min_size or VARIANTS[suffix] is None:
+                stale.append(index.path(entry))
+            continue
+        if not is_compressible(entry.rel_path) or entry.size < min_size:
+            continue
+        for suffix, compress in VARIANTS.items():
+            if compress is None:
+                continue
+            variant = index.lookup(index.path(entry) + suffix)
+            if variant is None or variant.mtime != entry.mtime:
+                pending.append((index.path(entry), index.path(entry) + suffix, compress, entry.mtime))
+
+    for variant_path in stale:
+        os.remove(variant_path)
+        logger.debug(f" * removed {variant_path}")
+
+    progress = Progress("Files compressed", len(pending))
+    with ThreadPoolExecutor(max_workers=max(1, threads)) as executor:
+        jobs = [executor.submit(_write_variant, *job) for job in pending]
+        for (from_path, variant_path, _, _), job in zip(pending, jobs):
+            job.result()
+            logger.debug(f" * {from_path} -> {variant_path}")
+            progress.advance()
+    progress.finish()
+    return len(pending), len(stale)
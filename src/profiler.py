@@ -0,0 +1,103 @@
+import json
+import time
+from contextlib import contextmanager
+
+# Phases in the order a build runs through them, used to order the report.
+# Some stages are timed together because the build no longer runs them as
+# separate steps, so timing them apart would mean splitting the work again.
+PHASES = [
+    "static copy",
+    "content walk",
+    "source read",
+    # Lookups and stores of the on-disk page cache
+    "page cache",
+    # Splitting the markdown into blocks and classifying them, which
+    # parse_blocks does in the same pass over the lines, together with
+    # scanning the blocks for the page's metadata
+    "block parsing",
+    # Inline parsing and building the HTML nodes of each block. The renderers
+    # convert inline markdown straight to HTML, so there is no separate inline
+    # parsing step. With the block cache this includes the HTML of blocks it
+    # missed, so "html serialization" is left with joining the blocks' HTML.
+    "block render",
+    "html serialization",
+    # Pages are streamed into their files, so this includes filling in the
+    # template
+    "file write",
+]
+
+
+class BuildProfile:
+    # Collects wall time per build phase and per page.
+    #
+    # Phase times of pages rendered in worker processes are added up, so with
+    # --jobs above 1 they are CPU seconds spent across all workers, while the
+    # total is the build's wall time.
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = None
+        self.phases = {}
+        self.pages = {}
+        self.page_phases = {}
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add_page(self, path, seconds, phases):
+        self.pages[path] = seconds
+        self.page_phases[path] = phases
+        for phase, phase_seconds in phases.items():
+            self.add(phase, phase_seconds)
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+
+    def slowest_pages(self, count):
+        return sorted(self.pages.items(), key=lambda item: item[1], reverse=True)[:count]
+
+    def to_dict(self, slowest=10):
+        return {
+            "total_seconds": self.total,
+            "page_count": len(self.pages),
+            "phases": {phase: self.phases[phase] for phase in self._ordered_phases()},
+            "slowest_pages": [
+                {"path": path, "seconds": seconds, "phases": self.page_phases[path]}
+                for path, seconds in self.slowest_pages(slowest)
+            ],
+            "pages": dict(sorted(self.pages.items())),
+        }
+
+    def write_json(self, path, slowest=10):
+        with open(path, "w") as profile_file:
+            json.dump(self.to_dict(slowest), profile_file, indent=2)
+            profile_file.write("\n")
+
+    def report(self, slowest=10):
+        # Formats the profile as a plain text table
+        lines = [f"{'phase':<24}{'seconds':>10}{'share':>8}"]
+        phase_total = sum(self.phases.values()) or 1.0
+        for phase in self._ordered_phases():
+            seconds = self.phases[phase]
+            lines.append(f"{phase:<24}{seconds:>10.4f}{seconds / phase_total:>8.1%}")
+        if self.total is not None:
+            lines.append(f"{'total (wall)':<24}{self.total:>10.4f}")
+
+        if self.pages:
+            lines.append("")
+            lines.append(f"Slowest {min(slowest, len(self.pages))} of {len(self.pages)} pages:")
+            for path, seconds in self.slowest_pages(slowest):
+                lines.append(f"{seconds:>10.4f}  {path}")
+        return "\n".join(lines)
+
+    def _ordered_phases(self):
+        known = [phase for phase in PHASES if phase in self.phases]
+        return known + sorted(phase for phase in self.phases if phase not in PHASES)
@@ -0,0 +1,244 @@
+import bisect
+import json
+import os
+import re
+import shutil
+import string
+
+from build_manifest import GENERATOR_VERSION
+from sitemap import ChangedFile, page_url
+
+# The search index is written to search-index/ in the public directory, for a
+# script in the browser to fetch:
+#   pages.json     {"prefix_length": 2, "pages": [[path, title], ...]}, where a
+#                  page's position in the list is its id. path is relative to
+#                  the site's basepath. Ids of removed pages are null until a
+#                  new page takes them.
+#   <shard>.json   {term: [id, count, id, count, ...]} for every term whose
+#                  first prefix_length characters give the shard's name (see
+#                  shard_name), with the ids in ascending order
+# A query is tokenized like the pages (see search_terms) and only the shards of
+# its terms are fetched.
+SEARCH_DIR = "search-index"
+SEARCH_PAGES_FILENAME = "pages.json"
+
+# Which shard each page's terms went to, so an incremental build only rewrites
+# the shards of the pages that changed. Kept out of SEARCH_DIR as it's of no
+# use to the browser.
+SEARCH_RECORD_FILENAME = ".search-index.json"
+
+# Characters of a term that pick its shard. With two, terms of ASCII letters
+# and digits are spread over at most 36 * 36 shards.
+PREFIX_LENGTH = 2
+
+# Words so common that their entries would be the largest part of the index
+# without helping to find anything
+STOP_WORDS = frozenset("""
+    an and are as at be but by for from has have he her his in is it its of on or our she so that the their them
+    they this to was we were which will with you your
+""".split())
+
+# Terms are runs of letters and digits. Underscores and apostrophes split
+# words like other punctuation does.
+_TERM_RE = re.compile(r"[^\W_]+")
+
+# ASCII punctuation, which count_terms turns into spaces
+_PUNCTUATION = str.maketrans(dict.fromkeys(string.punctuation, " "))
+
+
+def count_terms(text, counts):
+    # Adds the words of the plain text, in lower case, to the
+    # collections.Counter counts. Splitting on whitespace is several times
+    # faster than matching terms with _TERM_RE; search_terms splits the few
+    # distinct words that other punctuation is left in.
+    counts.update(text.lower().translate(_PUNCTUATION).split())
+
+
+def search_terms(counts):
+    # The {term: count} of a page from the counts of count_terms, leaving out
+    # single characters and stop words
+    terms = {}
+    for word, count in counts.items():
+        for term in (word,) if word.isalnum() else _TERM_RE.findall(word):
+            if len(term) > 1 and term not in STOP_WORDS:
+                terms[term] = terms.get(term, 0) + count
+    return terms
+
+
+def shard_name(term):
+    # The prefix itself when it's ASCII letters and digits, which covers most
+    # terms, otherwise "x" and the hex of its UTF-8. The names can't collide
+    # because hex ones are longer than PREFIX_LENGTH.
+    prefix = term[:PREFIX_LENGTH]
+    if prefix.isascii() and prefix.isalnum():
+        return prefix
+    return "x" + prefix.encode().hex()
+
+
+def _write_json(path, data):
+    # Returns whether the file changed
+    changed_file = ChangedFile(path)
+    try:
+        changed_file.write(json.dumps(data, ensure_ascii=False, separators=(",", ":"), sort_keys=True))
+    except BaseException:
+        changed_file.discard()
+        raise
+    return changed_file.close()
+
+
+def _add_postings(flat, pairs):
+    # Adds (id, count) pairs to a term's [id, count, id, count, ...] list,
+    # keeping the ids in order. The few pages of an incremental build are
+    # inserted where they belong instead of sorting the whole list again.
+    if len(pairs) * 16 > len(flat):
+        pairs = sorted(pairs + list(zip(flat[::2], flat[1::2])))
+        return [value for pair in pairs for value in pair]
+    ids = flat[::2]
+    for page_id, count in sorted(pairs, reverse=True):
+        position = 2 * bisect.bisect_left(ids, page_id)
+        flat[position:position] = [page_id, count]
+    return flat
+
+
+class SearchIndex:
+    # Writes the search index of the pages of a page_index.PageIndex. Pages
+    # rendered by this build carry their terms (see
+    # page_index.set_collect_terms); the entries of the other pages are left
+    # as the last build wrote them.
+
+    def __init__(self, dest_dir_path):
+        self.dest_dir_path = dest_dir_path
+        self.dir_path = os.path.join(dest_dir_path, SEARCH_DIR)
+        self.path = os.path.join(dest_dir_path, SEARCH_RECORD_FILENAME)
+        # {rel_path: (id, shard names)} of the last build. Empty when there is
+        # no index to update, in which case every page has to be rendered.
+        self.previous = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as record_file:
+                data = json.load(record_file)
+        except (OSError, ValueError):
+            return {}
+        if data.get("generator_version") != GENERATOR_VERSION or data.get("prefix_length") != PREFIX_LENGTH:
+            return {}
+        if not os.path.isfile(os.path.join(self.dir_path, SEARCH_PAGES_FILENAME)):
+            return {}
+        return {rel_path: (page_id, shards) for rel_path, (page_id, shards) in data["pages"].items()}
+
+    def write(self, page_index):
+        # Brings the index up to date with page_index and returns the number of
+        # files that changed. Only the shards holding terms of added, changed
+        # or removed pages are read and written again.
+        pages = dict(page_index.items())
+        previous = self.previous
+        updated = {rel_path: metadata.terms for rel_path, metadata in pages.items() if metadata.terms is not None}
+        missing = [rel_path for rel_path in pages if rel_path not in updated and rel_path not in previous]
+        if missing:
+            raise ValueError(f"No search terms for {len(missing)} page(s), e.g. {missing[0]}")
+
+        # Pages keep their ids. New pages take the ids of removed ones first.
+        ids = {rel_path: previous[rel_path][0] for rel_path in pages if rel_path in previous}
+        removed = [rel_path for rel_path in previous if rel_path not in pages]
+        size = max((page_id for page_id, _ in previous.values()), default=-1) + 1
+        free = sorted(set(range(size)) - set(ids.values()), reverse=True)
+        for rel_path in sorted(updated):
+            if rel_path not in ids:
+                ids[rel_path] = free.pop() if free else size
+                size = max(size, ids[rel_path] + 1)
+
+        # The postings of the pages with new terms, by shard
+        postings = {}
+        shards = {rel_path: previous[rel_path][1] for rel_path in pages if rel_path not in updated}
+        for rel_path, terms in updated.items():
+            page_id = ids[rel_path]
+            names = set()
+            for term, count in terms.items():
+                name = shard_name(term)
+                names.add(name)
+                postings.setdefault(name, {}).setdefault(term, []).append((page_id, count))
+            shards[rel_path] = sorted(names)
+
+        # Their old postings, and those of removed pages, are dropped from the
+        # shards they were in
+        outdated = [rel_path for rel_path in updated if rel_path in previous] + removed
+        stale_ids = {previous[rel_path][0] for rel_path in outdated}
+        affected = set(postings)
+        for rel_path in outdated:
+            affected.update(previous[rel_path][1])
+
+        os.makedirs(self.dir_path, exist_ok=True)
+        changed = 0
+        if not previous:
+            # A new index: shards of an index the record didn't describe go
+            for name in os.listdir(self.dir_path):
+                if name.endswith(".json") and name != SEARCH_PAGES_FILENAME and name[:-len(".json")] not in affected:
+                    os.remove(os.path.join(self.dir_path, name))
+                    changed += 1
+        for name in sorted(affected):
+            changed += self._update_shard(name, postings.get(name, {}), stale_ids, bool(previous))
+
+        page_list = [None] * size
+        for rel_path, page_id in ids.items():
+            page_list[page_id] = [page_url("", "", rel_path), pages[rel_path].title]
+        changed += _write_json(os.path.join(self.dir_path, SEARCH_PAGES_FILENAME),
+                               {"prefix_length": PREFIX_LENGTH, "pages": page_list})
+
+        self.previous = {rel_path: (ids[rel_path], shards[rel_path]) for rel_path in pages}
+        self._save()
+        return changed
+
+    def _update_shard(self, name, postings, stale_ids, incremental):
+        # Returns whether the shard file changed
+        path = os.path.join(self.dir_path, name + ".json")
+        old = {}
+        if incremental and os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as shard_file:
+                old = json.load(shard_file)
+
+        shard = {}
+        for term, flat in old.items():
+            if not stale_ids.isdisjoint(flat[::2]):
+                flat = [value for page_id, count in zip(flat[::2], flat[1::2]) if page_id not in stale_ids
+                        for value in (page_id, count)]
+            if term in postings:
+                flat = _add_postings(flat, postings[term])
+            if flat:
+                shard[term] = flat
+        for term, pairs in postings.items():
+            if term not in old:
+                shard[term] = _add_postings([], pairs)
+
+        if not shard:
+            if os.path.isfile(path):
+                os.remove(path)
+                return True
+            return False
+        return _write_json(path, shard)
+
+    def _save(self):
+        data = {
+            "generator_version": GENERATOR_VERSION,
+            "prefix_length": PREFIX_LENGTH,
+            "pages": {rel_path: [page_id, shards] for rel_path, (page_id, shards) in sorted(self.previous.items())},
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as record_file:
+            # json.dumps encodes in C, json.dump streaming to the file doesn't
+            record_file.write(json.dumps(data, separators=(",", ":")))
+        os.replace(tmp_path, self.path)
+
+
+def remove_search_index(dest_dir_path):
+    # Removes the index of a build that had search turned on. Returns whether
+    # there was one.
+    found = False
+    dir_path = os.path.join(dest_dir_path, SEARCH_DIR)
+    if os.path.isdir(dir_path):
+        shutil.rmtree(dir_path)
+        found = True
+    record_path = os.path.join(dest_dir_path, SEARCH_RECORD_FILENAME)
+    if os.path.exists(record_path):
+        os.remove(record_path)
+        found = True
+    return found
@@ -0,0 +1,246 @@
+import hashlib
+import json
+import os
+import shutil
+
+from asset_fingerprints import ASSET_MANIFEST_FILENAME
+from build_manifest import MANIFEST_FILENAME
+from copy_static_content import sync_files
+from dependency_graph import GRAPH_FILENAME
+from file_index import FileIndex
+from page_index import PAGE_INDEX_FILENAME
+from precompress import VARIANTS
+
+# Written into every shard's output directory, for merge_shards
+SHARD_FILENAME = ".shard.json"
+
+# Files a build keeps next to its outputs
+_BUILD_RECORDS = {SHARD_FILENAME, MANIFEST_FILENAME, GRAPH_FILENAME, PAGE_INDEX_FILENAME, ASSET_MANIFEST_FILENAME}
+
+
+class MergeError(Exception):
+    def __init__(self, problems):
+        super().__init__(f"{len(problems)} problem(s) merging shards: " + "; ".join(problems[:10]))
+        self.problems = problems
+
+
+def shard_of(rel_path, count):
+    # The 1-based shard an output belongs to. It only depends on the output's
+    # path relative to the public directory, so every runner agrees on it.
+    digest = hashlib.sha256(rel_path.replace(os.sep, "/").encode()).digest()
+    return int.from_bytes(digest[:8], "big") % count + 1
+
+
+def parse_shard(text):
+    # Parses "K/N", the K-th of N shards counting from 1
+    try:
+        index, count = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise ValueError(f"invalid shard: {text} (expected K/N)")
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"invalid shard: {text} (K must be between 1 and N)")
+    return Shard(index, count)
+
+
+def _tree_digest(rel_paths):
+    digest = hashlib.sha256()
+    for rel_path in sorted(rel_paths):
+        digest.update(rel_path.encode() + b"\n")
+    return digest.hexdigest()
+
+
+class Shard:
+    # One of N disjoint parts of a build. Every output file of the site (pages,
+    # content files and static files alike) belongs to exactly one shard.
+    #
+    # select() is given every (from_path, dest_path) pair of the tree and keeps
+    # the ones of this shard. It also remembers all outputs it was shown, so the
+    # marker can record how many outputs the whole site has and a digest of
+    # their paths, which merge_shards checks the union of the shards against.
+
+    def __init__(self, index, count):
+        self.index = index
+        self.count = count
+        self.outputs = set()
+        self.owned = set()
+
+    def __str__(self):
+        return f"{self.index}/{self.count}"
+
+    def dir_name(self):
+        return f"shard-{self.index}-of-{self.count}"
+
+    def select(self, pairs, dest_dir_path):
+        selected = []
+        for from_path, dest_path in pairs:
+            rel_path = os.path.relpath(dest_path, dest_dir_path).replace(os.sep, "/")
+            self.outputs.add(rel_path)
+            if shard_of(rel_path, self.count) == self.index:
+                self.owned.add(rel_path)
+                selected.append((from_path, dest_path))
+        return selected
+
+    def write_marker(self, dest_dir_path, template_hash, basepath):
+        data = {
+            "index": self.index,
+            "count": self.count,
+            "template_hash": template_hash,
+            "basepath": basepath,
+            "site_outputs": len(self.outputs),
+            "site_digest": _tree_digest(self.outputs),
+            "outputs": sorted(self.owned),
+        }
+        with open(os.path.join(dest_dir_path, SHARD_FILENAME), "w") as marker_file:
+            json.dump(data, marker_file, separators=(",", ":"))
+
+
+def _load_json(path):
+    try:
+        with open(path, "r") as json_file:
+            return json.load(json_file)
+    except (OSError, ValueError):
+        return None
+
+
+def _rebase(path, old_dir_path, new_dir_path):
+    return os.path.join(new_dir_path, os.path.relpath(path, old_dir_path))
+
+
+def merge_shards(shard_dir_paths, dest_dir_path, mode="copy"):
+    # Combines the outputs of the shard directories into dest_dir_path, together
+    # with their build manifests and dependency graphs, so dest_dir_path looks
+    # like the result of a single build. Everything is checked before anything
+    # is written: raises MergeError when a shard is missing, ran with other
+    # settings, or when an output is missing or produced by two shards.
+    # Returns the number of outputs merged.
+    problems = []
+    markers = {}
+    for shard_dir_path in shard_dir_paths:
+        marker = _load_json(os.path.join(shard_dir_path, SHARD_FILENAME))
+        if marker is None:
+            problems.append(f"{shard_dir_path} is not a shard output directory")
+        elif marker["index"] in markers:
+            problems.append(f"shard {marker['index']} given twice ({markers[marker['index']][0]}, {shard_dir_path})")
+        else:
+            markers[marker["index"]] = (shard_dir_path, marker)
+    if problems:
+        raise MergeError(problems)
+
+    first = next(iter(markers.values()))[1]
+    for key in ("count", "template_hash", "basepath", "site_outputs", "site_digest"):
+        values = {marker[key] for _, marker in markers.values()}
+        if len(values) > 1:
+            problems.append(f"shards disagree on {key}: built from different sources or settings")
+    missing_shards = sorted(set(range(1, first["count"] + 1)) - markers.keys())
+    if missing_shards:
+        problems.append(f"missing shard(s) {', '.join(map(str, missing_shards))} of {first['count']}")
+
+    files = []
+    owners = {}
+    for index, (shard_dir_path, marker) in sorted(markers.items()):
+        on_disk = {entry.rel_path.replace(os.sep, "/") for entry in FileIndex(shard_dir_path).files()
+                   if entry.rel_path not in _BUILD_RECORDS}
+        for rel_path in marker["outputs"]:
+            if rel_path in owners:
+                problems.append(f"{rel_path} built by shards {owners[rel_path]} and {index}")
+                continue
+            owners[rel_path] = index
+            if rel_path not in on_disk:
+                problems.append(f"{rel_path} missing from shard {index}")
+                continue
+            files.append((os.path.join(shard_dir_path, rel_path), os.path.join(dest_dir_path, rel_path)))
+        outputs = set(marker["outputs"])
+        for rel_path in sorted(on_disk - outputs):
+            base, suffix = os.path.splitext(rel_path)
+            if suffix in VARIANTS and base in outputs:
+                # A precompressed variant of one of the shard's outputs
+                files.append((os.path.join(shard_dir_path, rel_path), os.path.join(dest_dir_path, rel_path)))
+            else:
+                problems.append(f"{rel_path} in shard {index} doesn't belong to it")
+    if not missing_shards and len(owners) != first["site_outputs"]:
+        problems.append(f"shards hold {len(owners)} outputs, the site has {first['site_outputs']}")
+    elif not missing_shards and _tree_digest(owners) != first["site_digest"]:
+        problems.append("the shards' outputs don't match the site's outputs")
+    if problems:
+        raise MergeError(problems)
+
+    if os.path.exists(dest_dir_path):
+        shutil.rmtree(dest_dir_path)
+    for _, dest_path in files:
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    sync_files(files, mode=mode)
+    manifest = _merge_manifests(markers, dest_dir_path)
+    _merge_graphs(markers, dest_dir_path, manifest)
+    _merge_page_indexes(markers, dest_dir_path)
+    # Every shard fingerprints all assets, so any shard's asset names will do
+    for shard_dir_path, _ in markers.values():
+        asset_names_path = os.path.join(shard_dir_path, ASSET_MANIFEST_FILENAME)
+        if os.path.exists(asset_names_path):
+            shutil.copyfile(asset_names_path, os.path.join(dest_dir_path, ASSET_MANIFEST_FILENAME))
+            break
+    return len(files)
+
+
+def _merge_manifests(markers, dest_dir_path):
+    merged = None
+    for shard_dir_path, _ in markers.values():
+        manifest = _load_json(os.path.join(shard_dir_path, MANIFEST_FILENAME))
+        if manifest is None:
+            continue
+        if merged is None:
+            merged = dict(manifest, pages={}, static={})
+        for section in ("pages", "static"):
+            for source, entry in manifest.get(section, {}).items():
+                merged[section][source] = dict(entry, dest=_rebase(entry["dest"], shard_dir_path, dest_dir_path))
+    if merged is not None:
+        with open(os.path.join(dest_dir_path, MANIFEST_FILENAME), "w") as manifest_file:
+            json.dump(merged, manifest_file, separators=(",", ":"), sort_keys=True)
+    return merged
+
+
+def _merge_graphs(markers, dest_dir_path, manifest):
+    # The graph keys outputs by normalized path, see dependency_graph.py. A
+    # shard only knows the hashes of its own static files, so the hashes of
+    # referenced images are taken from the merged manifest instead.
+    def rebase(path, shard_dir_path):
+        return os.path.normpath(_rebase(path, shard_dir_path, dest_dir_path))
+
+    merged = None
+    for shard_dir_path, _ in markers.values():
+        graph = _load_json(os.path.join(shard_dir_path, GRAPH_FILENAME))
+        if graph is None:
+            continue
+        if merged is None:
+            merged = dict(graph, pages={}, images={})
+        for page, entry in graph.get("pages", {}).items():
+            merged["pages"][rebase(page, shard_dir_path)] = dict(
+                entry,
+                links=[rebase(target, shard_dir_path) for target in entry["links"]],
+                images=[rebase(target, shard_dir_path) for target in entry["images"]],
+            )
+    if merged is None:
+        return
+    hashes = {}
+    if manifest is not None:
+        hashes = {os.path.normpath(entry["dest"]): entry["hash"] for entry in manifest["static"].values()}
+    referenced = {target for entry in merged["pages"].values() for target in entry["images"]}
+    merged["images"] = {target: hashes.get(target) for target in sorted(referenced)}
+    with open(os.path.join(dest_dir_path, GRAPH_FILENAME), "w") as graph_file:
+        json.dump(merged, graph_file, separators=(",", ":"), sort_keys=True)
+
+
+def _merge_page_indexes(markers, dest_dir_path):
+    # Page index entries are keyed relative to the output directory, and every
+    # page is in one shard, so the shards' entries are simply combined
+    merged = None
+    for shard_dir_path, _ in markers.values():
+        page_index = _load_json(os.path.join(shard_dir_path, PAGE_INDEX_FILENAME))
+        if page_index is None:
+            continue
+        if merged is None:
+            merged = dict(page_index, pages={})
+        merged["pages"].update(page_index.get("pages", {}))
+    if merged is not None:
+        merged["pages"] = dict(sorted(merged["pages"].items()))
+        with open(os.path.join(dest_dir_path, PAGE_INDEX_FILENAME), "w") as index_file:
+            json.dump(merged, index_file, separators=(",", ":"))
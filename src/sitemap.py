@@ -0,0 +1,180 @@
+import hashlib
+import heapq
+import os
+import time
+from urllib.parse import quote
+from xml.sax.saxutils import escape
+
+from build_manifest import hash_file
+
+# Limits of a single sitemap file, see https://www.sitemaps.org/protocol.html
+SITEMAP_MAX_URLS = 50000
+SITEMAP_MAX_BYTES = 50 * 1024 * 1024
+
+SITEMAP_FILENAME = "sitemap.xml"
+FEED_FILENAME = "feed.xml"
+
+# Number of most recently changed pages listed in the feed
+FEED_ENTRIES = 20
+
+_SITEMAP_NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+
+
+def page_url(site_url, basepath, rel_path):
+    # The absolute URL of the page at rel_path in the public directory, the way
+    # the site links to it: "blog/tom/index.html" is served as "blog/tom/"
+    if rel_path == "index.html":
+        rel_path = ""
+    elif rel_path.endswith("/index.html"):
+        rel_path = rel_path[:-len("index.html")]
+    return site_url.rstrip("/") + basepath + quote(rel_path)
+
+
+def _escape_attr(text):
+    return escape(text, {'"': "&quot;"})
+
+
+def _timestamp(mtime_ns):
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(mtime_ns // 10 ** 9))
+
+
+class ChangedFile:
+    # Streams a file to a temporary path while hashing it. close() only moves
+    # it into place when its content differs from the file already there, so
+    # unchanged files keep their modification time and aren't uploaded again.
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.file = open(self.tmp_path, "w", encoding="utf-8")
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, text):
+        data = text.encode()
+        self.digest.update(data)
+        self.size += len(data)
+        self.file.write(text)
+
+    def close(self):
+        # Returns whether the file was rewritten
+        self.file.close()
+        if os.path.isfile(self.path) and hash_file(self.path) == self.digest.hexdigest():
+            os.remove(self.tmp_path)
+            return False
+        os.replace(self.tmp_path, self.path)
+        return True
+
+    def discard(self):
+        self.file.close()
+        os.remove(self.tmp_path)
+
+
+def write_sitemaps(page_index, dest_dir_path, site_url, basepath,
+                   max_urls=SITEMAP_MAX_URLS, max_bytes=SITEMAP_MAX_BYTES):
+    # Writes the sitemap of every page of the page_index.PageIndex, streaming
+    # one entry at a time. A site too large for one sitemap gets sitemap-1.xml,
+    # sitemap-2.xml, ... and a sitemap.xml indexing them. Returns the paths of
+    # the files that changed.
+    footer = "</urlset>\n"
+    parts = []
+    current = None
+    count = 0
+
+    def start_part():
+        # The first part is sitemap.xml itself until a second one is needed
+        if len(parts) == 1:
+            parts[0].path = os.path.join(dest_dir_path, "sitemap-1.xml")
+        name = SITEMAP_FILENAME if not parts else f"sitemap-{len(parts) + 1}.xml"
+        part = ChangedFile(os.path.join(dest_dir_path, name))
+        part.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{_SITEMAP_NS}">\n')
+        parts.append(part)
+        return part
+
+    try:
+        for rel_path, metadata in page_index.items():
+            entry = f"<url><loc>{escape(page_url(site_url, basepath, rel_path))}</loc>"
+            if metadata.mtime is not None:
+                entry += f"<lastmod>{_timestamp(metadata.mtime)}</lastmod>"
+            entry += "</url>\n"
+            if current is None or count == max_urls or current.size + len(entry) + len(footer) > max_bytes:
+                if current is not None:
+                    current.write(footer)
+                current = start_part()
+                count = 0
+            current.write(entry)
+            count += 1
+        if current is None:
+            current = start_part()
+        current.write(footer)
+    except BaseException:
+        for part in parts:
+            part.discard()
+        raise
+
+    changed = [part.path for part in parts if part.close()]
+    if len(parts) > 1:
+        index = ChangedFile(os.path.join(dest_dir_path, SITEMAP_FILENAME))
+        index.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{_SITEMAP_NS}">\n')
+        for part in parts:
+            url = site_url.rstrip("/") + basepath + os.path.basename(part.path)
+            index.write(f"<sitemap><loc>{escape(url)}</loc></sitemap>\n")
+        index.write("</sitemapindex>\n")
+        if index.close():
+            changed.append(index.path)
+
+    # Parts left over from a build of a larger site
+    number = len(parts) + 1 if len(parts) > 1 else 1
+    while os.path.isfile(os.path.join(dest_dir_path, f"sitemap-{number}.xml")):
+        stale_path = os.path.join(dest_dir_path, f"sitemap-{number}.xml")
+        os.remove(stale_path)
+        changed.append(stale_path)
+        number += 1
+    return changed
+
+
+def write_feed(page_index, dest_dir_path, site_url, basepath, entries=FEED_ENTRIES, author=None):
+    # Writes an Atom feed of the most recently changed pages of the
+    # page_index.PageIndex. Returns whether the feed changed. Atom needs an
+    # author for entries that don't name one, which none of them do, so the
+    # feed has one: author, or the site's title without it.
+    pages = heapq.nlargest(entries, ((metadata.mtime or 0, rel_path, metadata)
+                                     for rel_path, metadata in page_index.items()))
+    home = page_index.get("index.html")
+    title = home.title if home is not None else site_url
+    site = page_url(site_url, basepath, "index.html")
+    updated = _timestamp(pages[0][0] if pages else 0)
+
+    feed = ChangedFile(os.path.join(dest_dir_path, FEED_FILENAME))
+    try:
+        feed.write('<?xml version="1.0" encoding="UTF-8"?>\n<feed xmlns="http://www.w3.org/2005/Atom">\n')
+        feed.write(f"<title>{escape(title)}</title>\n<id>{escape(site)}</id>\n<updated>{updated}</updated>\n")
+        feed.write(f"<author><name>{escape(author or title)}</name></author>\n")
+        feed.write(f'<link href="{_escape_attr(site)}"/>\n')
+        feed.write(f'<link rel="self" href="{_escape_attr(site + FEED_FILENAME)}"/>\n')
+        for mtime, rel_path, metadata in pages:
+            url = _escape_attr(page_url(site_url, basepath, rel_path))
+            feed.write(f'<entry><title>{escape(metadata.title)}</title><id>{url}</id><link href="{url}"/>'
+                       f"<updated>{_timestamp(mtime)}</updated></entry>\n")
+        feed.write("</feed>\n")
+    except BaseException:
+        feed.discard()
+        raise
+    return feed.close()
+
+
+def remove_site_files(dest_dir_path):
+    # Removes the sitemaps and the feed of a build that had a site URL.
+    # Returns whether there were any.
+    found = False
+    names = [SITEMAP_FILENAME, FEED_FILENAME]
+    number = 1
+    while os.path.isfile(os.path.join(dest_dir_path, f"sitemap-{number}.xml")):
+        names.append(f"sitemap-{number}.xml")
+        number += 1
+    for name in names:
+        path = os.path.join(dest_dir_path, name)
+        if os.path.isfile(path):
+            os.remove(path)
+            found = True
+    return found
@@ -0,0 +1,113 @@
+import hashlib
+import os
+import re
+
+_PLACEHOLDER_RE = re.compile(r"\{\{ (Title|Content) \}\}")
+
+# A root-relative href or src, up to its query or fragment
+_ROOT_URL_RE = re.compile(r'(href|src)="/([^"?#]*)')
+
+# Compiled templates by (template_path, basepath, asset names version),
+# checked against the file's mtime
+_template_cache = {}
+
+# Fingerprinted names of the static assets for load_template (see
+# asset_fingerprints.py), and a counter telling the compiled templates apart
+_asset_names = None
+_asset_names_version = 0
+
+
+def set_asset_names(asset_names):
+    global _asset_names, _asset_names_version
+    if asset_names != _asset_names:
+        _asset_names = asset_names
+        _asset_names_version += 1
+
+
+def get_asset_names():
+    return _asset_names
+
+
+def rewrite_root_urls(html, basepath, asset_names=None):
+    # Points root-relative links and images at the basepath the site is served
+    # under. asset_names maps paths (without the leading "/") to fingerprinted
+    # ones, which replace them in the same pass.
+    if asset_names:
+        def rewrite(match):
+            path = match.group(2)
+            return f'{match.group(1)}="{basepath}{asset_names.get(path, path)}'
+        return _ROOT_URL_RE.sub(rewrite, html)
+    if basepath == "/":
+        return html
+    html = html.replace('href="/', 'href="' + basepath)
+    return html.replace('src="/', 'src="' + basepath)
+
+
+class Template:
+    # A page template split once into literal segments and placeholder slots.
+    #
+    # The basepath is applied to the literals when the template is compiled, so
+    # rendering a page only has to rewrite the inserted title and content and
+    # join the pieces together. The same goes for fingerprinted asset names.
+
+    def __init__(self, template_html, basepath="/", asset_names=None):
+        self.basepath = basepath
+        self.asset_names = asset_names
+        # Identifies the template in the keys of the on-disk page cache and in
+        # the dependency graph. Pages link to assets by their fingerprinted
+        # names, so a changed asset changes the hash and every page is rebuilt.
+        digest = hashlib.sha256(template_html.encode())
+        if asset_names:
+            for path, name in sorted(asset_names.items()):
+                digest.update(f"\0{path}\0{name}".encode())
+        self.hash = digest.hexdigest()
+        self.segments = []
+        position = 0
+        for match in _PLACEHOLDER_RE.finditer(template_html):
+            self.segments.append((False, self._rewrite(template_html[position:match.start()])))
+            self.segments.append((True, match.group(1)))
+            position = match.end()
+        self.segments.append((False, self._rewrite(template_html[position:])))
+
+    def _rewrite(self, html):
+        return rewrite_root_urls(html, self.basepath, self.asset_names)
+
+    def render(self, title, content_html):
+        values = {
+            "Title": self._rewrite(title),
+            "Content": self._rewrite(content_html),
+        }
+        return "".join(values[text] if is_slot else text for is_slot, text in self.segments)
+
+    def write(self, file, title, content_fragments):
+        # Like render, but streams the page into a file object. The content is
+        # given as an iterable of HTML fragments (see HTMLNode.iter_html) and
+        # each fragment is rewritten and written as it arrives.
+        slots = [text for is_slot, text in self.segments if is_slot]
+        if slots.count("Content") > 1:
+            content_fragments = list(content_fragments)
+
+        for is_slot, text in self.segments:
+            if not is_slot:
+                file.write(text)
+            elif text == "Title":
+                file.write(self._rewrite(title))
+            elif self.basepath == "/" and not self.asset_names:
+                file.writelines(content_fragments)
+            else:
+                file.writelines(self._rewrite(fragment) for fragment in content_fragments)
+
+
+def load_template(template_path, basepath):
+    # Reads and compiles the template, reusing the compiled one while the file
+    # and the asset names are unchanged
+    mtime = os.stat(template_path).st_mtime_ns
+    key = (template_path, basepath, _asset_names_version)
+    cached = _template_cache.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with open(template_path, "r") as template_file:
+        template = Template(template_file.read(), basepath, _asset_names)
+    _template_cache[key] = (mtime, template)
+    return template
@@ -0,0 +1,69 @@
+import json
+import os
+import unittest
+
+from asset_fingerprints import ASSET_MANIFEST_FILENAME, fingerprinted_path, save_asset_names
+from build_manifest import hash_file
+from dependency_graph import DependencyGraph
+from fixtures import SiteTestCase, read_file, start_method
+
+
+class TestFingerprintedPath(unittest.TestCase):
+    def test_fingerprinted_path(self):
+        self.assertEqual(fingerprinted_path("images/tom.png", "0123456789abcdef"), "images/tom.01234567.png")
+        self.assertEqual(fingerprinted_path("a.b/LICENSE", "0123456789abcdef"), "a.b/LICENSE.01234567")
+
+
+class TestFingerprintedBuild(SiteTestCase):
+    template_text = '<link href="/index.css" />{{ Content }}'
+
+    def setUp(self):
+        super().setUp()
+        self.write(os.path.join(self.static, "index.css"), "body {}")
+        self.write(os.path.join(self.static, "images", "cat.png"), "cat")
+        self.write(os.path.join(self.static, "robots.txt"), "")
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\n![cat](/images/cat.png)\n")
+
+    def build(self, jobs=1):
+        # Returns the built home page
+        asset_names = {}
+        self.build_site(basepath="/blog/", jobs=jobs, static=True, graph=DependencyGraph(self.public),
+                        asset_names=asset_names)
+        save_asset_names(asset_names, self.public)
+        return read_file(os.path.join(self.public, "index.html"))
+
+    def test_assets_are_renamed_and_referenced(self):
+        page = self.build()
+        css = fingerprinted_path("index.css", hash_file(os.path.join(self.static, "index.css")))
+        png = fingerprinted_path("images/cat.png", hash_file(os.path.join(self.static, "images", "cat.png")))
+        self.assertIn(f'href="/blog/{css}"', page)
+        self.assertIn(f'src="/blog/{png}"', page)
+        self.assertTrue(os.path.exists(os.path.join(self.public, css)))
+        self.assertTrue(os.path.exists(os.path.join(self.public, "robots.txt")))
+        self.assertFalse(os.path.exists(os.path.join(self.public, "index.css")))
+        with open(os.path.join(self.public, ASSET_MANIFEST_FILENAME)) as manifest_file:
+            self.assertEqual(json.load(manifest_file), {"index.css": css, "images/cat.png": png})
+
+    def test_parallel_build_references_assets(self):
+        # Workers that don't inherit the parent's globals still get the names
+        self.write(os.path.join(self.content, "about.md"), "# About\n")
+        with start_method("spawn"):
+            page = self.build(jobs=2)
+        css = fingerprinted_path("index.css", hash_file(os.path.join(self.static, "index.css")))
+        png = fingerprinted_path("images/cat.png", hash_file(os.path.join(self.static, "images", "cat.png")))
+        self.assertIn(f'href="/blog/{css}"', page)
+        self.assertIn(f'src="/blog/{png}"', page)
+        self.assertIn(f'href="/blog/{css}"', read_file(os.path.join(self.public, "about.html")))
+
+    def test_changed_asset_updates_pages(self):
+        self.build()
+        old_png = fingerprinted_path("images/cat.png", hash_file(os.path.join(self.static, "images", "cat.png")))
+        self.write(os.path.join(self.static, "images", "cat.png"), "another cat")
+        page = self.build()
+        png = fingerprinted_path("images/cat.png", hash_file(os.path.join(self.static, "images", "cat.png")))
+        self.assertIn(f'src="/blog/{png}"', page)
+        self.assertFalse(os.path.exists(os.path.join(self.public, old_png)))
+
+
+if __name__ == "__main__":
+    unittest.main()
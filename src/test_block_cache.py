@@ -0,0 +1,68 @@
+import unittest
+
+from block_cache import BlockCache
+from block_markdown import BlockType, markdown_to_html_node, set_block_cache
+
+
+def key(text):
+    return (1, BlockType.paragraph, (text,))
+
+
+class TestBlockCache(unittest.TestCase):
+    def test_get_put(self):
+        cache = BlockCache()
+        self.assertIsNone(cache.get(key("a")))
+        cache.put(key("a"), "<p>a</p>")
+        self.assertEqual(cache.get(key("a")), "<p>a</p>")
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_evicts_least_recently_used(self):
+        cache = BlockCache(max_bytes=700)
+        cache.put(key("a"), "<p>a</p>")
+        cache.put(key("b"), "<p>b</p>")
+        cache.put(key("c"), "<p>c</p>")
+        cache.get(key("a"))
+        cache.put(key("d"), "<p>d</p>")
+        self.assertEqual(list(cache.entries), [key("c"), key("a"), key("d")])
+        self.assertLessEqual(cache.size, cache.max_bytes)
+
+    def test_oversized_entry_not_cached(self):
+        cache = BlockCache(max_bytes=300)
+        cache.put(key("a"), "x" * 1000)
+        self.assertEqual(len(cache.entries), 0)
+        self.assertEqual(cache.size, 0)
+
+    def test_replacing_entry_keeps_size(self):
+        cache = BlockCache()
+        cache.put(key("a"), "<p>a</p>")
+        size = cache.size
+        cache.put(key("a"), "<p>a</p>")
+        self.assertEqual(cache.size, size)
+
+    def test_summary(self):
+        cache = BlockCache()
+        self.assertEqual(cache.summary(3, 1), "Block cache: 3 hits, 1 misses (75.0% hit rate)")
+
+
+class TestCachedMarkdownToHTMLNode(unittest.TestCase):
+    def tearDown(self):
+        set_block_cache(None)
+
+    def test_cached_output_matches_uncached(self):
+        md = "# Title\n\nShared **footer** with a [link](/about)\n\n- item\n- *item*\n\n```\ncode\n```"
+        expected = markdown_to_html_node(md).to_html()
+
+        cache = BlockCache()
+        set_block_cache(cache)
+        self.assertEqual(markdown_to_html_node(md).to_html(), expected)
+        self.assertEqual(markdown_to_html_node(md).to_html(), expected)
+        self.assertEqual((cache.hits, cache.misses), (4, 4))
+
+    def test_same_text_different_block_type(self):
+        set_block_cache(BlockCache())
+        self.assertEqual(markdown_to_html_node("text").to_html(), "<div><p>text</p></div>")
+        self.assertEqual(markdown_to_html_node("```\ntext\n```").to_html(), "<div><pre><code>text\n</code></pre></div>")
+
+
+if __name__ == "__main__":
+    unittest.main()
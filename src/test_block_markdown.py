@@ -199,8 +199,126 @@ the **same** even with inline stuff
             "<div><pre><code>This is text that *should* remain\nthe **same** even with inline stuff\n</code></pre></div>",
         )
 
-    
+    def test_code_keeps_indentation(self):
+        md = """
+```
+func main(){
+    fmt.Println("Aiya, Ambar!")
+}
+```
+"""
+        node = markdown_to_html_node(md)
+        self.assertEqual(
+            node.to_html(),
+            '<div><pre><code>func main(){\n    fmt.Println("Aiya, Ambar!")\n}\n</code></pre></div>',
+        )
+
+    def test_code_with_blank_lines(self):
+        md = "```\nfirst\n\n\nsecond\n```\n\nafter"
+        self.assertEqual(
+            markdown_to_html_node(md).to_html(),
+            "<div><pre><code>first\n\n\nsecond\n</code></pre><p>after</p></div>",
+        )
+
+    def test_indented_fence_indentation_removed(self):
+        md = """
+        ```
+        if x:
+            return 1
+        ```
+        """
+        self.assertEqual(
+            list(parse_blocks(md)),
+            [Block(BlockType.code, ["if x:", "    return 1"])],
+        )
+
+    def test_unclosed_fence_ends_at_blank_line(self):
+        self.assertEqual(
+            list(parse_blocks("```\ncode\nmore code\n\nmore\n\n## Head")),
+            [
+                Block(BlockType.code, ["code", "more code"]),
+                Block(BlockType.paragraph, ["more"]),
+                Block(BlockType.heading, ["## Head"]),
+            ],
+        )
+        self.assertEqual(list(parse_blocks("```\ncode\nmore")), [Block(BlockType.code, ["code", "more"])])
+
+    def test_fence_closed_at_end_of_line(self):
+        md = "```\ncode```\n\nNext paragraph\n\n## Head"
+        self.assertEqual(
+            markdown_to_html_node(md).to_html(),
+            "<div><pre><code>code\n</code></pre><p>Next paragraph</p><h2>Head</h2></div>",
+        )
+
+    def test_parse_blocks_types(self):
+        md = """
+# heading
+with a second line
+
+> quote
+> more
+
+- item
+- item
+
+1. one
+2. two
+
+para
+- not a list
+"""
+        self.assertEqual(
+            list(parse_blocks(md)),
+            [
+                Block(BlockType.heading, ["# heading", "with a second line"]),
+                Block(BlockType.quote, ["> quote", "> more"]),
+                Block(BlockType.unordered_list, ["- item", "- item"]),
+                Block(BlockType.ordered_list, ["1. one", "2. two"]),
+                Block(BlockType.paragraph, ["para", "- not a list"]),
+            ],
+        )
+
+    def test_ordered_list_past_nine(self):
+        md = "\n".join(f"{i}. item {i}" for i in range(1, 12))
+        html = markdown_to_html_node(md).to_html()
+        self.assertIn("<li>item 9</li><li>item 10</li><li>item 11</li>", html)
+
+    def test_parse_blocks_matches_string_blocks(self):
+        # Without code blocks, parse_blocks agrees with markdown_to_blocks + block_to_block_type
+        md = """
+  # Title  
+
+Some **bold** text
+   across lines
+
+> quoted
+>
+> -- someone
+
+- a
+- *b*
+
+1. x
+2. y
+
+####### not a heading
+
+## Sub *heading*
+"""
+        blocks = list(parse_blocks(md))
+        self.assertEqual(["\n".join(block.lines) for block in blocks], markdown_to_blocks(md))
+        self.assertEqual([block.block_type for block in blocks], [block_to_block_type(b) for b in markdown_to_blocks(md)])
+        self.assertEqual(
+            markdown_to_html_node(md).to_html(),
+            "<div>" + "".join(block_to_html_node(b, block_to_block_type(b)).to_html() for b in markdown_to_blocks(md)) + "</div>",
+        )
+
+
+    def test_parse_blocks_of_utf8_bytes(self):
+        md = "# Tïtle\r\n\nSome *text* — with ünïcode\n\n```\n  code\n\n```\n- a\n- b"
+        self.assertEqual(list(parse_blocks(md.encode())), list(parse_blocks(md.replace("\r", ""))))
+        self.assertEqual(markdown_to_html_node(md.encode()).to_html(), markdown_to_html_node(md).to_html())
+
+
 if __name__ == "__main__":
     unittest.main()
-
-   
\ No newline at end of file
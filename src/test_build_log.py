@@ -0,0 +1,82 @@
+import io
+import json
+import logging
+import unittest
+from unittest import mock
+
+import build_log
+from build_log import Progress, logger, setup_logging, unbuffer_log
+
+
+class TestBuildLog(unittest.TestCase):
+    def setUp(self):
+        self.stream = io.StringIO()
+        self.level = logger.level
+
+    def tearDown(self):
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        logger.setLevel(self.level)
+        logger.propagate = True
+
+    def test_levels(self):
+        setup_logging(logging.WARNING, stream=self.stream, buffered=False)
+        logger.info("hidden")
+        logger.warning("shown")
+        self.assertEqual(self.stream.getvalue(), "shown\n")
+
+    def test_buffered_until_flush(self):
+        handler = setup_logging(stream=self.stream)
+        logger.info("one")
+        self.assertEqual(self.stream.getvalue(), "")
+        handler.flush()
+        self.assertEqual(self.stream.getvalue(), "one\n")
+
+    def test_warning_flushes_buffer(self):
+        setup_logging(stream=self.stream)
+        logger.info("one")
+        logger.warning("two")
+        self.assertEqual(self.stream.getvalue(), "one\ntwo\n")
+
+    def test_flush_interval(self):
+        handler = setup_logging(stream=self.stream)
+        logger.info("one")
+        handler.last_flush -= build_log.FLUSH_INTERVAL
+        logger.info("two")
+        self.assertEqual(self.stream.getvalue(), "one\ntwo\n")
+
+    def test_json_format(self):
+        setup_logging(log_format="json", stream=self.stream, buffered=False)
+        logger.info("Built", extra={"fields": {"pages": 3}})
+        entry = json.loads(self.stream.getvalue())
+        self.assertEqual((entry["level"], entry["message"], entry["pages"]), ("info", "Built", 3))
+
+    def test_unbuffer_drops_inherited_records(self):
+        setup_logging(stream=self.stream)
+        logger.info("parent")
+        unbuffer_log()
+        logger.info("worker")
+        self.assertEqual(self.stream.getvalue(), "worker\n")
+
+
+class TestProgress(unittest.TestCase):
+    def test_reports_rate_and_eta(self):
+        with mock.patch("build_log.time.monotonic", side_effect=[0.0, 5.0, 10.0, 10.0]), \
+                self.assertLogs("ssg", level="INFO") as logs:
+            progress = Progress("Pages rendered", 100, unit="pages")
+            progress.advance(50)
+            progress.advance(50)
+            progress.finish()
+        self.assertEqual(logs.output, [
+            "INFO:ssg:Pages rendered: 50/100 (50%), 10 pages/s, ETA 5s",
+            "INFO:ssg:Pages rendered: 100 pages in 10.00s (10 pages/s)",
+        ])
+
+    def test_nothing_done_logs_nothing(self):
+        with mock.patch.object(logger, "info") as info:
+            Progress("Files copied", 0).finish()
+        info.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import os
+import tempfile
+import unittest
+
+from build_manifest import BuildManifest
+from fixtures import write_file
+
+
+class TestBuildManifest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+        self.public = os.path.join(self.root, "public")
+        self.source = os.path.join(self.root, "index.md")
+        self.dest = os.path.join(self.public, "index.html")
+        os.makedirs(self.public)
+        write_file(self.source, "# Hello")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self, template_hash="t1", basepath="/"):
+        # Simulates a build of the single page, returns whether it was skipped
+        manifest = BuildManifest(self.public, template_hash, basepath)
+        fresh = manifest.is_up_to_date("pages", self.source, self.dest)
+        if not fresh:
+            write_file(self.dest, "<h1>Hello</h1>")
+        manifest.remove_stale_outputs()
+        manifest.save()
+        return fresh
+
+    def test_first_build_is_not_up_to_date(self):
+        self.assertFalse(self.build())
+
+    def test_unchanged_source_is_skipped(self):
+        self.build()
+        self.assertTrue(self.build())
+
+    def test_touched_source_with_same_content_is_skipped(self):
+        self.build()
+        os.utime(self.source, ns=(0, 0))
+        self.assertTrue(self.build())
+
+    def test_changed_source_is_rebuilt(self):
+        self.build()
+        write_file(self.source, "# Hello, world")
+        self.assertFalse(self.build())
+
+    def test_missing_output_is_rebuilt(self):
+        self.build()
+        os.remove(self.dest)
+        self.assertFalse(self.build())
+
+    def test_template_change_rebuilds_pages(self):
+        self.build()
+        self.assertFalse(self.build(template_hash="t2"))
+
+    def test_basepath_change_rebuilds_pages(self):
+        self.build()
+        self.assertFalse(self.build(basepath="/blog/"))
+
+    def test_vanished_source_output_is_removed(self):
+        nested_source = os.path.join(self.root, "blog", "index.md")
+        nested_dest = os.path.join(self.public, "blog", "index.html")
+        write_file(nested_source, "# Blog")
+        manifest = BuildManifest(self.public, "t1", "/")
+        manifest.is_up_to_date("pages", nested_source, nested_dest)
+        write_file(nested_dest, "<h1>Blog</h1>")
+        manifest.save()
+
+        os.remove(nested_source)
+        manifest = BuildManifest(self.public, "t1", "/")
+        removed = manifest.remove_stale_outputs()
+        self.assertEqual(removed, [nested_dest])
+        self.assertFalse(os.path.exists(os.path.dirname(nested_dest)))
+        self.assertTrue(os.path.isdir(self.public))
+
+
+    def test_renamed_output_is_removed(self):
+        manifest = BuildManifest(self.public, "t1", "/")
+        manifest.is_up_to_date("static", self.source, self.dest)
+        write_file(self.dest, "old name")
+        manifest.save()
+
+        renamed = os.path.join(self.public, "index.abc.html")
+        manifest = BuildManifest(self.public, "t1", "/")
+        manifest.is_up_to_date("static", self.source, renamed)
+        self.assertEqual(manifest.remove_stale_outputs(), [self.dest])
+
+    def test_source_hash_reuses_recorded_hash(self):
+        self.build()
+        manifest = BuildManifest(self.public, "t1", "/")
+        recorded = manifest.previous["pages"][self.source]["hash"]
+        self.assertEqual(manifest.source_hash("pages", self.source), recorded)
+        write_file(self.source, "# Changed")
+        self.assertNotEqual(manifest.source_hash("pages", self.source), recorded)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+
+from copy_static_content import copy_static_files_recursively, dest_matches_source, sync_file
+from fixtures import read_file, write_file
+
+
+class TestCopyStaticContent(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.static = os.path.join(self.tmp.name, "static")
+        self.public = os.path.join(self.tmp.name, "public")
+        write_file(os.path.join(self.static, "index.css"), "body {}")
+        write_file(os.path.join(self.static, "images", "a.png"), "png bytes")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_copies_tree(self):
+        copied = copy_static_files_recursively(self.static, self.public)
+        self.assertEqual(len(copied), 2)
+        self.assertEqual(read_file(os.path.join(self.public, "images", "a.png")), "png bytes")
+
+    def test_unchanged_files_are_skipped(self):
+        copy_static_files_recursively(self.static, self.public)
+        self.assertEqual(copy_static_files_recursively(self.static, self.public), [])
+
+    def test_changed_file_is_copied_again(self):
+        copy_static_files_recursively(self.static, self.public)
+        css = os.path.join(self.static, "index.css")
+        write_file(css, "body { color: red; }")
+        copied = copy_static_files_recursively(self.static, self.public, threads=1)
+        self.assertEqual(copied, [(css, os.path.join(self.public, "index.css"))])
+        self.assertEqual(read_file(os.path.join(self.public, "index.css")), "body { color: red; }")
+
+    def test_modes(self):
+        for mode in ("copy", "hardlink", "reflink"):
+            with self.subTest(mode=mode):
+                from_path = os.path.join(self.static, "index.css")
+                dest_path = os.path.join(self.tmp.name, mode + ".css")
+                sync_file(from_path, dest_path, mode)
+                self.assertEqual(read_file(dest_path), "body {}")
+                self.assertTrue(dest_matches_source(from_path, dest_path))
+                self.assertFalse(os.path.exists(dest_path + ".tmp"))
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            copy_static_files_recursively(self.static, self.public, mode="symlink")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import os
+import tempfile
+import unittest
+
+from block_markdown import markdown_to_html_node
+from corpus import SHAPES, generate_corpus
+from generate_content import extract_title
+
+
+class TestCorpus(unittest.TestCase):
+    def read_tree(self, root):
+        pages = {}
+        for dir_path, _, file_names in os.walk(root):
+            for file_name in file_names:
+                path = os.path.join(dir_path, file_name)
+                with open(path) as file:
+                    pages[os.path.relpath(path, root)] = file.read()
+        return pages
+
+    def test_shapes_render(self):
+        for shape in SHAPES:
+            with self.subTest(shape=shape), tempfile.TemporaryDirectory() as tmp:
+                total_bytes = generate_corpus(tmp, 30, shape)
+                pages = self.read_tree(tmp)
+                self.assertEqual(len(pages), 30)
+                self.assertEqual(total_bytes, sum(len(page.encode()) for page in pages.values()))
+                for markdown in pages.values():
+                    markdown_to_html_node(markdown).to_html()
+                    self.assertTrue(extract_title(markdown).startswith("Page "))
+
+    def test_same_seed_same_tree(self):
+        with tempfile.TemporaryDirectory() as first, tempfile.TemporaryDirectory() as second:
+            generate_corpus(first, 10, "mixed", seed=3)
+            generate_corpus(second, 10, "mixed", seed=3)
+            self.assertEqual(self.read_tree(first), self.read_tree(second))
+
+    def test_deep_shape_nests_directories(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            generate_corpus(tmp, 5, "deep")
+            depths = {path.count(os.sep) for path in self.read_tree(tmp)}
+            self.assertEqual(depths, {9})
+
+    def test_unknown_shape(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with self.assertRaises(ValueError):
+                generate_corpus(tmp, 1, "tiny")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import logging
+import os
+import tempfile
+import unittest
+
+from build_log import logger
+from dependency_graph import DependencyGraph, link_targets
+from fixtures import SiteTestCase
+
+
+class TestLinkTargets(unittest.TestCase):
+    def test_root_relative(self):
+        self.assertEqual(link_targets("/blog/tom", "public/index.html", "public"),
+                         ["public/blog/tom.html", "public/blog/tom/index.html"])
+        self.assertEqual(link_targets("/", "public/blog/index.html", "public"), ["public/index.html"])
+        self.assertEqual(link_targets("/images/tom.png", "public/index.html", "public"), ["public/images/tom.png"])
+
+    def test_relative(self):
+        self.assertEqual(link_targets("../about/#team", "public/blog/index.html", "public"),
+                         ["public/about/index.html"])
+
+    def test_external(self):
+        self.assertEqual(link_targets("https://www.boot.dev", "public/index.html", "public"), [])
+        self.assertEqual(link_targets("mailto:me@example.com", "public/index.html", "public"), [])
+        self.assertEqual(link_targets("#top", "public/index.html", "public"), [])
+
+
+class TestDependencyGraph(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.public = os.path.join(self.tmp.name, "public")
+        self.index = os.path.join(self.public, "index.html")
+        self.about = os.path.join(self.public, "about", "index.html")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def saved_graph(self):
+        graph = DependencyGraph(self.public)
+        graph.record_template("template.html", "t1")
+        graph.record_images({os.path.join(self.public, "cat.png"): "c1"})
+        graph.record_page(self.index, "template.html", "Home", ["/about/"], ["/cat.png"])
+        graph.record_page(self.about, "template.html", "About", [], [])
+        graph.save()
+        return DependencyGraph(self.public)
+
+    def test_dependents_survive_a_reload(self):
+        graph = self.saved_graph()
+        self.assertEqual(graph.dependents_of({("title", os.path.normpath(self.about))}), {os.path.normpath(self.index)})
+        self.assertEqual(graph.dependents_of({("template", "template.html")}),
+                         {os.path.normpath(self.index), os.path.normpath(self.about)})
+
+    def test_changes(self):
+        graph = self.saved_graph()
+        self.assertIsNone(graph.record_template("template.html", "t1"))
+        self.assertEqual(graph.record_template("template.html", "t2"), ("template", "template.html"))
+        cat = os.path.normpath(os.path.join(self.public, "cat.png"))
+        self.assertEqual(graph.record_images({cat: "c1"}), set())
+        self.assertEqual(graph.record_images({cat: "c2"}), {("image", cat)})
+        self.assertIsNone(graph.record_page(self.about, "template.html", "About", [], []))
+        self.assertEqual(graph.record_page(self.about, "template.html", "About us", [], []),
+                         ("title", os.path.normpath(self.about)))
+        self.assertEqual(graph.removed_pages([self.index]), {("title", os.path.normpath(self.about))})
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class TestIncrementalRebuilds(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write(os.path.join(self.static, "cat.png"), "cat")
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\nSee [about](/about).\n")
+        self.write(os.path.join(self.content, "about", "index.md"), "# About\n\n![cat](/cat.png)\n")
+        self.write(os.path.join(self.content, "other", "index.md"), "# Other\n\nNothing here.\n")
+        self.build()
+
+    def build(self):
+        # Returns the content paths of the pages that were rendered
+        handler = RecordingHandler()
+        logger.addHandler(handler)
+        level = logger.level
+        logger.setLevel(logging.DEBUG)
+        try:
+            self.build_site(static=True, graph=DependencyGraph(self.public))
+        finally:
+            logger.removeHandler(handler)
+            logger.setLevel(level)
+        return sorted(os.path.relpath(message.split()[1], self.content) for message in handler.messages
+                      if message.startswith(" * " + self.content))
+
+    def test_nothing_changed(self):
+        self.assertEqual(self.build(), [])
+
+    def test_title_change_rebuilds_linking_pages(self):
+        self.write(os.path.join(self.content, "about", "index.md"), "# About us\n\n![cat](/cat.png)\n")
+        self.assertEqual(self.build(), ["about/index.md", "index.md"])
+
+    def test_body_change_keeps_linking_pages(self):
+        self.write(os.path.join(self.content, "about", "index.md"), "# About\n\nNo cat.\n")
+        self.assertEqual(self.build(), ["about/index.md"])
+
+    def test_image_change_rebuilds_referencing_pages(self):
+        self.write(os.path.join(self.static, "cat.png"), "another cat")
+        self.assertEqual(self.build(), ["about/index.md"])
+
+    def test_removed_page_rebuilds_linking_pages(self):
+        os.remove(os.path.join(self.content, "about", "index.md"))
+        self.assertEqual(self.build(), ["index.md"])
+
+
+if __name__ == "__main__":
+    unittest.main()
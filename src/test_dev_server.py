@@ -0,0 +1,109 @@
+import os
+import tempfile
+import unittest
+
+from dev_server import DevServer, InotifyWatcher, PollingWatcher
+from fixtures import SiteTestCase, read_file
+
+
+class TestDevServer(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write(os.path.join(self.content, "index.md"), "# Home")
+        self.write(os.path.join(self.content, "blog", "index.md"), "# Blog")
+        self.write(os.path.join(self.static, "index.css"), "body {}")
+        self.server = DevServer(self.content, self.static, self.template, self.public)
+
+    def read(self, *parts):
+        return read_file(os.path.join(self.public, *parts))
+
+    def test_rebuild_only_changed_page(self):
+        self.assertEqual(self.server.rebuild({os.path.join(self.content, "blog", "index.md")}), 1)
+        self.assertEqual(self.read("blog", "index.html"), "<title>Blog</title><div><h1>Blog</h1></div>")
+        self.assertFalse(os.path.exists(os.path.join(self.public, "index.html")))
+        self.assertEqual(self.server.version, 1)
+
+    def test_rebuild_asset(self):
+        self.server.rebuild({os.path.join(self.static, "index.css")})
+        self.assertEqual(self.read("index.css"), "body {}")
+
+    def test_rebuild_template_rebuilds_all_pages(self):
+        self.server.rebuild({self.template})
+        self.assertEqual(self.read("index.html"), "<title>Home</title><div><h1>Home</h1></div>")
+        self.assertEqual(self.read("blog", "index.html"), "<title>Blog</title><div><h1>Blog</h1></div>")
+
+    def test_rebuild_removed_page(self):
+        page = os.path.join(self.content, "blog", "index.md")
+        self.server.rebuild({page})
+        os.remove(page)
+        self.server.rebuild({page})
+        self.assertFalse(os.path.exists(os.path.join(self.public, "blog", "index.html")))
+
+    def test_rebuild_removed_page_with_template(self):
+        self.server.rebuild({self.template})
+        page = os.path.join(self.content, "blog", "index.md")
+        os.remove(page)
+        self.server.rebuild({self.template, page})
+        self.assertFalse(os.path.exists(os.path.join(self.public, "blog", "index.html")))
+        self.assertTrue(os.path.exists(os.path.join(self.public, "index.html")))
+
+    def build(self):
+        # An incremental build as main.py runs it, returning the pages rendered
+        return self.build_site()["pages"]
+
+    def test_rebuilt_page_is_rebuilt_by_next_build(self):
+        self.assertEqual(self.build(), 2)
+        # Edited and reverted to the same size: without the manifest entry
+        # dropped, the next build would take the dev server's page for current
+        page = os.path.join(self.content, "blog", "index.md")
+        self.write(page, "# Blgo")
+        self.server.rebuild({page})
+        self.write(page, "# Blog")
+        self.assertEqual(self.build(), 1)
+        self.assertEqual(self.read("blog", "index.html"), "<title>Blog</title><div><h1>Blog</h1></div>")
+
+    def test_template_rebuild_is_rebuilt_by_next_build(self):
+        self.assertEqual(self.build(), 2)
+        self.write(self.template, "<h1>{{ Title }}</h1>{{ Content }}")
+        self.server.rebuild({self.template})
+        self.write(self.template, "<title>{{ Title }}</title>{{ Content }}")
+        self.assertEqual(self.build(), 2)
+        self.assertEqual(self.read("index.html"), "<title>Home</title><div><h1>Home</h1></div>")
+
+    def test_rebuild_ignores_other_files(self):
+        self.assertEqual(self.server.rebuild({os.path.join(self.content, ".index.md.swp")}), 0)
+        self.assertEqual(self.server.version, 0)
+
+    def test_wait_for_change_times_out(self):
+        self.assertEqual(self.server.wait_for_change(0, timeout=0.01), 0)
+        self.assertEqual(self.server.wait_for_change(5, timeout=0.01), 0)
+
+
+class TestWatchers(unittest.TestCase):
+    def test_watchers_report_changes(self):
+        watchers = [PollingWatcher]
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                InotifyWatcher([tmp], []).close()
+            watchers.append(InotifyWatcher)
+        except OSError:
+            pass
+
+        for watcher_class in watchers:
+            with self.subTest(watcher=watcher_class.__name__), tempfile.TemporaryDirectory() as tmp:
+                template = os.path.join(tmp, "template.html")
+                with open(template, "w") as file:
+                    file.write("a")
+                os.mkdir(os.path.join(tmp, "content"))
+                watcher = watcher_class([os.path.join(tmp, "content")], [template])
+                self.addCleanup(watcher.close)
+                page = os.path.join(tmp, "content", "index.md")
+                with open(page, "w") as file:
+                    file.write("# Home")
+                with open(os.path.join(tmp, "unrelated.txt"), "w") as file:
+                    file.write("x")
+                self.assertEqual(watcher.wait(timeout=2), {os.path.normpath(page)})
+
+
+if __name__ == "__main__":
+    unittest.main()
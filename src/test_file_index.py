@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+
+from copy_static_content import collect_static_files
+from file_index import FileIndex, IndexEntry, scan_tree
+from fixtures import write_file
+from generate_content import collect_pages
+
+
+class TestFileIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmp.name, "content")
+        for rel_path, text in [("b.md", "bb"), ("a/z.md", "z"), ("a/img.png", "png"), ("a-b/c.md", ""), ("a/d/e.md", "e")]:
+            self.write(rel_path, text)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, rel_path, text):
+        write_file(os.path.join(self.root, rel_path), text)
+
+    def test_sorted_depth_first(self):
+        self.assertEqual([entry.rel_path for entry in scan_tree(self.root)], [
+            "a", os.path.join("a", "d"), os.path.join("a", "d", "e.md"), os.path.join("a", "img.png"),
+            os.path.join("a", "z.md"), "a-b", os.path.join("a-b", "c.md"), "b.md",
+        ])
+
+    def test_entries(self):
+        index = FileIndex(self.root)
+        path = os.path.join(self.root, "b.md")
+        self.assertEqual(index.lookup(path), IndexEntry("b.md", "file", 2, os.stat(path).st_mtime_ns))
+        self.assertEqual(index.lookup(os.path.join(self.root, "a")).kind, "dir")
+        self.assertIsNone(index.lookup(os.path.join(self.root, "missing.md")))
+        self.assertEqual(len(index.files()), 5)
+        self.assertEqual(len(index.dirs()), 3)
+
+    def test_missing_root(self):
+        with self.assertRaises(FileNotFoundError):
+            scan_tree(os.path.join(self.tmp.name, "missing"))
+
+    def test_collect_pages(self):
+        dest = os.path.join(self.tmp.name, "public")
+        pages, files = collect_pages(self.root, dest)
+        self.assertEqual(pages[0], (os.path.join(self.root, "a", "d", "e.md"), os.path.join(dest, "a", "d", "e.html")))
+        self.assertEqual(len(pages), 4)
+        self.assertEqual(files, [(os.path.join(self.root, "a", "img.png"), os.path.join(dest, "a", "img.png"))])
+        self.assertTrue(os.path.isdir(os.path.join(dest, "a", "d")))
+
+    def test_collect_static_files(self):
+        dest = os.path.join(self.tmp.name, "public")
+        files = collect_static_files(self.root, dest)
+        self.assertEqual([os.path.relpath(dest_path, dest) for _, dest_path in files], [
+            os.path.join("a", "d", "e.md"), os.path.join("a", "img.png"), os.path.join("a", "z.md"),
+            os.path.join("a-b", "c.md"), "b.md",
+        ])
+        self.assertTrue(os.path.isdir(os.path.join(dest, "a-b")))
+
+
+if __name__ == "__main__":
+    unittest.main()
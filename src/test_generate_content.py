@@ -1,5 +1,11 @@
-import unittest
-from generate_content import extract_title
+import os, tempfile, unittest
+from unittest import mock
+import generate_content
+from block_cache import BlockCache
+from block_markdown import set_block_cache
+from fixtures import start_method, write_file
+from generate_content import extract_title, generate_page, generate_pages_recursive, set_mmap_threshold
+from profiler import BuildProfile
 
 
 class TestTextNode(unittest.TestCase):
@@ -15,7 +21,7 @@ class TestTextNode(unittest.TestCase):
         """
         with self.assertRaises(ValueError) as context:
             extract_title(markdown)
-        self.assertTrue("Too many # for a heading section / heading section doesn't exist" in str(context.exception))
+        self.assertTrue("h1 level header is not found" in str(context.exception))
 
     def test_extract_title_no_h1_heading(self):
         markdown = """
@@ -24,6 +30,132 @@ class TestTextNode(unittest.TestCase):
         with self.assertRaises(Exception):
             extract_title(markdown)
 
+    def test_extract_title_after_other_blocks(self):
+        markdown = "Intro text\n\n## Contents\n\n# The title\n\n# Another h1"
+        self.assertEqual(extract_title(markdown), "The title")
+
+
+class TestGeneratePagesRecursive(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.content = os.path.join(self.tmp.name, "content")
+        self.template = os.path.join(self.tmp.name, "template.html")
+        with open(self.template, "w") as file:
+            file.write('<title>{{ Title }}</title><link href="/index.css" />{{ Content }}')
+        for i in range(6):
+            self.write(os.path.join("section", str(i % 3), f"page{i}.md"),
+                       f"# Page {i}\n\nSee [home](/) and ![img](/images/{i}.png)")
+        self.write("index.md", "# Home\n\n- *one*\n- **two**")
+        self.write(os.path.join("section", "notes.txt"), "plain file")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, rel_path, text):
+        write_file(os.path.join(self.content, rel_path), text)
+
+    def build(self, dest_name, jobs, pipeline=False, profile=None, stats=None):
+        dest = os.path.join(self.tmp.name, dest_name)
+        build_stats = generate_pages_recursive(self.content, self.template, dest, "/site/", jobs=jobs, profile=profile,
+                                               pipeline=pipeline)
+        if stats is not None:
+            stats.update(build_stats)
+        outputs = {}
+        for dir_path, _, file_names in os.walk(dest):
+            for file_name in file_names:
+                path = os.path.join(dir_path, file_name)
+                with open(path, "rb") as file:
+                    outputs[os.path.relpath(path, dest)] = file.read()
+        return outputs
+
+    def test_parallel_build_matches_serial_build(self):
+        serial = self.build("serial", jobs=1)
+        parallel = self.build("parallel", jobs=3)
+        self.assertEqual(len(serial), 8)
+        self.assertEqual(serial, parallel)
+        self.assertIn(b'href="/site/index.css"', serial["index.html"])
+
+    def test_content_files_use_asset_mode(self):
+        dest = os.path.join(self.tmp.name, "linked")
+        generate_pages_recursive(self.content, self.template, dest, "/site/", asset_mode="hardlink")
+        self.assertTrue(os.path.samefile(os.path.join(self.content, "section", "notes.txt"),
+                                         os.path.join(dest, "section", "notes.txt")))
+
+    def test_output_directories_are_made_once(self):
+        # collect_pages makes them, so writing the pages doesn't call makedirs
+        with mock.patch("os.makedirs", wraps=os.makedirs) as makedirs:
+            self.build("serial", jobs=1)
+            self.build("pipelined", jobs=1, pipeline=True)
+        self.assertEqual(makedirs.call_count, 2 * 5)
+
+    def test_spawned_workers_get_the_build_settings(self):
+        # Spawned workers don't inherit the module globals the build sets
+        set_block_cache(BlockCache())
+        self.addCleanup(set_block_cache, None)
+        serial_stats, stats = {}, {}
+        serial = self.build("serial", jobs=1, stats=serial_stats)
+        with start_method("spawn"):
+            self.assertEqual(self.build("spawned", jobs=2, stats=stats), serial)
+        # Every block was looked up in the workers' caches
+        self.assertEqual(stats["block_cache_hits"] + stats["block_cache_misses"],
+                         serial_stats["block_cache_hits"] + serial_stats["block_cache_misses"])
+
+    def test_pipelined_build_matches_serial_build(self):
+        serial = self.build("serial", jobs=1)
+        self.assertEqual(self.build("pipelined", jobs=1, pipeline=True), serial)
+        self.assertEqual(self.build("pipelined-parallel", jobs=3, pipeline=True), serial)
+
+    def test_pipelined_build_profile(self):
+        profile = BuildProfile()
+        self.build("pipelined", jobs=1, pipeline=True, profile=profile)
+        self.assertEqual(len(profile.pages), 7)
+        for phase in ("source read", "block parsing", "html serialization", "file write"):
+            self.assertIn(phase, profile.phases)
+
+    def test_pipelined_build_reports_errors(self):
+        self.write("broken.md", "no title here")
+        with self.assertRaises(Exception):
+            self.build("pipelined", jobs=1, pipeline=True)
+
+
+    def test_mapped_sources_match_read_sources(self):
+        read = self.build("read", jobs=1)
+        set_mmap_threshold(1)
+        try:
+            self.assertEqual(self.build("mapped", jobs=1), read)
+            self.assertEqual(self.build("mapped-pipelined", jobs=1, pipeline=True), read)
+            self.assertEqual(self.build("mapped-profiled", jobs=1, profile=BuildProfile()), read)
+        finally:
+            set_mmap_threshold(generate_content.MMAP_THRESHOLD)
+
+
+class TestGeneratePageMapped(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.template = os.path.join(self.tmp.name, "template.html")
+        with open(self.template, "w") as file:
+            file.write("<title>{{ Title }}</title>{{ Content }}")
+        set_mmap_threshold(1)
+
+    def tearDown(self):
+        set_mmap_threshold(generate_content.MMAP_THRESHOLD)
+        self.tmp.cleanup()
+
+    def generate(self, markdown):
+        markdown_path = os.path.join(self.tmp.name, "index.md")
+        with open(markdown_path, "w") as file:
+            file.write(markdown)
+        return generate_page(markdown_path, self.template, os.path.join(self.tmp.name, "index.html"), "/")
+
+    def test_references(self):
+        metadata = self.generate("# Big *page*\n\n[a](/a) and ![b](/b.png)\n\n```\n[c](/c)\n```\n")
+        self.assertEqual((metadata.title, metadata.links, metadata.images), ("Big *page*", ["/a", "/c"], ["/b.png"]))
+
+    def test_no_h1_heading(self):
+        for markdown in ("## Level 2\n", "```\n# code\n```\n", "Text\n\n#Title\n"):
+            with self.assertRaises(Exception):
+                self.generate(markdown)
+
 
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -1,3 +1,4 @@
+import io
 import unittest
 
 from htmlnode import *
@@ -88,6 +89,41 @@ class TestHTMLNode(unittest.TestCase):
         parent_node = ParentNode("div", [child_node])
         self.assertEqual(parent_node.to_html(), "<div><span><p>paragraph text</p></span></div>")
 
+    def test_nodes_have_no_dict(self):
+        for node in [HTMLNode(), LeafNode("b", "Bold"), ParentNode("p", [])]:
+            self.assertFalse(hasattr(node, "__dict__"))
+
+    def test_iter_html_fragments(self):
+        node = ParentNode("p", [LeafNode("b", "Bold"), LeafNode(None, " text")], {"class": "x"})
+        self.assertEqual(list(node.iter_html()), ['<p class="x">', "<b>Bold</b>", " text", "</p>"])
+
+    def test_iter_html_matches_to_html(self):
+        node = ParentNode("div", [
+            ParentNode("ul", [ParentNode("li", [LeafNode("i", "one")]), ParentNode("li", [LeafNode(None, "two")])]),
+            LeafNode("a", "link", {"href": "/x", "target": "_blank"}),
+        ])
+        self.assertEqual("".join(node.iter_html()), node.to_html())
+        self.assertEqual(node.to_html(), '<div><ul><li><i>one</i></li><li>two</li></ul><a href="/x" target="_blank">link</a></div>')
+
+    def test_to_html_deep_nesting(self):
+        node = LeafNode(None, "deep")
+        for _ in range(5000):
+            node = ParentNode("span", [node])
+        html = node.to_html()
+        self.assertTrue(html.startswith("<span><span>"))
+        self.assertEqual(len(html), 5000 * len("<span></span>") + len("deep"))
+
+    def test_write_html(self):
+        node = ParentNode("p", [LeafNode("b", "Bold")])
+        file = io.StringIO()
+        node.write_html(file)
+        self.assertEqual(file.getvalue(), "<p><b>Bold</b></p>")
+
+    def test_iter_html_invalid_child(self):
+        node = ParentNode("div", [ParentNode("p", None)])
+        with self.assertRaises(ValueError):
+            node.to_html()
+
     '''
     def test_parent_value_given(self):
         node = ParentNode("p", value="paragraph text", children=[LeafNode("b", "Bold text")])
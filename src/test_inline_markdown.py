@@ -1,7 +1,7 @@
-import unittest, re
+import os, unittest, re
 
 from textnode import TextNode, TextType
-from inline_markdown import split_nodes_delimiter, extract_markdown_images, extract_markdown_links, split_nodes_image, split_nodes_link, text_to_textnodes
+from inline_markdown import split_nodes_delimiter, extract_markdown_images, extract_markdown_links, split_nodes_image, split_nodes_link, text_to_textnodes, inline_to_html
 
 
 class TestTextNode(unittest.TestCase):
@@ -190,6 +190,16 @@ class TestTextNode(unittest.TestCase):
             expected
         )
 
+    def test_split_link_in_bold_node(self):
+        self.assertListEqual(
+            split_nodes_link([TextNode("see [x](/a) now", TextType.BOLD)]),
+            [
+                TextNode("see ", TextType.NORMAL),
+                TextNode("x", TextType.LINK, "/a"),
+                TextNode(" now", TextType.NORMAL),
+            ],
+        )
+
     def test_text_to_textnodes(self):
         text = "This is **text** with an *italic* word and a `code block` and an ![obi wan image](https://i.imgur.com/fJRm4Vk.jpeg) and a [link](https://boot.dev)"
         expected = [
@@ -206,6 +216,220 @@ class TestTextNode(unittest.TestCase):
         ]
         self.assertEqual(text_to_textnodes(text), expected)
 
+    def test_text_to_textnodes_code_keeps_asterisks(self):
+        self.assertEqual(
+            text_to_textnodes("Use `a * b` here"),
+            [
+                TextNode("Use ", TextType.NORMAL),
+                TextNode("a * b", TextType.CODE),
+                TextNode(" here", TextType.NORMAL),
+            ],
+        )
+
+    def test_inline_to_html(self):
+        self.assertEqual(
+            inline_to_html("A **b** *c* `d` ![e](/f.png) [g](/h)"),
+            'A <b>b</b> <i>c</i> <code>d</code> <img src="/f.png" alt="e"></img> <a href="/h">g</a>',
+        )
+
+    def test_text_to_textnodes_unmatched_delimiter(self):
+        for text in ["This is **bold", "This is *italic", "This is `code"]:
+            with self.assertRaises(ValueError):
+                text_to_textnodes(text)
+
+
+def multi_pass_text_to_textnodes(text):
+    # The original five pass pipeline, kept as the reference for the scanner
+    nodes = [TextNode(text, TextType.NORMAL, None)]
+    nodes = split_nodes_delimiter(nodes, "**", TextType.BOLD)
+    nodes = split_nodes_delimiter(nodes, "*", TextType.ITALIC)
+    nodes = split_nodes_delimiter(nodes, "`", TextType.CODE)
+    nodes = split_nodes_image(nodes)
+    nodes = split_nodes_link(nodes)
+    return nodes
+
+
+# text_to_textnodes outputs recorded from the original five pass pipeline
+BASELINE_TEXTNODES = [
+    ('', []),
+    ('plain text only', [
+        ('plain text only', TextType.NORMAL, None),
+    ]),
+    ('**bold**', [
+        ('bold', TextType.BOLD, None),
+    ]),
+    ('*italic*', [
+        ('italic', TextType.ITALIC, None),
+    ]),
+    ('`code`', [
+        ('code', TextType.CODE, None),
+    ]),
+    ('**bold** and *italic* and `code`', [
+        ('bold', TextType.BOLD, None),
+        (' and ', TextType.NORMAL, None),
+        ('italic', TextType.ITALIC, None),
+        (' and ', TextType.NORMAL, None),
+        ('code', TextType.CODE, None),
+    ]),
+    ('**a**b**c**', [
+        ('a', TextType.BOLD, None),
+        ('b', TextType.NORMAL, None),
+        ('c', TextType.BOLD, None),
+    ]),
+    ('****', []),
+    ('*a* **b** *c*', [
+        ('a', TextType.ITALIC, None),
+        (' ', TextType.NORMAL, None),
+        ('b', TextType.BOLD, None),
+        (' ', TextType.NORMAL, None),
+        ('c', TextType.ITALIC, None),
+    ]),
+    ('**bold with `code` inside**', [
+        ('bold with `code` inside', TextType.BOLD, None),
+    ]),
+    ('text ![alt](/a.png) text', [
+        ('text ', TextType.NORMAL, None),
+        ('alt', TextType.IMAGE, '/a.png'),
+        (' text', TextType.NORMAL, None),
+    ]),
+    ('![alt one](/a.png)![alt two](/b.png)', [
+        ('alt one', TextType.IMAGE, '/a.png'),
+        ('alt two', TextType.IMAGE, '/b.png'),
+    ]),
+    ('![](/empty-alt.png)', [
+        ('', TextType.IMAGE, '/empty-alt.png'),
+    ]),
+    ('[link](/a) and [another link](https://b.c/d?e=f)', [
+        ('link', TextType.LINK, '/a'),
+        (' and ', TextType.NORMAL, None),
+        ('another link', TextType.LINK, 'https://b.c/d?e=f'),
+    ]),
+    ('[a](/a)[b](/b)[c](/c)', [
+        ('a', TextType.LINK, '/a'),
+        ('b', TextType.LINK, '/b'),
+        ('c', TextType.LINK, '/c'),
+    ]),
+    ('![img](/i.png) then [link](/l)', [
+        ('img', TextType.IMAGE, '/i.png'),
+        (' then ', TextType.NORMAL, None),
+        ('link', TextType.LINK, '/l'),
+    ]),
+    ('[broken link(/a) and [not a link] (/b)', [
+        ('[broken link(/a) and [not a link] (/b)', TextType.NORMAL, None),
+    ]),
+    ('unclosed ![image(/a.png)', [
+        ('unclosed ![image(/a.png)', TextType.NORMAL, None),
+    ]),
+    ('mixed **bold** [link](/x) *it* ![img](/y.png) `c` end', [
+        ('mixed ', TextType.NORMAL, None),
+        ('bold', TextType.BOLD, None),
+        (' ', TextType.NORMAL, None),
+        ('link', TextType.LINK, '/x'),
+        (' ', TextType.NORMAL, None),
+        ('it', TextType.ITALIC, None),
+        (' ', TextType.NORMAL, None),
+        ('img', TextType.IMAGE, '/y.png'),
+        (' ', TextType.NORMAL, None),
+        ('c', TextType.CODE, None),
+        (' end', TextType.NORMAL, None),
+    ]),
+    ('[same](/same) text [same](/same)', [
+        ('same', TextType.LINK, '/same'),
+        (' text ', TextType.NORMAL, None),
+        ('same', TextType.LINK, '/same'),
+    ]),
+    ('**see [x](/a)** and *a [l](/u) b*', [
+        ('see ', TextType.NORMAL, None),
+        ('x', TextType.LINK, '/a'),
+        (' and ', TextType.NORMAL, None),
+        ('a ', TextType.NORMAL, None),
+        ('l', TextType.LINK, '/u'),
+        (' b', TextType.NORMAL, None),
+    ]),
+    ('**![i](/i.png) b**', [
+        ('i', TextType.IMAGE, '/i.png'),
+        (' b', TextType.NORMAL, None),
+    ]),
+    ('*[a](/b)*', [
+        ('a', TextType.LINK, '/b'),
+    ]),
+    ('**[a](/b)** after', [
+        ('a', TextType.LINK, '/b'),
+        (' after', TextType.NORMAL, None),
+    ]),
+    ('before *![one](/1.png) and [two](/2)*', [
+        ('before ', TextType.NORMAL, None),
+        ('one', TextType.IMAGE, '/1.png'),
+        (' and ', TextType.NORMAL, None),
+        ('two', TextType.LINK, '/2'),
+    ]),
+    ('`[x](/a)`', [
+        ('x', TextType.LINK, '/a'),
+    ]),
+]
+
+
+class TestTextToTextNodesParity(unittest.TestCase):
+    maxDiff = None
+
+    def test_samples(self):
+        for text, recorded in BASELINE_TEXTNODES:
+            expected = [TextNode(node_text, text_type, url) for node_text, text_type, url in recorded]
+            with self.subTest(text=text):
+                self.assertEqual(text_to_textnodes(text), expected)
+                self.assertEqual(multi_pass_text_to_textnodes(text), expected)
+
+    def test_link_in_emphasis(self):
+        # Links and images inside bold, italic and code spans are split out of
+        # them, and the rest of the span becomes normal text
+        self.assertEqual(
+            inline_to_html("**see [x](/a)** and *a ![i](/i.png) b*"),
+            'see <a href="/a">x</a> and a <img src="/i.png" alt="i"></img> b',
+        )
+
+    def test_link_text_with_delimiters(self):
+        # The five passes split this on "*" before looking for the link
+        self.assertEqual(text_to_textnodes("[a*b*c](/u)"), [TextNode("a*b*c", TextType.LINK, "/u")])
+        self.assertEqual(
+            multi_pass_text_to_textnodes("[a*b*c](/u)"),
+            [TextNode("[a", TextType.NORMAL), TextNode("b", TextType.ITALIC), TextNode("c](/u)", TextType.NORMAL)],
+        )
+
+    def test_link_with_delimiter_pairing_after_it(self):
+        # Output recorded from ad308e9: the delimiter in the link's text pairs
+        # with the one after the link, so there is no link
+        self.assertEqual(
+            text_to_textnodes("[*x](u)*"),
+            [TextNode("[", TextType.NORMAL), TextNode("x](u)", TextType.ITALIC)],
+        )
+        self.assertEqual(
+            text_to_textnodes("[`x](u)`"),
+            [TextNode("[", TextType.NORMAL), TextNode("x](u)", TextType.CODE)],
+        )
+        self.assertEqual(inline_to_html("a [*x](u) b* c"), "a [<i>x](u) b</i> c")
+
+    def test_unpaired_delimiter_raises(self):
+        with self.assertRaises(ValueError):
+            text_to_textnodes("[x](u) and a * alone")
+
+    def test_link_heavy_paragraph(self):
+        text = " | ".join(f"[entry {i}](/changelog/{i}) **v{i}**" for i in range(300))
+        self.assertEqual(text_to_textnodes(text), multi_pass_text_to_textnodes(text))
+
+    def test_site_content(self):
+        content_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "content")
+        for dir_path, _, file_names in os.walk(content_dir):
+            for file_name in file_names:
+                if not file_name.endswith(".md"):
+                    continue
+                with open(os.path.join(dir_path, file_name)) as file:
+                    for line in file.read().split("\n"):
+                        if line.startswith("```"):
+                            continue
+                        with self.subTest(line=line):
+                            self.assertEqual(text_to_textnodes(line), multi_pass_text_to_textnodes(line))
+
+
 if __name__ == "__main__":
     unittest.main()
 
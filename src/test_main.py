@@ -0,0 +1,26 @@
+import unittest
+
+from main import default_page_cache_size, parse_args, parse_serve_args
+from page_cache import DEFAULT_CACHE_DIR
+
+
+class TestParseArgs(unittest.TestCase):
+    def test_page_cache_is_opt_in(self):
+        args = parse_args([])
+        self.assertEqual(args.page_cache_size, 0)
+        args = parse_args(["--page-cache-dir", "/tmp/pages"])
+        self.assertEqual((args.page_cache_dir, args.page_cache_size), ("/tmp/pages", default_page_cache_size))
+        args = parse_args(["--page-cache-size", "10M"])
+        self.assertEqual((args.page_cache_dir, args.page_cache_size), (DEFAULT_CACHE_DIR, 10 * 1024 ** 2))
+
+    def test_serve_accepts_search_index(self):
+        self.assertFalse(parse_serve_args([]).search_index)
+        self.assertTrue(parse_serve_args(["--search-index"]).search_index)
+
+    def test_serve_accepts_site_args(self):
+        args = parse_serve_args(["--site-url", "https://example.com", "--site-author", "Tom"])
+        self.assertEqual((args.site_url, args.site_author), ("https://example.com", "Tom"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import generate_content
+from fixtures import read_file, start_method, write_file
+from generate_content import generate_page, generate_pages_recursive, set_page_cache
+from page_cache import PageCache
+
+
+class TestPageCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = PageCache(os.path.join(self.tmp.name, "cache"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, text):
+        return write_file(os.path.join(self.tmp.name, name), text)
+
+    def test_key_depends_on_every_input(self):
+        key = PageCache.key("# Hi", "t1", "/")
+        self.assertEqual(key, PageCache.key("# Hi", "t1", "/"))
+        self.assertNotEqual(key, PageCache.key("# Hello", "t1", "/"))
+        self.assertNotEqual(key, PageCache.key("# Hi", "t2", "/"))
+        self.assertNotEqual(key, PageCache.key("# Hi", "t1", "/blog/"))
+
+    def test_store_and_restore(self):
+        key = PageCache.key("# Hi", "t", "/")
+        dest_path = os.path.join(self.tmp.name, "index.html")
+        self.assertFalse(self.cache.restore(key, dest_path))
+        self.assertFalse(os.path.exists(dest_path + ".tmp"))
+
+        self.cache.store(key, self.write("page.html", "<h1>Hi</h1>"))
+        self.assertTrue(self.cache.restore(key, dest_path))
+        self.assertEqual(read_file(dest_path), "<h1>Hi</h1>")
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_prune_removes_least_recently_used(self):
+        page_path = self.write("page.html", "x" * 100)
+        keys = [PageCache.key(str(i), "t", "/") for i in range(3)]
+        for age, key in zip((30, 10, 20), keys):
+            self.cache.store(key, page_path)
+            entry_path = self.cache.entry_path(key)
+            stat = os.stat(entry_path)
+            os.utime(entry_path, ns=(stat.st_atime_ns - age * 10 ** 9, stat.st_mtime_ns))
+
+        # Restoring counts as an access, so the oldest entry becomes the newest
+        self.cache.restore(keys[0], os.path.join(self.tmp.name, "index.html"))
+        removed, removed_bytes = self.cache.prune(max_bytes=150)
+        self.assertEqual((removed, removed_bytes), (2, 200))
+        self.assertTrue(os.path.exists(self.cache.entry_path(keys[0])))
+        self.assertFalse(os.path.exists(self.cache.entry_path(keys[1])))
+        self.assertFalse(os.path.exists(self.cache.entry_path(keys[2])))
+
+    def test_stats(self):
+        self.assertEqual(self.cache.stats()["entries"], 0)
+        self.cache.store(PageCache.key("a", "t", "/"), self.write("page.html", "x" * 10))
+        stats = self.cache.stats()
+        self.assertEqual((stats["entries"], stats["bytes"]), (1, 10))
+
+
+class TestGeneratePageWithPageCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = PageCache(os.path.join(self.tmp.name, "cache"))
+        set_page_cache(self.cache)
+        self.markdown_path = os.path.join(self.tmp.name, "index.md")
+        with open(self.markdown_path, "w") as file:
+            file.write("# Title\n\nSome [link](/about).\n")
+        self.template_path = os.path.join(self.tmp.name, "template.html")
+        with open(self.template_path, "w") as file:
+            file.write("<title>{{ Title }}</title>{{ Content }}")
+
+    def tearDown(self):
+        set_page_cache(None)
+        self.tmp.cleanup()
+
+    def generate(self, name, basepath="/", timings=None):
+        dest_path = os.path.join(self.tmp.name, "public", name)
+        generate_page(self.markdown_path, self.template_path, dest_path, basepath, timings)
+        with open(dest_path) as file:
+            return file.read()
+
+    def test_second_build_restores_from_cache(self):
+        first = self.generate("first.html")
+        with mock.patch.object(generate_content, "blocks_to_html_node", side_effect=AssertionError):
+            self.assertEqual(self.generate("second.html"), first)
+            self.assertEqual(self.generate("timed.html", timings={}), first)
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 1))
+
+    def test_parallel_build_uses_cache(self):
+        # Workers that don't inherit the parent's globals still get the cache
+        content = os.path.join(self.tmp.name, "content")
+        os.makedirs(content)
+        for name in ("index.md", "about.md"):
+            with open(os.path.join(content, name), "w") as file:
+                file.write(f"# {name}\n")
+        public = os.path.join(self.tmp.name, "public")
+        with start_method("spawn"):
+            first = generate_pages_recursive(content, self.template_path, public, "/", jobs=2)
+            second = generate_pages_recursive(content, self.template_path, public, "/", jobs=2)
+        self.assertEqual((first["page_cache_hits"], first["page_cache_misses"]), (0, 2))
+        self.assertEqual((second["page_cache_hits"], second["page_cache_misses"]), (2, 0))
+        self.assertEqual(self.cache.stats()["entries"], 2)
+
+    def test_basepath_change_renders_again(self):
+        self.generate("first.html")
+        self.assertIn('href="/blog/about"', self.generate("second.html", basepath="/blog/"))
+        self.assertEqual(self.cache.misses, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
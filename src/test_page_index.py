@@ -0,0 +1,79 @@
+import json
+import os
+import unittest
+
+from fixtures import SiteTestCase
+from page_index import PAGE_INDEX_FILENAME, PageIndex, PageMetadata, page_metadata
+
+
+class TestPageMetadata(unittest.TestCase):
+    def test_metadata(self):
+        metadata = page_metadata(
+            "Intro [link](/a) text\n\n# Title\n\n## Part *one*\n\n- it's ![cat](/cat.png)\n\n```\nno words [x](/x)\n```")
+        self.assertEqual(metadata.title, "Title")
+        self.assertEqual(metadata.headings, [(1, "Title"), (2, "Part *one*")])
+        self.assertEqual(metadata.links, ["/a", "/x"])
+        self.assertEqual(metadata.images, ["/cat.png"])
+        self.assertEqual(metadata.words, 8)
+        self.assertIsNone(metadata.mtime)
+        self.assertIsNone(metadata.terms)
+
+    def test_no_title(self):
+        with self.assertRaises(ValueError):
+            page_metadata("## Only a subheading")
+
+    def test_bytes(self):
+        markdown = "# Tïtle\n\n[a](/a)"
+        self.assertEqual(page_metadata(markdown.encode()), page_metadata(markdown))
+
+
+class TestPageIndex(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\n## Welcome\n\nSee [about](/about).\n")
+        self.write(os.path.join(self.content, "about", "index.md"), "# About\n\nAbout us.\n")
+
+    def build(self):
+        # Returns the saved index and the number of pages rendered
+        stats = self.build_site(page_index=PageIndex(self.public))
+        return PageIndex.load(self.public), stats["pages"]
+
+    def test_build_records_every_page(self):
+        page_index, rendered = self.build()
+        self.assertEqual(rendered, 2)
+        self.assertEqual([rel_path for rel_path, _ in page_index.items()], ["about/index.html", "index.html"])
+        home = page_index.get("index.html")
+        self.assertEqual(home, PageMetadata("Home", [(1, "Home"), (2, "Welcome")], ["/about"], [], 4,
+                                            os.stat(os.path.join(self.content, "index.md")).st_mtime_ns))
+
+    def test_incremental_build_keeps_unchanged_pages(self):
+        self.build()
+        self.write(os.path.join(self.content, "about", "index.md"), "# About us\n")
+        page_index, rendered = self.build()
+        self.assertEqual(rendered, 1)
+        self.assertEqual(page_index.get("about/index.html").title, "About us")
+        self.assertEqual(page_index.get("index.html").title, "Home")
+
+    def test_missing_index_renders_pages_again(self):
+        self.build()
+        os.remove(os.path.join(self.public, PAGE_INDEX_FILENAME))
+        page_index, rendered = self.build()
+        self.assertEqual((rendered, len(page_index)), (2, 2))
+
+    def test_removed_page_is_dropped(self):
+        self.build()
+        os.remove(os.path.join(self.content, "about", "index.md"))
+        page_index, _ = self.build()
+        self.assertEqual([rel_path for rel_path, _ in page_index.items()], ["index.html"])
+
+    def test_file_is_compact(self):
+        self.build()
+        with open(os.path.join(self.public, PAGE_INDEX_FILENAME)) as index_file:
+            data = json.load(index_file)
+        # Search terms are never saved
+        self.assertEqual(data["fields"], list(PageMetadata._fields[:-1]))
+        self.assertIsInstance(data["pages"]["index.html"], list)
+
+
+if __name__ == "__main__":
+    unittest.main()
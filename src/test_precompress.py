@@ -0,0 +1,74 @@
+import gzip
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import precompress
+from fixtures import write_file
+from precompress import precompress_outputs
+
+
+class TestPrecompressOutputs(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.public = self.tmp.name
+        self.page = self.write("blog/index.html", "<p>hello</p>" * 200)
+        self.write("index.css", "body {}" * 300)
+        self.write("small.js", "x()")
+        self.write("images/cat.png", "png" * 1000)
+        self.write("archive.tar.gz", "not a variant" * 100)
+        self.write(".build-manifest.json", "{}" * 1000)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, rel_path, text):
+        return write_file(os.path.join(self.public, rel_path), text)
+
+    def variants(self):
+        return sorted(os.path.relpath(os.path.join(dir_path, name), self.public)
+                      for dir_path, _, names in os.walk(self.public) for name in names
+                      if name.endswith((".gz", ".br")) and name != "archive.tar.gz")
+
+    def test_compresses_text_outputs_only(self):
+        with mock.patch.dict(precompress.VARIANTS, {".br": None}):
+            self.assertEqual(precompress_outputs(self.public), (2, 0))
+        self.assertEqual(self.variants(), ["blog/index.html.gz", "index.css.gz"])
+        with gzip.open(self.page + ".gz", "rt") as gzip_file:
+            self.assertEqual(gzip_file.read(), "<p>hello</p>" * 200)
+        self.assertEqual(os.stat(self.page + ".gz").st_mtime_ns, os.stat(self.page).st_mtime_ns)
+
+    def test_unchanged_outputs_are_skipped(self):
+        with mock.patch.dict(precompress.VARIANTS, {".br": None}):
+            precompress_outputs(self.public)
+            self.assertEqual(precompress_outputs(self.public), (0, 0))
+            self.write("blog/index.html", "<p>changed</p>" * 200)
+            self.assertEqual(precompress_outputs(self.public), (1, 0))
+        with gzip.open(self.page + ".gz", "rt") as gzip_file:
+            self.assertEqual(gzip_file.read(), "<p>changed</p>" * 200)
+
+    def test_stale_variants_are_removed(self):
+        with mock.patch.dict(precompress.VARIANTS, {".br": None}):
+            precompress_outputs(self.public)
+            os.remove(self.page)
+            self.write("index.css", "body {}")
+            self.write("index.html.br", "left by a build with brotli")
+            self.assertEqual(precompress_outputs(self.public), (0, 3))
+        self.assertEqual(self.variants(), [])
+        self.assertTrue(os.path.exists(os.path.join(self.public, "archive.tar.gz")))
+
+    def test_brotli(self):
+        compressed = []
+        def fake_brotli(from_path, tmp_path):
+            compressed.append(from_path)
+            with open(tmp_path, "w") as file:
+                file.write("br")
+        with mock.patch.dict(precompress.VARIANTS, {".br": fake_brotli}):
+            self.assertEqual(precompress_outputs(self.public, threads=1), (4, 0))
+        self.assertEqual(self.variants(), ["blog/index.html.br", "blog/index.html.gz", "index.css.br", "index.css.gz"])
+        self.assertEqual(len(compressed), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import json
+import os
+import tempfile
+import unittest
+
+from generate_content import generate_pages_recursive
+from profiler import BuildProfile
+
+
+class TestBuildProfile(unittest.TestCase):
+    def test_phases_add_up(self):
+        profile = BuildProfile()
+        profile.add("block parsing", 0.5)
+        profile.add("block parsing", 0.25)
+        with profile.phase("static copy"):
+            pass
+        self.assertEqual(profile.phases["block parsing"], 0.75)
+        self.assertIn("static copy", profile.phases)
+
+    def test_slowest_pages(self):
+        profile = BuildProfile()
+        profile.add_page("a.md", 0.1, {"block render": 0.05})
+        profile.add_page("b.md", 0.3, {"block render": 0.2})
+        profile.add_page("c.md", 0.2, {"block render": 0.1})
+        self.assertEqual([path for path, _ in profile.slowest_pages(2)], ["b.md", "c.md"])
+        self.assertAlmostEqual(profile.phases["block render"], 0.35)
+
+    def test_report_orders_phases_by_build_order(self):
+        profile = BuildProfile()
+        profile.add("file write", 0.1)
+        profile.add("static copy", 0.1)
+        profile.finish()
+        lines = profile.report().splitlines()
+        self.assertTrue(lines[1].startswith("static copy"))
+        self.assertTrue(lines[2].startswith("file write"))
+        self.assertTrue(lines[3].startswith("total (wall)"))
+
+    def test_write_json(self):
+        profile = BuildProfile()
+        profile.add_page("a.md", 0.1, {"file write": 0.05})
+        profile.finish()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "profile.json")
+            profile.write_json(path)
+            with open(path) as file:
+                data = json.load(file)
+        self.assertEqual(data["page_count"], 1)
+        self.assertEqual(data["slowest_pages"][0]["path"], "a.md")
+        self.assertEqual(data["phases"], {"file write": 0.05})
+
+
+class TestProfiledBuild(unittest.TestCase):
+    def test_profiled_build_records_pages(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            content = os.path.join(tmp, "content")
+            template = os.path.join(tmp, "template.html")
+            with open(template, "w") as file:
+                file.write("{{ Title }}{{ Content }}")
+            for name in ("a", "b", "c"):
+                os.makedirs(os.path.join(content, name))
+                with open(os.path.join(content, name, "index.md"), "w") as file:
+                    file.write(f"# {name}\n\nSome *text*")
+
+            for jobs in (1, 2):
+                with self.subTest(jobs=jobs):
+                    profile = BuildProfile()
+                    generate_pages_recursive(content, template, os.path.join(tmp, f"public{jobs}"), "/",
+                                             jobs=jobs, profile=profile)
+                    self.assertEqual(len(profile.pages), 3)
+                    for phase in ("content walk", "block parsing", "block render", "file write"):
+                        self.assertIn(phase, profile.phases)
+                    with open(os.path.join(tmp, f"public{jobs}", "a", "index.html")) as file:
+                        self.assertEqual(file.read(), "a<div><h1>a</h1><p>Some <i>text</i></p></div>")
+
+
+if __name__ == "__main__":
+    unittest.main()
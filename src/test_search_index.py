@@ -0,0 +1,135 @@
+import json
+import os
+import unittest
+from collections import Counter
+
+from fixtures import SiteTestCase, start_method
+from page_index import PageIndex, page_metadata, set_collect_terms
+from search_index import (SEARCH_DIR, SEARCH_RECORD_FILENAME, SearchIndex, count_terms, remove_search_index,
+                          search_terms, shard_name)
+
+
+class TestTerms(unittest.TestCase):
+    def tearDown(self):
+        set_collect_terms(False)
+
+    def test_terms(self):
+        counts = Counter()
+        count_terms("The Cat's cat sat_on 42 a x", counts)
+        count_terms("«Cat» don’t Élan", counts)
+        self.assertEqual(search_terms(counts), {"cat": 3, "sat": 1, "42": 1, "don": 1, "élan": 1})
+
+    def test_shard_name(self):
+        self.assertEqual(shard_name("tolkien"), "to")
+        self.assertEqual(shard_name("42"), "42")
+        self.assertEqual(shard_name("élan"), "x" + "él".encode().hex())
+
+    def test_scanner_collects_terms(self):
+        self.assertIsNone(page_metadata("# Title").terms)
+        set_collect_terms(True)
+        metadata = page_metadata("# Title\n\n1. first [link](/target)\n2. **bold** `code`\n\n```\nfenced\n```")
+        self.assertEqual(metadata.terms, {"title": 1, "first": 1, "link": 1, "bold": 1, "code": 1})
+
+
+class TestSearchIndex(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write(os.path.join(self.content, "index.md"), "# Home\n\nHobbits and wizards.\n")
+        self.write(os.path.join(self.content, "tom", "index.md"), "# Tom\n\nTom Bombadil sings, Tom dances.\n")
+        self.write(os.path.join(self.content, "ring.md"), "# Ring\n\nThe ring of power.\n")
+        set_collect_terms(True)
+
+    def tearDown(self):
+        set_collect_terms(False)
+
+    def build(self, jobs=1):
+        # Returns the number of pages rendered and of search files changed
+        page_index = PageIndex(self.public)
+        search = SearchIndex(self.public)
+        if not search.previous:
+            page_index.forget_previous()
+        stats = self.build_site(jobs=jobs, page_index=page_index)
+        return stats["pages"], search.write(page_index)
+
+    def read(self, name):
+        with open(os.path.join(self.public, SEARCH_DIR, name)) as search_file:
+            return json.load(search_file)
+
+    def search(self, term):
+        # {page path: count} of the pages containing term
+        pages = self.read("pages.json")["pages"]
+        path = os.path.join(self.public, SEARCH_DIR, shard_name(term) + ".json")
+        if not os.path.isfile(path):
+            return {}
+        flat = self.read(shard_name(term) + ".json").get(term, [])
+        return {pages[page_id][0]: count for page_id, count in zip(flat[::2], flat[1::2])}
+
+    def test_index(self):
+        self.build()
+        self.assertEqual(self.read("pages.json"), {
+            "prefix_length": 2, "pages": [["", "Home"], ["ring.html", "Ring"], ["tom/", "Tom"]]})
+        self.assertEqual(self.search("tom"), {"tom/": 3})
+        self.assertEqual(self.search("ring"), {"ring.html": 2})
+        self.assertEqual(self.search("the"), {})
+
+    def test_parallel_build(self):
+        # Workers that don't inherit the parent's globals still collect terms
+        with start_method("spawn"):
+            self.assertEqual(self.build(jobs=2)[0], 3)
+        self.assertEqual(self.search("tom"), {"tom/": 3})
+
+    def test_incremental_update(self):
+        self.build()
+        shards = os.path.join(self.public, SEARCH_DIR)
+        for name in os.listdir(shards):
+            os.utime(os.path.join(shards, name), ns=(0, 0))
+
+        self.write(os.path.join(self.content, "tom", "index.md"), "# Tom\n\nTom sings of the ring.\n")
+        rendered, changed = self.build()
+        self.assertEqual(rendered, 1)
+        self.assertEqual(self.search("tom"), {"tom/": 2})
+        self.assertEqual(self.search("ring"), {"ring.html": 2, "tom/": 1})
+        self.assertEqual(self.search("bombadil"), {})
+        # Of the shards of the page's old and new terms, si.json came out the
+        # same, and bo.json and da.json were left empty and removed
+        touched = sorted(name for name in os.listdir(shards) if os.stat(os.path.join(shards, name)).st_mtime_ns)
+        self.assertEqual(touched, ["ri.json", "to.json"])
+        self.assertEqual(changed, 4)
+        self.assertFalse(os.path.exists(os.path.join(shards, "bo.json")))
+        self.assertEqual(self.build(), (0, 0))
+
+    def test_removed_page_id_is_reused(self):
+        self.build()
+        os.remove(os.path.join(self.content, "ring.md"))
+        os.remove(os.path.join(self.public, "ring.html"))
+        self.build()
+        self.assertEqual(self.read("pages.json")["pages"], [["", "Home"], None, ["tom/", "Tom"]])
+        self.assertEqual(self.search("ring"), {})
+
+        self.write(os.path.join(self.content, "elves.md"), "# Elves\n\nElves of Rivendell.\n")
+        self.build()
+        self.assertEqual(self.read("pages.json")["pages"], [["", "Home"], ["elves.html", "Elves"], ["tom/", "Tom"]])
+        self.assertEqual(self.search("elves"), {"elves.html": 2})
+
+    def test_missing_record_renders_every_page(self):
+        self.build()
+        os.remove(os.path.join(self.public, SEARCH_RECORD_FILENAME))
+        rendered, _ = self.build()
+        self.assertEqual(rendered, 3)
+        self.assertEqual(self.search("tom"), {"tom/": 3})
+
+    def test_pages_without_terms(self):
+        self.build()
+        page_index = PageIndex.load(self.public)
+        with self.assertRaises(ValueError):
+            SearchIndex(os.path.join(self.tmp.name, "other")).write(page_index)
+
+    def test_remove_search_index(self):
+        self.build()
+        self.assertTrue(remove_search_index(self.public))
+        self.assertFalse(os.path.exists(os.path.join(self.public, SEARCH_DIR)))
+        self.assertFalse(remove_search_index(self.public))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+import json
+import os
+import unittest
+
+from build_manifest import MANIFEST_FILENAME, BuildManifest, hash_file
+from copy_static_content import copy_static_files_recursively
+from dependency_graph import DependencyGraph
+from fixtures import SiteTestCase
+from generate_content import generate_pages_recursive
+from page_index import PageIndex
+from precompress import precompress_outputs
+from shard import MergeError, Shard, merge_shards, parse_shard, shard_of
+
+
+class TestShardOf(unittest.TestCase):
+    def test_stable_and_in_range(self):
+        for count in (1, 2, 7):
+            shards = [shard_of(f"page-{i}/index.html", count) for i in range(100)]
+            self.assertTrue(all(1 <= shard <= count for shard in shards))
+            self.assertEqual(shards, [shard_of(f"page-{i}/index.html", count) for i in range(100)])
+        self.assertEqual(len({shard_of(f"page-{i}/index.html", 4) for i in range(100)}), 4)
+
+    def test_parse_shard(self):
+        shard = parse_shard("2/4")
+        self.assertEqual((shard.index, shard.count), (2, 4))
+        for text in ("0/4", "5/4", "2", "a/b", "1/0"):
+            with self.assertRaises(ValueError):
+                parse_shard(text)
+
+
+class TestShardedBuild(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write(os.path.join(self.static, "index.css"), "body {}")
+        self.write(os.path.join(self.static, "images", "cat.png"), "cat")
+        for i in range(12):
+            self.write(os.path.join(self.content, f"page-{i}", "index.md"),
+                       f"# Page {i}\n\n[next](/page-{i + 1}) ![cat](/images/cat.png)\n")
+
+    def build(self, dest_dir_path, shard=None):
+        self.build_site(public=dest_dir_path, static=True, graph=DependencyGraph(dest_dir_path),
+                        page_index=PageIndex(dest_dir_path), shard=shard)
+        if shard is not None:
+            shard.write_marker(dest_dir_path, hash_file(self.template), "/")
+
+    def outputs(self, dest_dir_path):
+        outputs = {}
+        for dir_path, _, file_names in os.walk(dest_dir_path):
+            for file_name in file_names:
+                if not file_name.startswith("."):
+                    path = os.path.join(dir_path, file_name)
+                    with open(path, "rb") as file:
+                        outputs[os.path.relpath(path, dest_dir_path)] = file.read()
+        return outputs
+
+    def sharded_build(self, count):
+        shard_dirs = []
+        for index in range(1, count + 1):
+            shard_dir = os.path.join(self.tmp.name, "shards", f"shard-{index}-of-{count}")
+            self.build(shard_dir, Shard(index, count))
+            shard_dirs.append(shard_dir)
+        return shard_dirs
+
+    def test_shards_are_disjoint_and_merge_to_full_build(self):
+        full = os.path.join(self.tmp.name, "full")
+        self.build(full)
+        shard_dirs = self.sharded_build(3)
+        shard_outputs = [set(self.outputs(shard_dir)) for shard_dir in shard_dirs]
+        self.assertEqual(sum(len(outputs) for outputs in shard_outputs), 14)
+        self.assertEqual(set.union(*shard_outputs), set(self.outputs(full)))
+
+        merged = os.path.join(self.tmp.name, "merged")
+        self.assertEqual(merge_shards(shard_dirs, merged), 14)
+        self.assertEqual(self.outputs(merged), self.outputs(full))
+        self.assertEqual(PageIndex.load(merged).items(), PageIndex.load(full).items())
+
+        # The merged manifest makes the next incremental build a no-op
+        manifest = BuildManifest(merged, hash_file(self.template), "/")
+        graph = DependencyGraph(merged)
+        self.assertEqual(copy_static_files_recursively(self.static, merged, manifest), [])
+        stats = generate_pages_recursive(self.content, self.template, merged, "/", manifest, graph=graph,
+                                         page_index=PageIndex(merged))
+        self.assertEqual(stats["pages"], 0)
+        with open(os.path.join(merged, MANIFEST_FILENAME)) as manifest_file:
+            self.assertEqual(len(json.load(manifest_file)["pages"]), 12)
+
+    def test_precompressed_variants_are_merged(self):
+        full = os.path.join(self.tmp.name, "full")
+        self.build(full)
+        precompress_outputs(full, min_size=1)
+        shard_dirs = self.sharded_build(2)
+        for shard_dir in shard_dirs:
+            precompress_outputs(shard_dir, min_size=1)
+        merged = os.path.join(self.tmp.name, "merged")
+        merge_shards(shard_dirs, merged)
+        self.assertEqual(set(self.outputs(merged)), set(self.outputs(full)))
+        self.assertIn(os.path.join("page-0", "index.html.gz"), self.outputs(merged))
+
+    def test_missing_shard(self):
+        shard_dirs = self.sharded_build(3)
+        with self.assertRaises(MergeError) as raised:
+            merge_shards(shard_dirs[:2], os.path.join(self.tmp.name, "merged"))
+        self.assertEqual(raised.exception.problems, ["missing shard(s) 3 of 3"])
+        self.assertFalse(os.path.exists(os.path.join(self.tmp.name, "merged")))
+
+    def test_missing_output(self):
+        shard_dirs = self.sharded_build(2)
+        rel_path = sorted(self.outputs(shard_dirs[0]))[0]
+        os.remove(os.path.join(shard_dirs[0], rel_path))
+        with self.assertRaises(MergeError) as raised:
+            merge_shards(shard_dirs, os.path.join(self.tmp.name, "merged"))
+        self.assertEqual(raised.exception.problems, [f"{rel_path.replace(os.sep, '/')} missing from shard 1"])
+
+    def test_duplicate_output(self):
+        shard_dirs = self.sharded_build(2)
+        rel_path = sorted(self.outputs(shard_dirs[0]))[0].replace(os.sep, "/")
+        marker_path = os.path.join(shard_dirs[1], ".shard.json")
+        with open(marker_path) as marker_file:
+            marker = json.load(marker_file)
+        marker["outputs"].append(rel_path)
+        with open(marker_path, "w") as marker_file:
+            json.dump(marker, marker_file)
+        with self.assertRaises(MergeError) as raised:
+            merge_shards(shard_dirs, os.path.join(self.tmp.name, "merged"))
+        self.assertIn(f"{rel_path} built by shards 1 and 2", raised.exception.problems)
+
+    def test_shards_of_different_trees(self):
+        shard_dirs = self.sharded_build(2)
+        self.write(os.path.join(self.content, "extra", "index.md"), "# Extra\n")
+        self.build(shard_dirs[1], Shard(2, 2))
+        with self.assertRaises(MergeError):
+            merge_shards(shard_dirs, os.path.join(self.tmp.name, "merged"))
+
+
+if __name__ == "__main__":
+    unittest.main()
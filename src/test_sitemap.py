@@ -0,0 +1,98 @@
+import os
+import tempfile
+import unittest
+import xml.etree.ElementTree as ElementTree
+
+from page_index import PageIndex, PageMetadata
+from sitemap import page_url, remove_site_files, write_feed, write_sitemaps
+
+SITEMAP = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
+ATOM = "{http://www.w3.org/2005/Atom}"
+
+
+class TestPageURL(unittest.TestCase):
+    def test_page_url(self):
+        self.assertEqual(page_url("https://example.com/", "/", "index.html"), "https://example.com/")
+        self.assertEqual(page_url("https://example.com", "/site/", "blog/tom/index.html"),
+                         "https://example.com/site/blog/tom/")
+        self.assertEqual(page_url("https://example.com", "/", "a b.html"), "https://example.com/a%20b.html")
+
+
+class TestSiteFiles(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.public = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def page_index(self, count):
+        page_index = PageIndex(self.public)
+        for i in range(count):
+            page_index.record(os.path.join(self.public, f"page-{i:02d}", "index.html"),
+                              PageMetadata(f"Page {i} & more", [], [], [], 10, i * 10 ** 9))
+        page_index.record(os.path.join(self.public, "index.html"), PageMetadata("Home", [], [], [], 1, 0))
+        return page_index
+
+    def locations(self, name, tag="url"):
+        root = ElementTree.parse(os.path.join(self.public, name)).getroot()
+        return [element.find(SITEMAP + "loc").text for element in root.findall(SITEMAP + tag)]
+
+    def test_single_sitemap(self):
+        changed = write_sitemaps(self.page_index(2), self.public, "https://example.com", "/blog/")
+        self.assertEqual(changed, [os.path.join(self.public, "sitemap.xml")])
+        self.assertEqual(self.locations("sitemap.xml"), [
+            "https://example.com/blog/", "https://example.com/blog/page-00/", "https://example.com/blog/page-01/"])
+
+    def test_split_sitemaps(self):
+        write_sitemaps(self.page_index(6), self.public, "https://example.com", "/", max_urls=3)
+        self.assertEqual(self.locations("sitemap.xml", "sitemap"), [
+            "https://example.com/sitemap-1.xml", "https://example.com/sitemap-2.xml", "https://example.com/sitemap-3.xml"])
+        self.assertEqual(len(self.locations("sitemap-1.xml")), 3)
+        self.assertEqual(len(self.locations("sitemap-3.xml")), 1)
+
+        # Shrinking back to one sitemap removes the parts
+        changed = write_sitemaps(self.page_index(1), self.public, "https://example.com", "/", max_urls=3)
+        self.assertEqual(len(self.locations("sitemap.xml")), 2)
+        self.assertEqual(sorted(os.listdir(self.public)), ["sitemap.xml"])
+        self.assertEqual(len(changed), 4)
+
+    def test_unchanged_files_are_kept(self):
+        write_sitemaps(self.page_index(6), self.public, "https://example.com", "/", max_urls=3)
+        self.assertTrue(write_feed(self.page_index(6), self.public, "https://example.com", "/"))
+        sitemap_path = os.path.join(self.public, "sitemap-1.xml")
+        os.utime(sitemap_path, ns=(0, 0))
+
+        page_index = self.page_index(6)
+        page_index.record(os.path.join(self.public, "page-05", "index.html"), PageMetadata("New", [], [], [], 1, 1))
+        changed = write_sitemaps(page_index, self.public, "https://example.com", "/", max_urls=3)
+        self.assertEqual(changed, [os.path.join(self.public, "sitemap-3.xml")])
+        self.assertEqual(os.stat(sitemap_path).st_mtime_ns, 0)
+        self.assertFalse(write_feed(self.page_index(6), self.public, "https://example.com", "/"))
+
+    def test_feed(self):
+        write_feed(self.page_index(30), self.public, "https://example.com", "/", entries=3)
+        root = ElementTree.parse(os.path.join(self.public, "feed.xml")).getroot()
+        self.assertEqual(root.find(ATOM + "title").text, "Home")
+        self.assertEqual(root.find(ATOM + "author").find(ATOM + "name").text, "Home")
+        entries = root.findall(ATOM + "entry")
+        self.assertEqual([entry.find(ATOM + "title").text for entry in entries],
+                         ["Page 29 & more", "Page 28 & more", "Page 27 & more"])
+        self.assertEqual(entries[0].find(ATOM + "link").get("href"), "https://example.com/page-29/")
+        self.assertEqual(entries[0].find(ATOM + "updated").text, "1970-01-01T00:00:29Z")
+
+    def test_feed_author(self):
+        write_feed(self.page_index(3), self.public, "https://example.com", "/", author="Tom & Goldberry")
+        root = ElementTree.parse(os.path.join(self.public, "feed.xml")).getroot()
+        self.assertEqual(root.find(ATOM + "author").find(ATOM + "name").text, "Tom & Goldberry")
+
+    def test_remove_site_files(self):
+        write_sitemaps(self.page_index(6), self.public, "https://example.com", "/", max_urls=3)
+        write_feed(self.page_index(6), self.public, "https://example.com", "/")
+        self.assertTrue(remove_site_files(self.public))
+        self.assertEqual([name for name in os.listdir(self.public) if name.endswith(".xml")], [])
+        self.assertFalse(remove_site_files(self.public))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+import io
+import os
+import tempfile
+import unittest
+
+from template import Template, load_template
+
+
+class TestTemplate(unittest.TestCase):
+    def test_render(self):
+        template = Template("<title>{{ Title }}</title><body>{{ Content }}</body>")
+        self.assertEqual(
+            template.render("Hello", "<p>text</p>"),
+            "<title>Hello</title><body><p>text</p></body>",
+        )
+
+    def test_render_repeated_placeholder(self):
+        template = Template("{{ Title }}|{{ Content }}|{{ Title }}")
+        self.assertEqual(template.render("a", "b"), "a|b|a")
+
+    def test_render_without_placeholders(self):
+        template = Template("<p>static</p>")
+        self.assertEqual(template.render("a", "b"), "<p>static</p>")
+
+    def test_basepath_applied_to_template_and_content(self):
+        template = Template('<link href="/index.css" />{{ Content }}', "/blog/")
+        self.assertEqual(
+            template.render("t", '<a href="/tom">x</a><img src="/tom.png" alt=""></img>'),
+            '<link href="/blog/index.css" /><a href="/blog/tom">x</a><img src="/blog/tom.png" alt=""></img>',
+        )
+
+    def test_basepath_leaves_absolute_urls(self):
+        template = Template('{{ Content }}', "/blog/")
+        self.assertEqual(
+            template.render("t", '<a href="https://boot.dev">x</a>'),
+            '<a href="https://boot.dev">x</a>',
+        )
+
+    def test_matches_naive_replace(self):
+        template_html = '<title>{{ Title }}</title><link href="/index.css" /><article>{{ Content }}</article>'
+        content = '<p><a href="/a">a</a><img src="/b.png" alt="b"></img></p>'
+        expected = template_html.replace("{{ Title }}", "T").replace("{{ Content }}", content)
+        expected = expected.replace('href="/', 'href="/x/').replace('src="/', 'src="/x/')
+        self.assertEqual(Template(template_html, "/x/").render("T", content), expected)
+
+    def test_write_matches_render(self):
+        template = Template('<link href="/index.css" /><t>{{ Title }}</t>{{ Content }}|{{ Content }}', "/x/")
+        fragments = ['<a href="/a">', "a", "</a>", '<img src="/b.png" alt=""></img>']
+        file = io.StringIO()
+        template.write(file, "T", iter(fragments))
+        self.assertEqual(file.getvalue(), template.render("T", "".join(fragments)))
+
+    def test_asset_names_rewritten_with_basepath(self):
+        asset_names = {"index.css": "index.abc.css", "images/tom.png": "images/tom.def.png"}
+        template = Template('<link href="/index.css" />{{ Content }}', "/x/", asset_names)
+        content = '<img src="/images/tom.png?v=1" alt=""></img><a href="/about">a</a><img src="/other.png" alt=""></img>'
+        expected = ('<link href="/x/index.abc.css" /><img src="/x/images/tom.def.png?v=1" alt=""></img>'
+                    '<a href="/x/about">a</a><img src="/x/other.png" alt=""></img>')
+        self.assertEqual(template.render("t", content), expected)
+        file = io.StringIO()
+        template.write(file, "t", iter([content]))
+        self.assertEqual(file.getvalue(), expected)
+        self.assertEqual(Template("<p/>", "/", asset_names).render("t", '<img src="/images/tom.png">'),
+                         "<p/>")
+        self.assertNotEqual(template.hash, Template('<link href="/index.css" />{{ Content }}', "/x/").hash)
+
+    def test_load_template_reloads_changed_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "template.html")
+            with open(path, "w") as file:
+                file.write("old {{ Content }}")
+            self.assertIs(load_template(path, "/"), load_template(path, "/"))
+            self.assertEqual(load_template(path, "/").render("", "x"), "old x")
+
+            with open(path, "w") as file:
+                file.write("new {{ Content }}")
+            os.utime(path, ns=(1, 1))
+            self.assertEqual(load_template(path, "/").render("", "x"), "new x")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -24,6 +24,11 @@ class TestTextNode(unittest.TestCase):
         node2 = TextNode("This is a text node", TextType.BOLD)
         self.assertNotEqual(node1, node2)
 
+    def test_no_dict(self):
+        node = TextNode("This is a text node", TextType.BOLD)
+        self.assertFalse(hasattr(node, "__dict__"))
+        self.assertEqual(repr(node), "TextNode(This is a text node, TextType.BOLD, None)")
+
 class TestTextNodeToHTMLNode(unittest.TestCase):
     def test_text_node_to_html_node_BOLD(self):
         text_node = TextNode("This is bold text", TextType.BOLD)